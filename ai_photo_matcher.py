@@ -7,7 +7,23 @@ Extracts visual descriptions from memory text and matches against photo metadata
 import os
 import re
 import sqlite3
-from collections import Counter
+
+import database
+import memory_tokens
+import tokenizer
+from database import read_snapshot
+from media_links import MAX_ORDER_SQL
+
+# Photos not yet linked to a memory
+_CANDIDATES_SQL = '''
+    SELECT m.id, m.filename, m.original_filename, m.title, m.description, m.year
+    FROM media m
+    WHERE m.file_type = 'image'
+    AND m.id NOT IN (
+        SELECT media_id FROM memory_media WHERE memory_id = ?
+    )
+'''
+_MEMORY_IDS_SQL = 'SELECT id FROM memories'
 
 def extract_visual_descriptions(text):
     """
@@ -59,43 +75,19 @@ def extract_visual_descriptions(text):
 
 def extract_names(text):
     """Extract potential names from text (capitalized words)."""
-    # Find capitalized words that might be names
-    words = re.findall(r'\b[A-Z][a-z]+(?:\s+[A-Z][a-z]+)*\b', text)
-    
-    # Filter out common non-names
-    stopwords = {'The', 'And', 'Or', 'But', 'In', 'On', 'At', 'To', 'For', 'From', 
-                 'With', 'This', 'That', 'These', 'Those', 'It', 'He', 'She', 'They',
-                 'Mr', 'Mrs', 'Miss', 'Ms', 'Dr', 'Battle', 'Hastings', 'London',
-                 'England', 'UK', 'USA', 'World', 'War', 'Year', 'Day', 'Month',
-                 'One', 'Another', 'Behind', 'Given', 'Fast'}
-    
-    names = [w for w in words if w not in stopwords and len(w) > 2]
-    
-    # Return unique names
-    return list(set(names))
+    return tokenizer.names(text)
 
 def extract_keywords(text):
     """Extract important keywords from text."""
-    # Remove common words
-    stopwords = {'the', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with',
-                 'a', 'an', 'is', 'was', 'were', 'are', 'been', 'be', 'have', 'has', 'had',
-                 'do', 'does', 'did', 'will', 'would', 'could', 'should', 'may', 'might',
-                 'i', 'you', 'he', 'she', 'it', 'we', 'they', 'my', 'your', 'his', 'her',
-                 'its', 'our', 'their', 'this', 'that', 'these', 'those', 'me', 'him',
-                 'them', 'what', 'which', 'who', 'when', 'where', 'why', 'how'}
-    
-    # Get words, lowercase, filter stopwords
-    words = re.findall(r'\b\w+\b', text.lower())
-    keywords = [w for w in words if w not in stopwords and len(w) > 3]
-    
-    # Return most common keywords
-    counter = Counter(keywords)
-    return [word for word, count in counter.most_common(30)]
+    return tokenizer.keywords(text)
 
-def score_photo_match(memory_text, memory_year, photo_metadata):
+def score_photo_match(memory_text, memory_year, photo_metadata, tokens=None):
     """
     Score how well a photo matches a memory using enhanced text analysis.
     
+    Pass the memory's stored `tokens` (memory_tokens.load) when scoring it
+    against many photos; otherwise its names and keywords are extracted here.
+    
     Returns: {
         'score': int (0-100),
         'reasons': [str] - list of match reasons
@@ -175,7 +167,7 @@ def score_photo_match(memory_text, memory_year, photo_metadata):
                     break
     
     # 4. NAME MATCHING (up to 25 points)
-    memory_names = extract_names(memory_text)
+    memory_names = tokens.names if tokens else extract_names(memory_text)
     
     # Check for full name matches in photo text
     matched_names = []
@@ -199,7 +191,7 @@ def score_photo_match(memory_text, memory_year, photo_metadata):
         score += name_score
     
     # 5. KEYWORD MATCHING (up to 15 points)
-    memory_keywords = extract_keywords(memory_text)
+    memory_keywords = tokens.keywords if tokens else extract_keywords(memory_text)
     
     matched_keywords = []
     for keyword in memory_keywords[:15]:  # Check top 15 keywords
@@ -235,13 +227,18 @@ def score_photo_match(memory_text, memory_year, photo_metadata):
         'reasons': reasons
     }
 
-def suggest_photos_for_memory(memory_id, db_path='circle_memories.db', confidence_threshold=40):
+def suggest_photos_for_memory(memory_id, db_path=None, confidence_threshold=40, conn=None):
     """
     Suggest photos for a specific memory using enhanced text-based matching.
     
+    Pass `conn` to read through an existing (e.g. snapshot) connection;
+    otherwise one is opened on db_path and closed afterwards.
+    
     Returns list of suggestions sorted by score.
     """
-    conn = sqlite3.connect(db_path)
+    owns_conn = conn is None
+    if owns_conn:
+        conn = sqlite3.connect(db_path or database.DB_PATH)
     cursor = conn.cursor()
     
     # Get memory
@@ -250,9 +247,12 @@ def suggest_photos_for_memory(memory_id, db_path='circle_memories.db', confidenc
     
     if not memory:
         print(f"Memory {memory_id} not found")
+        if owns_conn:
+            conn.close()
         return []
     
     mem_id, mem_text, mem_year = memory
+    tokens = memory_tokens.load(conn, [mem_id]).get(mem_id)
     
     print(f"\n{'='*80}")
     print(f"Finding photos for Memory {mem_id}")
@@ -261,14 +261,7 @@ def suggest_photos_for_memory(memory_id, db_path='circle_memories.db', confidenc
     print(f"{'='*80}\n")
     
     # Get all photos NOT already linked to this memory
-    cursor.execute('''
-        SELECT m.id, m.filename, m.original_filename, m.title, m.description, m.year
-        FROM media m
-        WHERE m.file_type = 'image'
-        AND m.id NOT IN (
-            SELECT media_id FROM memory_media WHERE memory_id = ?
-        )
-    ''', (memory_id,))
+    cursor.execute(_CANDIDATES_SQL, (memory_id,))
     
     photos = cursor.fetchall()
     suggestions = []
@@ -285,7 +278,7 @@ def suggest_photos_for_memory(memory_id, db_path='circle_memories.db', confidenc
             'year': year
         }
         
-        result = score_photo_match(mem_text, mem_year, metadata)
+        result = score_photo_match(mem_text, mem_year, metadata, tokens)
         
         if result['score'] >= confidence_threshold:
             suggestions.append({
@@ -301,48 +294,48 @@ def suggest_photos_for_memory(memory_id, db_path='circle_memories.db', confidenc
         else:
             print(f"✗ {result['score']}% (below threshold)")
     
-    conn.close()
+    if owns_conn:
+        conn.close()
     
     # Sort by score
     suggestions.sort(key=lambda x: x['score'], reverse=True)
     
     return suggestions
 
-def suggest_all_memories(db_path='circle_memories.db', confidence_threshold=40):
+def suggest_all_memories(db_path=None, confidence_threshold=40):
     """
     Process all memories and suggest photo matches.
     Returns dict of {memory_id: [suggestions]}
-    """
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    
-    cursor.execute('SELECT id FROM memories')
-    memories = cursor.fetchall()
-    conn.close()
     
+    Every memory is scored against the same read-only snapshot, so the
+    batch sees a consistent archive and never blocks concurrent saves.
+    """
     all_suggestions = {}
     
-    for (mem_id,) in memories:
-        print(f"\n\nProcessing Memory {mem_id}...")
-        suggestions = suggest_photos_for_memory(mem_id, db_path, confidence_threshold)
+    with read_snapshot(db_path) as conn:
+        cursor = conn.cursor()
         
-        if suggestions:
-            all_suggestions[mem_id] = suggestions
-            print(f"\n✓ Found {len(suggestions)} suggestions for Memory {mem_id}")
-        else:
-            print(f"\n○ No suggestions for Memory {mem_id}")
+        cursor.execute(_MEMORY_IDS_SQL)
+        memories = cursor.fetchall()
+        
+        for (mem_id,) in memories:
+            print(f"\n\nProcessing Memory {mem_id}...")
+            suggestions = suggest_photos_for_memory(mem_id, db_path, confidence_threshold, conn=conn)
+            
+            if suggestions:
+                all_suggestions[mem_id] = suggestions
+                print(f"\n✓ Found {len(suggestions)} suggestions for Memory {mem_id}")
+            else:
+                print(f"\n○ No suggestions for Memory {mem_id}")
     
     return all_suggestions
 
-def apply_suggestion(memory_id, photo_id, db_path='circle_memories.db'):
+def apply_suggestion(memory_id, photo_id, db_path=None):
     """Accept a suggestion and link the photo to memory."""
-    conn = sqlite3.connect(db_path)
+    conn = sqlite3.connect(db_path or database.DB_PATH)
     
     # Get current max order
-    cursor = conn.execute(
-        'SELECT COALESCE(MAX(display_order), -1) FROM memory_media WHERE memory_id = ?',
-        (memory_id,)
-    )
+    cursor = conn.execute(MAX_ORDER_SQL, (memory_id,))
     max_order = cursor.fetchone()[0]
     
     # Insert link
@@ -355,9 +348,9 @@ def apply_suggestion(memory_id, photo_id, db_path='circle_memories.db'):
     conn.close()
     print(f"✓ Linked photo {photo_id} to memory {memory_id}")
 
-def get_linked_photos(memory_id, db_path='circle_memories.db'):
+def get_linked_photos(memory_id, db_path=None):
     """Get photos already linked to a memory."""
-    conn = sqlite3.connect(db_path)
+    conn = sqlite3.connect(db_path or database.DB_PATH)
     cursor = conn.execute('''
         SELECT m.id, m.filename, m.title, mm.display_order
         FROM media m
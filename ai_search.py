@@ -2,11 +2,38 @@
 import os
 from openai import OpenAI
 from typing import List, Dict, Any
+import heapq
 import json
-from database import get_db
+import database
+from data_access import SEARCH_MEMORIES
+from query_cache import MISSING, QueryCache
+from tokenizer import normalize, terms, words
+import llm_cache
+import llm_clients
+import memory_tokens
+import search_index
+import name_index
+import vector_index
 from datetime import datetime
 import re
 
+# Memories sent to DeepSeek with a question: the best matches by words and
+# names, up to this many and this many (estimated) prompt tokens
+CONTEXT_MEMORIES = int(os.environ.get('AI_CONTEXT_MEMORIES', '30'))
+CONTEXT_TOKEN_BUDGET = int(os.environ.get('AI_CONTEXT_TOKENS', '3000'))
+CHARS_PER_TOKEN = 4  # rough average for English prose
+
+# Only the memories picked for a question are read, never the whole archive
+_CONTEXT_SQL = '''
+    SELECT m.id, m.text, m.category, m.memory_date, m.year
+    FROM memories m
+    {where}
+'''
+_CONTEXT_PEOPLE_SQL = "SELECT memory_id, person_name FROM memory_people WHERE memory_id IN ({placeholders})"
+
+# DeepSeekSearch._client when the registry's shared client is to be used
+_SHARED = object()
+
 class DeepSeekSearch:
     def __init__(self, api_key=None):
         """
@@ -19,20 +46,36 @@ class DeepSeekSearch:
             print("   Get a free API key from: https://platform.deepseek.com/api_keys")
             print("   Then add to ~/.zshrc: export DEEPSEEK_API_KEY='your-key-here'")
         
-        self.client = None
-        if self.api_key:
+        # A client of its own only when a key was passed in; otherwise
+        # the registry's shared client is looked up on every call
+        self._client = _SHARED
+        if api_key:
             try:
-                self.client = OpenAI(
-                    api_key=self.api_key,
-                    base_url="https://api.deepseek.com"
-                )
-                print("✓ DeepSeek AI search initialized")
+                self._client = OpenAI(api_key=api_key, base_url="https://api.deepseek.com", max_retries=0)
             except Exception as e:
                 print(f"✗ Failed to initialize DeepSeek: {e}")
-                self.client = None
-        
-        # Cache for common questions
-        self.cache = {}
+                self._client = None
+        if self.client:
+            print("✓ DeepSeek AI search initialized")
+
+        # Cache for common questions, emptied whenever memories change
+        self.cache = QueryCache()
+
+    @property
+    def client(self):
+        """The DeepSeek client, or None without an API key.
+
+        Resolved through llm_clients each time, so a forked worker gets
+        its own pooled connection instead of its parent's. Assigning a
+        client (or None, to turn AI off) overrides the lookup.
+        """
+        if self._client is _SHARED:
+            return llm_clients.get_client('deepseek')
+        return self._client
+
+    @client.setter
+    def client(self, client):
+        self._client = client
     
     def understand_query(self, query: str) -> Dict[str, Any]:
         """
@@ -43,32 +86,39 @@ class DeepSeekSearch:
         
         try:
             # Ask DeepSeek to analyze the question
-            response = self.client.chat.completions.create(
-                model="deepseek-chat",
-                messages=[
-                    {"role": "system", "content": """You are a family memory search assistant. 
-                    Analyze questions about family memories and extract key information.
-                    
-                    Return ONLY valid JSON with this structure:
-                    {
-                        "intent": "find_person_info" | "find_event" | "find_location" | "find_date" | "general_search",
-                        "person_names": ["list", "of", "names"],
-                        "locations": ["list", "of", "locations"],
-                        "dates": ["list", "of", "dates"],
-                        "keywords": ["important", "keywords"],
-                        "question_type": "who" | "what" | "when" | "where" | "why" | "how" | "general",
-                        "main_subject": "what the question is mainly about"
-                    }
-                    """},
-                    {"role": "user", "content": f"Analyze this question about family memories: {query}"}
-                ],
-                temperature=0.1,
-                max_tokens=500
+            messages = [
+                {"role": "system", "content": """You are a family memory search assistant. 
+                Analyze questions about family memories and extract key information.
+                
+                Return ONLY valid JSON with this structure:
+                {
+                    "intent": "find_person_info" | "find_event" | "find_location" | "find_date" | "general_search",
+                    "person_names": ["list", "of", "names"],
+                    "locations": ["list", "of", "locations"],
+                    "dates": ["list", "of", "dates"],
+                    "keywords": ["important", "keywords"],
+                    "question_type": "who" | "what" | "when" | "where" | "why" | "how" | "general",
+                    "main_subject": "what the question is mainly about"
+                }
+                """},
+                {"role": "user", "content": f"Analyze this question about family memories: {query}"}
+            ]
+            # Only a response that parses is cached
+            return llm_cache.cached_call(
+                "deepseek", "deepseek-chat", messages,
+                lambda: json.loads(llm_clients.call(
+                    "deepseek", "understand",
+                    lambda timeout: self.client.chat.completions.create(
+                        model="deepseek-chat",
+                        messages=messages,
+                        temperature=0.1,
+                        max_tokens=500,
+                        timeout=timeout
+                    )
+                ).choices[0].message.content),
+                temperature=0.1, max_tokens=500
             )
             
-            result = json.loads(response.choices[0].message.content)
-            return result
-            
         except Exception as e:
             print(f"DeepSeek query understanding error: {e}")
             return self._basic_understanding(query)
@@ -138,114 +188,224 @@ class DeepSeekSearch:
         Perform intelligent search using DeepSeek with full context.
         Returns both direct answer and relevant memories.
         """
-        # First, get memories from database
-        memories = self._get_all_memories()
-        if not memories:
-            return {
-                "answer": "No family memories found yet.",
-                "confidence": 0.0,
-                "memories": [],
-                "direct_answer": False
-            }
+        with database.pooled_connection() as db:
+            version = search_index.data_version(db)
+        key = normalize(query)
+        result = self.cache.get(key, version)
+        if result is MISSING:
+            result = self._answer(query)
+            # A fallback after an API error is not worth keeping
+            if result.get("ai_generated") or not self.client:
+                self.cache.put(key, version, result)
+        return result
+    
+    def _answer(self, query: str) -> Dict[str, Any]:
+        # Without AI, fall back to scoring every memory locally
+        if not self.client:
+            return self._enhanced_search_all(query)
         
-        # If AI is available, use it
-        if self.client:
-            try:
-                # Prepare context for DeepSeek
-                memory_context = self._prepare_memory_context(memories)
-                
-                # Ask DeepSeek to answer the question based on memories
-                response = self.client.chat.completions.create(
-                    model="deepseek-chat",
-                    messages=[
-                        {"role": "system", "content": """You are a family memory expert. 
-                        Answer questions based ONLY on the provided family memories.
-                        If the information isn't in the memories, say so clearly.
-                        
-                        IMPORTANT: Be specific and direct. If asked "Where was [person] born?"
-                        and you find "He was born in London" in the memories, answer "London".
-                        
-                        Format your response as JSON:
-                        {
-                            "answer": "direct answer to the question",
-                            "supporting_memory_ids": [list of memory IDs that support the answer],
-                            "confidence": 0.0 to 1.0,
-                            "direct_answer": true/false
-                        }
-                        """},
-                        {"role": "user", "content": f"""Family Memories:
-                        {memory_context}
-                        
-                        Question: {query}
-                        
-                        Answer based ONLY on the memories above. Be specific and direct."""}
-                    ],
-                    temperature=0.1,
-                    max_tokens=1000,
-                    response_format={"type": "json_object"}
-                )
-                
-                result = json.loads(response.choices[0].message.content)
+        try:
+            # Only the memories relevant to this question, within the token budget.
+            # The connection goes back to the pool before the API call.
+            with database.pooled_connection() as db:
+                selected = self._select_context(db, query)
+            if not selected:
+                return self._no_memories()
+            memory_context = self._prepare_memory_context(selected)
+            
+            # Ask DeepSeek to answer the question based on memories
+            messages = [
+                {"role": "system", "content": """You are a family memory expert. 
+                Answer questions based ONLY on the provided family memories.
+                If the information isn't in the memories, say so clearly.
                 
-                # Get full memory details for the supporting memories
-                memory_details = []
-                for mem_id in result.get("supporting_memory_ids", [])[:3]:  # Limit to 3
-                    memory = next((m for m in memories if m["id"] == mem_id), None)
-                    if memory:
-                        memory_details.append(memory)
+                IMPORTANT: Be specific and direct. If asked "Where was [person] born?"
+                and you find "He was born in London" in the memories, answer "London".
                 
-                return {
-                    "answer": result.get("answer", "I couldn't find that information in the family memories."),
-                    "confidence": result.get("confidence", 0.0),
-                    "memories": memory_details,
-                    "direct_answer": result.get("direct_answer", False),
-                    "ai_generated": True
+                Format your response as JSON:
+                {
+                    "answer": "direct answer to the question",
+                    "supporting_memory_ids": [list of memory IDs that support the answer],
+                    "confidence": 0.0 to 1.0,
+                    "direct_answer": true/false
                 }
+                """},
+                {"role": "user", "content": f"""Family Memories:
+                {memory_context}
                 
-            except Exception as e:
-                print(f"DeepSeek search error: {e}")
-                # Fall back to enhanced search
-                return self._enhanced_search(query, memories)
-        else:
-            # Use enhanced search without AI
-            return self._enhanced_search(query, memories)
+                Question: {query}
+                
+                Answer based ONLY on the memories above. Be specific and direct."""}
+            ]
+            # The prompt holds the selected memories, so any edit to them misses the cache
+            result = llm_cache.cached_call(
+                "deepseek", "deepseek-chat", messages,
+                lambda: json.loads(llm_clients.call(
+                    "deepseek", "answer",
+                    lambda timeout: self.client.chat.completions.create(
+                        model="deepseek-chat",
+                        messages=messages,
+                        temperature=0.1,
+                        max_tokens=1000,
+                        response_format={"type": "json_object"},
+                        timeout=timeout
+                    )
+                ).choices[0].message.content),
+                temperature=0.1, max_tokens=1000, response_format={"type": "json_object"}
+            )
+            
+            # Get full memory details for the supporting memories
+            memory_details = []
+            for mem_id in result.get("supporting_memory_ids", [])[:3]:  # Limit to 3
+                memory = next((m for m in selected if m["id"] == mem_id), None)
+                if memory:
+                    memory_details.append(memory)
+            
+            return {
+                "answer": result.get("answer", "I couldn't find that information in the family memories."),
+                "confidence": result.get("confidence", 0.0),
+                "memories": memory_details,
+                "direct_answer": result.get("direct_answer", False),
+                "ai_generated": True
+            }
+            
+        except Exception as e:
+            print(f"DeepSeek search error: {e}")
+            # Fall back to enhanced search
+            return self._enhanced_search_all(query)
+    
+    def _enhanced_search_all(self, query: str) -> Dict[str, Any]:
+        with database.pooled_connection() as db:
+            memories = self._get_all_memories(db)
+            if not memories:
+                return self._no_memories()
+            return self._enhanced_search(db, query, memories)
     
-    def _prepare_memory_context(self, memories: List[Dict]) -> str:
+    def _no_memories(self) -> Dict[str, Any]:
+        return {
+            "answer": "No family memories found yet.",
+            "confidence": 0.0,
+            "memories": [],
+            "direct_answer": False
+        }
+
+    def _select_context(self, db, query: str, limit: int = CONTEXT_MEMORIES) -> List[Dict]:
+        """
+        Pick the memories worth sending with a question, best first.
+
+        Memories are ranked locally by BM25 over their words plus trigram
+        matches on the people named in the question, and only the top
+        `limit` are read from the database. A question matching nothing
+        (e.g. "tell me a story") gets the newest memories instead.
+        """
+        scores = {}
+        try:
+            bm25 = search_index.get_index(db).scores(query)
+        except Exception as e:
+            print(f"Context search error: {e}")
+            bm25 = {}
+        if bm25:
+            top = max(bm25.values())
+            scores = {mem_id: score / top for mem_id, score in bm25.items()}
+
+        names = self._basic_understanding(query)["person_names"]
+        if len(names) > 1:
+            names = [' '.join(names)] + names
+        for match in name_index.match_names(db, names):
+            for mem_id in match["memory_ids"]:
+                scores[mem_id] = scores.get(mem_id, 0) + match["similarity"]
+
+        if scores:
+            ids = heapq.nlargest(limit, scores, key=scores.__getitem__)
+            rows = db.execute(
+                _CONTEXT_SQL.format(where=f"WHERE m.id IN ({','.join('?' * len(ids))})"), ids
+            ).fetchall()
+            # An index a moment behind may still hold a deleted memory
+            rows.sort(key=lambda row: -scores[row[0]])
+        else:
+            rows = db.execute(_CONTEXT_SQL.format(where="ORDER BY m.year DESC LIMIT ?"), (limit,)).fetchall()
+        if not rows:
+            return []
+
+        # Tagged people go into the prompt with each memory
+        ids = [row[0] for row in rows]
+        people = {}
+        for mem_id, name in db.execute(
+            _CONTEXT_PEOPLE_SQL.format(placeholders=','.join('?' * len(ids))), ids
+        ):
+            people.setdefault(mem_id, []).append(name)
+        return [
+            {"id": row[0], "text": row[1], "category": row[2], "date": row[3], "year": row[4],
+             "people": people.get(row[0], [])}
+            for row in rows
+        ]
+
+    def _prepare_memory_context(self, memories: List[Dict], budget: int = CONTEXT_TOKEN_BUDGET) -> str:
         """
         Prepare memory context for DeepSeek.
+        Memories are added in order until the token budget is spent; one
+        that no longer fits is skipped in favour of shorter ones after it,
+        and the first is cut down rather than dropped.
         """
         context_lines = []
+        remaining = budget * CHARS_PER_TOKEN
         for memory in memories:
             context = f"[Memory ID: {memory['id']}] {memory['text']}"
             if memory.get('date'):
                 context += f" (Date: {memory['date']})"
             if memory.get('people') and memory['people']:
                 context += f" [People: {', '.join(memory['people'])}]"
+            if len(context) > remaining:
+                if context_lines:
+                    continue
+                context = context[:remaining].rstrip() + "…"
             context_lines.append(context)
+            remaining -= len(context) + 2
+            if remaining <= 0:
+                break
         
-        return "\n\n".join(context_lines[:30])  # Limit to 30 memories to avoid token limit
+        return "\n\n".join(context_lines)
     
-    def _enhanced_search(self, query: str, memories: List[Dict]) -> Dict[str, Any]:
+    def _enhanced_search(self, db, query: str, memories: List[Dict]) -> Dict[str, Any]:
         """
         Enhanced search without AI - better than basic keyword matching.
         """
         query_analysis = self.understand_query(query)
         query_lower = query.lower()
         
+        # Person names go to the trigram name index, which also catches
+        # misspellings; only the memories mentioning them are scored
+        names = query_analysis["person_names"]
+        if len(names) > 1:
+            names = [' '.join(names)] + names
+        name_matches = {}
+        for match in name_index.match_names(db, names):
+            for mem_id in match["memory_ids"]:
+                name_matches[mem_id] = max(name_matches.get(mem_id, 0), match["similarity"])
+        if name_matches:
+            memories = [m for m in memories if m["id"] in name_matches]
+        
+        # Hashed TF-IDF similarity from the local vector index, no network
+        similarity = dict(vector_index.similar(db, query, limit=50))
+        
+        # Words were tokenized when each memory was saved
+        stored = memory_tokens.load(db, [m["id"] for m in memories])
+        keywords = [w for w in dict.fromkeys(words(query)) if len(w) > 3]
+        
         # Score each memory for relevance
         scored_memories = []
         for memory in memories:
             score = 0
             memory_text = memory['text'].lower()
+            tokens = stored.get(memory['id'])
+            memory_terms = set(tokens.terms) if tokens else set(terms(memory['text']))
             
-            # Person name matches (highest priority)
-            for name in query_analysis["person_names"]:
-                name_lower = name.lower()
-                if name_lower in memory_text:
-                    score += 40
-                    # Bonus for exact name match
-                    if re.search(r'\b' + re.escape(name_lower) + r'\b', memory_text):
-                        score += 20
+            # Person name matches (highest priority), closer spellings score higher
+            if memory['id'] in name_matches:
+                score += 40 + round(20 * name_matches[memory['id']])
+            
+            # Overall wording similarity to the question
+            score += round(50 * similarity.get(memory['id'], 0))
             
             # Location intent special handling
             if query_analysis["intent"] == "find_location" and "born" in query_lower:
@@ -270,9 +430,8 @@ class DeepSeekSearch:
                         break
             
             # Keyword matches
-            keywords = [w for w in query_lower.split() if len(w) > 3]
             for keyword in keywords:
-                if keyword in memory_text:
+                if keyword in memory_terms:
                     score += 10
             
             # Question-type specific bonuses
@@ -313,29 +472,13 @@ class DeepSeekSearch:
             "ai_generated": False
         }
     
-    def _get_all_memories(self) -> List[Dict]:
+    def _get_all_memories(self, db) -> List[Dict]:
         """Get all memories from database."""
         try:
-            db = get_db()
-            cursor = db.cursor()
-            
-            # Get memories with people information
-            cursor.execute("""
-                SELECT m.id, m.text, m.category, m.memory_date, m.year
-                FROM memories m
-                ORDER BY m.year DESC
-            """)
-            
             memories = []
-            for row in cursor.fetchall():
-                memories.append({
-                    "id": row[0],
-                    "text": row[1],
-                    "category": row[2],
-                    "date": row[3],
-                    "year": row[4],
-                    "people": []  # Will be populated if we have the people table
-                })
+            for memory in SEARCH_MEMORIES.dicts(db):
+                memory["people"] = []  # Will be populated if we have the people table
+                memories.append(memory)
             
             return memories
             
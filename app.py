@@ -1,22 +1,42 @@
 # app.py - Main Flask application
 import os
-from openai import OpenAI
-from anthropic import Anthropic
 from flask import Flask, render_template, jsonify, request, send_file, session, Response, redirect, url_for, flash
 from flask_cors import CORS
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
-from datetime import datetime
+from datetime import datetime, timezone
 from ai_photo_matcher import suggest_photos_for_memory, apply_suggestion, suggest_all_memories
 
 # Import our modules
-from database import init_db, get_db, migrate_db
-from search_engine import EnhancedSearch
+from database import init_db, get_db, migrate_db, init_app as init_db_app, pool_stats, read_snapshot
+from search_engine import EnhancedSearch, PAGE_SIZE, MAX_PAGE_SIZE
+import fts_index
+import search_index
+import name_index
+import vector_index
+import suggest_index
+import llm_cache
+import llm_clients
+import categorizer
+import memory_entities
+import memory_tokens
+import facets
+import write_behind
+import maintenance
+from data_access import (json_list_response, MEMORY_TIMELINE, MEDIA_LIBRARY,
+                         AVAILABLE_MEDIA, UNLINKED_PHOTOS, MEMORY_MEDIA,
+                         MEDIA_FILENAMES_SQL, MEMORY_SQL, BIOGRAPHY_MEMORIES_SQL,
+                         UPDATE_TRANSCRIPTION_SQL, DELETE_MEMORY_COMMENTS_SQL,
+                         DELETE_MEMORY_LINKS_SQL, DELETE_TRANSCRIPTION_SQL,
+                         DELETE_MEDIA_LINKS_SQL, CHAT_MESSAGE_INSERT, CHAT_HISTORY_SQL)
+from media_links import bulk_link, MAX_ORDER_SQL
 from ai_search import ai_searcher
-from utils import allowed_file, parse_date_input, categorize_memory
-from auth import User, create_user, authenticate_user, get_user_by_id, change_password, get_user_count
+from utils import allowed_file, parse_date_input
+from auth import User, create_user, authenticate_user, get_user_by_id, change_password, get_user_count, admin_required
 
 from werkzeug.utils import secure_filename
+import json
 import uuid
+import time
 import traceback
 from pdf_generator import generate_memory_pdf, generate_memory_album_pdf
 app = Flask(__name__)
@@ -42,12 +62,17 @@ app.config['MAX_CONTENT_LENGTH'] = 50 * 1024 * 1024  # 50MB max file size
 
 init_db()
 migrate_db()
+init_db_app(app)
+maintenance.start_scheduler()
+categorizer.start_worker()
 
 # Add to app.py after init_db()
 def scan_existing_uploads():
     """Scan uploads folder and add any missing files to database."""
+    # Runs at import time, outside an app context, so this is a standalone
+    # connection rather than a pooled one and must be closed here.
+    db = get_db()
     try:
-        db = get_db()
         cursor = db.cursor()
         
         uploads_dir = app.config['UPLOAD_FOLDER']
@@ -55,7 +80,7 @@ def scan_existing_uploads():
             return
         
         # Get existing filenames from database
-        cursor.execute("SELECT filename FROM media")
+        cursor.execute(MEDIA_FILENAMES_SQL)
         existing = {row[0] for row in cursor.fetchall()}
         
         added = 0
@@ -93,6 +118,8 @@ def scan_existing_uploads():
             
     except Exception as e:
         print(f"Error scanning uploads: {e}")
+    finally:
+        db.close()
 
 # Call this after init_db()
 scan_existing_uploads()
@@ -100,15 +127,9 @@ scan_existing_uploads()
 def generate_biography_deepseek(memories):
     """Generate biography using DeepSeek API."""
     try:
-        api_key = os.getenv('DEEPSEEK_API_KEY')
-        if not api_key:
+        if not llm_clients.available('deepseek'):
             raise ValueError("DEEPSEEK_API_KEY not configured")
         
-        client = OpenAI(
-            api_key=api_key,
-            base_url="https://api.deepseek.com"
-        )
-        
         # Prepare memories text
         memories_text = "\n\n".join([
             f"Year: {m['year'] or 'Unknown'}\n{m['text']}"
@@ -141,14 +162,19 @@ FORMAT:
 
 Begin the biography now:"""
 
-        response = client.chat.completions.create(
-            model="deepseek-chat",
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=4000,
-            temperature=0.7
+        messages = [{"role": "user", "content": prompt}]
+        # Regenerating over unchanged memories is answered from the shared cache
+        return llm_cache.cached_call(
+            "deepseek", "deepseek-chat", messages,
+            lambda: llm_clients.create(
+                "deepseek", "biography",
+                model="deepseek-chat",
+                messages=messages,
+                max_tokens=4000,
+                temperature=0.7
+            ).choices[0].message.content,
+            max_tokens=4000, temperature=0.7
         )
-        
-        return response.choices[0].message.content
     except Exception as e:
         print(f"DeepSeek API error: {e}")
         raise
@@ -156,12 +182,9 @@ Begin the biography now:"""
 def generate_biography_claude(memories):
     """Generate biography using Claude API."""
     try:
-        api_key = os.getenv('ANTHROPIC_API_KEY')
-        if not api_key:
+        if not llm_clients.available('anthropic'):
             raise ValueError("ANTHROPIC_API_KEY not configured")
         
-        client = Anthropic(api_key=api_key)
-        
         # Prepare memories text
         memories_text = "\n\n".join([
             f"Year: {m['year'] or 'Unknown'}\n{m['text']}"
@@ -191,14 +214,18 @@ Use markdown with # for chapter headings. Each chapter should flow naturally.
 
 Begin writing the biography now:"""
 
-        response = client.messages.create(
-            model="claude-sonnet-4-5",  # Alias - auto-updates to latest
-            max_tokens=4000,
-            temperature=0.7,
-            messages=[{"role": "user", "content": prompt}]
+        messages = [{"role": "user", "content": prompt}]
+        return llm_cache.cached_call(
+            "anthropic", "claude-sonnet-4-5", messages,
+            lambda: llm_clients.create(
+                "anthropic", "biography",
+                model="claude-sonnet-4-5",  # Alias - auto-updates to latest
+                max_tokens=4000,
+                temperature=0.7,
+                messages=messages
+            ).content[0].text,
+            max_tokens=4000, temperature=0.7
         )
-        
-        return response.content[0].text
     except Exception as e:
         print(f"Claude API error: {e}")
         raise
@@ -338,7 +365,6 @@ def index():
     cursor = db.cursor()
     cursor.execute("SELECT COUNT(*) as count FROM user_profile")
     profile_count = cursor.fetchone()['count']
-    db.close()
     
     # If no profile exists, show onboarding form
     if profile_count == 0:
@@ -464,34 +490,39 @@ def save_memory():
                     except:
                         year = None
         
-        # Categorize memory
-        category = categorize_memory(text, year=year)
+        # Keyword category now; the background categorizer refines it
+        category, category_status = categorizer.provisional_category(text, year=year)
         
         # Save to database
         db = get_db()
         cursor = db.cursor()
         cursor.execute('''INSERT INTO memories 
-                         (text, category, memory_date, year, audio_filename, created_at) 
-                         VALUES (?, ?, ?, ?, ?, ?)''',
+                         (text, category, memory_date, year, audio_filename, created_at,
+                          category_status, category_due_at) 
+                         VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
                       (text, category, parsed_date, year, 
                        audio_filename if audio_filename else None,
-                       datetime.now().isoformat()))
+                       datetime.now().isoformat(), category_status, time.time()))
         
-        db.commit()
         memory_id = cursor.lastrowid
+        tokens = memory_tokens.store(db, memory_id, text)
+        memory_entities.store(db, memory_id, tokens)
+        db.commit()
+        search_index.sync(db)
+        vector_index.sync(db)
         
         # If audio was recorded, update the transcription record
         if audio_filename:
-            cursor.execute('''UPDATE audio_transcriptions 
-                             SET transcription_text = ? 
-                             WHERE audio_filename = ?''',
-                          (text, audio_filename))
+            cursor.execute(UPDATE_TRANSCRIPTION_SQL, (text, audio_filename))
             db.commit()
         
+        categorizer.wake()
+        
         return jsonify({
             "status": "success",
             "memory_id": memory_id,
             "category": category,
+            "category_status": category_status,
             "has_audio": bool(audio_filename)
         })
         
@@ -521,12 +552,14 @@ def delete_memory(memory_id):
         cursor.execute('DELETE FROM memories WHERE id = ?', (memory_id,))
         
         # Delete associated comments if any
-        cursor.execute('DELETE FROM comments WHERE memory_id = ?', (memory_id,))
+        cursor.execute(DELETE_MEMORY_COMMENTS_SQL, (memory_id,))
         
         # Delete associated media links
-        cursor.execute('DELETE FROM memory_media WHERE memory_id = ?', (memory_id,))
+        cursor.execute(DELETE_MEMORY_LINKS_SQL, (memory_id,))
         
         db.commit()
+        search_index.sync(db)
+        vector_index.sync(db)
         
         # Delete audio file if it exists
         if audio_filename:
@@ -535,7 +568,7 @@ def delete_memory(memory_id):
                 os.remove(audio_path)
             
             # Delete from audio_transcriptions table
-            cursor.execute('DELETE FROM audio_transcriptions WHERE audio_filename = ?', (audio_filename,))
+            cursor.execute(DELETE_TRANSCRIPTION_SQL, (audio_filename,))
             db.commit()
         
         return jsonify({
@@ -553,30 +586,8 @@ def delete_memory(memory_id):
 def get_memories():
     """Get all memories for the timeline."""
     try:
-        db = get_db()
-        cursor = db.cursor()
-        cursor.execute('''SELECT id, text, category, memory_date, year, 
-                         audio_filename, created_at 
-                         FROM memories 
-                         ORDER BY COALESCE(year, 9999) ASC, created_at ASC''')
-        
-        memories = []
-        for row in cursor.fetchall():
-            memories.append({
-                'id': row[0],
-                'text': row[1],
-                'category': row[2],
-                'memory_date': row[3],
-                'year': row[4],
-                'audio_filename': row[5],
-                'created_at': row[6],
-                'has_audio': bool(row[5])
-            })
-        
-        return jsonify({
-            "status": "success",
-            "memories": memories
-        })
+        return json_list_response(MEMORY_TIMELINE, get_db(),
+                                  key='memories', envelope={"status": "success"})
         
     except Exception as e:
         print(f"Error getting memories: {e}")
@@ -587,31 +598,7 @@ def get_memories():
 def get_memory_media(memory_id):
     """Get all media linked to a specific memory."""
     try:
-        db = get_db()
-        cursor = db.execute('''
-            SELECT m.id, m.filename, m.original_filename, m.file_type, 
-                   m.title, m.description, m.media_date, m.year, 
-                   mm.display_order
-            FROM media m
-            JOIN memory_media mm ON m.id = mm.media_id
-            WHERE mm.memory_id = ?
-            ORDER BY mm.display_order
-        ''', (memory_id,))
-        
-        media = []
-        for row in cursor.fetchall():
-            media.append({
-                'id': row[0],
-                'filename': row[1],
-                'original_filename': row[2],
-                'file_type': row[3],
-                'title': row[4],
-                'description': row[5],
-                'media_date': row[6],
-                'year': row[7],
-                'display_order': row[8]
-            })
-        
+        media = list(MEMORY_MEDIA.dicts(get_db(), (memory_id,)))
         return jsonify({'status': 'success', 'media': media})
     except Exception as e:
         return jsonify({'status': 'error', 'error': str(e)}), 500
@@ -622,10 +609,7 @@ def add_media_to_memory(memory_id, media_id):
     """Link a single media item to a memory."""
     try:
         db = get_db()
-        cursor = db.execute(
-            'SELECT COALESCE(MAX(display_order), -1) FROM memory_media WHERE memory_id = ?',
-            (memory_id,)
-        )
+        cursor = db.execute(MAX_ORDER_SQL, (memory_id,))
         max_order = cursor.fetchone()[0]
         
         db.execute(
@@ -661,27 +645,44 @@ def link_multiple_media_to_memory(memory_id):
         data = request.json
         media_ids = data.get('media_ids', [])
         
-        db = get_db()
-        
-        # Clear existing links for this memory
-        db.execute('DELETE FROM memory_media WHERE memory_id = ?', (memory_id,))
+        result = bulk_link(get_db(), [(memory_id, media_ids)])
         
-        # Add new links with order
-        for order, media_id in enumerate(media_ids):
-            db.execute(
-                'INSERT INTO memory_media (memory_id, media_id, display_order) VALUES (?, ?, ?)',
-                (memory_id, media_id, order)
-            )
+        return jsonify({
+            'status': 'success', 
+            'message': f'Linked {result["links"]} media items to memory'
+        })
+    
+    except ValueError as e:
+        return jsonify({'status': 'error', 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'status': 'error', 'error': str(e)}), 500
+
+@app.route('/api/memories/media/bulk-link', methods=['POST'])
+@login_required
+def bulk_link_media():
+    """Link media to many memories in a single transaction.
+    
+    Body: {"links": [{"memory_id": 1, "media_ids": [3, 5]}, ...], "replace": true}
+    "links" may also be an object of memory_id -> media_ids.
+    """
+    try:
+        data = request.json or {}
+        links = data.get('links')
+        if not isinstance(links, (list, dict)):
+            return jsonify({'status': 'error', 'error': 'links must be a list or object'}), 400
         
-        db.commit()
+        result = bulk_link(get_db(), links, replace=data.get('replace', True))
         
         return jsonify({
-            'status': 'success', 
-            'message': f'Linked {len(media_ids)} media items to memory'
+            'status': 'success',
+            'memories': result['memories'],
+            'links': result['links']
         })
     
+    except ValueError as e:
+        return jsonify({'status': 'error', 'error': str(e)}), 400
     except Exception as e:
-        db.rollback()
+        print(f"Bulk link error: {e}")
         return jsonify({'status': 'error', 'error': str(e)}), 500
 
 @app.route('/api/media/available', methods=['GET'])
@@ -689,31 +690,8 @@ def link_multiple_media_to_memory(memory_id):
 def get_available_media():
     """Get all available media for linking (used by photo picker UI)."""
     try:
-        db = get_db()
-        cursor = db.execute('''
-            SELECT id, filename, original_filename, file_type, 
-                   title, description, memory_date, year, created_at
-            FROM media
-            ORDER BY 
-                CASE WHEN year IS NOT NULL THEN year ELSE 9999 END DESC,
-                created_at DESC
-        ''')
-        
-        media = []
-        for row in cursor.fetchall():
-            media.append({
-                'id': row[0],
-                'filename': row[1],
-                'original_filename': row[2],
-                'file_type': row[3],
-                'title': row[4],
-                'description': row[5],
-                'media_date': row[6],
-                'year': row[7],
-                'created_at': row[8]
-            })
-        
-        return jsonify({'status': 'success', 'media': media})
+        return json_list_response(AVAILABLE_MEDIA, get_db(),
+                                  key='media', envelope={'status': 'success'})
     
     except Exception as e:
         return jsonify({'status': 'error', 'error': str(e)}), 500
@@ -756,17 +734,23 @@ def update_memory(memory_id):
                 year = existing[0]
                 fuzzy_date = existing[1]
         
-        # Get category
-        category = categorize_memory(text, year=year)
+        # Keyword category now; the background categorizer refines it
+        category, category_status = categorizer.provisional_category(text, year=year)
         
         # Update memory
         db.execute('''
             UPDATE memories 
-            SET text = ?, category = ?, memory_date = ?, year = ?
+            SET text = ?, category = ?, memory_date = ?, year = ?,
+                category_status = ?, category_attempts = 0, category_due_at = ?
             WHERE id = ?
-        ''', (text, category, fuzzy_date, year, memory_id))
+        ''', (text, category, fuzzy_date, year, category_status, time.time(), memory_id))
+        tokens = memory_tokens.store(db, memory_id, text)
+        memory_entities.store(db, memory_id, tokens)
         
         db.commit()
+        search_index.sync(db)
+        vector_index.sync(db)
+        categorizer.wake()
         
         return jsonify({
             "status": "success",
@@ -775,6 +759,7 @@ def update_memory(memory_id):
                 "id": memory_id,
                 "text": text,
                 "category": category,
+                "category_status": category_status,
                 "year": year,
                 "date": fuzzy_date
             }
@@ -790,11 +775,7 @@ def get_memory(memory_id):
     """Get a specific memory for editing."""
     try:
         db = get_db()
-        cursor = db.execute('''
-            SELECT id, text, category, memory_date, year, created_at
-            FROM memories
-            WHERE id = ?
-        ''', (memory_id,))
+        cursor = db.execute(MEMORY_SQL, (memory_id,))
         
         memory = cursor.fetchone()
         
@@ -819,9 +800,28 @@ def get_memory(memory_id):
         print(f"Get memory error: {e}")
         return jsonify({"status": "error", "message": "Failed to retrieve memory"}), 500
 
+@app.route('/api/memories/<int:memory_id>/category', methods=['GET'])
+@login_required
+def memory_category(memory_id):
+    """Category of a memory and whether the background categorizer is still refining it."""
+    try:
+        result = categorizer.status(get_db(), memory_id)
+        if result is None:
+            return jsonify({"status": "error", "message": "Memory not found"}), 404
+        return jsonify({
+            "status": "success",
+            "memory_id": memory_id,
+            **result,
+            "pending": result["category_status"] in categorizer.PENDING
+        })
+    except Exception as e:
+        print(f"Memory category error: {e}")
+        return jsonify({"status": "error", "message": "Failed to retrieve category"}), 500
+
 @app.route('/api/search/smart', methods=['POST'])
 @login_required
 def smart_search():
+    """Ranked memory search. Send "limit" and/or "cursor" for paged results."""
     try:
         data = request.json
         query = data.get('query', '').strip()
@@ -830,11 +830,85 @@ def smart_search():
             return jsonify({"status": "error", "message": "No query provided"}), 400
         
         search_engine = EnhancedSearch()
-        results = search_engine.search_memories(query)
+        if 'limit' not in data and 'cursor' not in data:
+            return jsonify(search_engine.search_memories(query))
+        
+        # Paged form: {"query", "limit", "cursor"} -> results plus next_cursor
+        try:
+            limit = int(data.get('limit') or PAGE_SIZE)
+        except (TypeError, ValueError):
+            return jsonify({"status": "error", "message": "limit must be an integer"}), 400
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        try:
+            results, next_cursor = search_engine.search_page(query, limit=limit, cursor=data.get('cursor'))
+        except ValueError as e:
+            return jsonify({"status": "error", "message": str(e)}), 400
+        
+        return jsonify({
+            "status": "success",
+            "results": results,
+            "limit": limit,
+            "next_cursor": next_cursor
+        })
+        
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+@app.route('/api/search/facets', methods=['GET'])
+@login_required
+def search_facets():
+    """Memory counts by category, decade and person for a query and filters.
+    
+    Query string: q, category, decade (e.g. 1960), person, people_limit.
+    """
+    try:
+        decade = request.args.get('decade', type=int)
+        people_limit = max(1, min(request.args.get('people_limit', facets.PERSON_LIMIT, type=int), 200))
+        filters = {
+            "query": request.args.get('q') or None,
+            "category": request.args.get('category') or None,
+            "decade": decade // 10 * 10 if decade is not None else None,
+            "person": request.args.get('person') or None,
+        }
+        
+        total, counts = facets.facet_counts(get_db(), person_limit=people_limit, **filters)
+        
+        return jsonify({
+            "status": "success",
+            "total": total,
+            "facets": counts,
+            "filters": filters
+        })
+        
+    except Exception as e:
+        print(f"Facet search error: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+@app.route('/api/search/suggest', methods=['GET'])
+@login_required
+def search_suggest():
+    """Completions for the end of the search box text, one call per keystroke.
+    
+    Query string: q, kind (person, place, title or category; repeatable), limit.
+    Replace the last `replace_words` words of q with a suggestion's value.
+    """
+    try:
+        query = request.args.get('q', '')
+        limit = max(1, min(request.args.get('limit', suggest_index.LIMIT, type=int), 20))
+        kinds = tuple(k for k in request.args.getlist('kind') if k in suggest_index.KINDS) or suggest_index.KINDS
         
-        return jsonify(results)
+        index = suggest_index.get_index(get_db())
+        replace_words, suggestions = index.suggest(query, limit=limit, kinds=kinds)
+        
+        return jsonify({
+            "status": "success",
+            "query": query,
+            "replace_words": replace_words,
+            "suggestions": suggestions
+        })
         
     except Exception as e:
+        print(f"Suggest error: {e}")
         return jsonify({"status": "error", "message": str(e)}), 500
 
 @app.route('/api/search/ai', methods=['POST'])
@@ -1027,11 +1101,7 @@ def generate_biography_draft():
         
         # Fetch all memories
         db = get_db()
-        cursor = db.execute('''
-            SELECT id, text, year, category, memory_date
-            FROM memories
-            ORDER BY COALESCE(year, 9999) ASC, created_at ASC
-        ''')
+        cursor = db.execute(BIOGRAPHY_MEMORIES_SQL)
         
         memories = []
         for row in cursor.fetchall():
@@ -1155,18 +1225,16 @@ def generate_biography_pdf_route():
                 'message': 'PDF generation module not available'
             }), 500
         
-        # Get database connection
-        db = get_db()
-        
-        # Generate PDF WITH database connection
-        pdf_buffer = generate_biography_pdf(
-            chapters,
-            title,
-            subtitle,
-            UPLOAD_FOLDER,
-            hero_photo=None,
-            db_connection=db
-        )
+        # Read photos from a snapshot so a long render never blocks writers
+        with read_snapshot() as db:
+            pdf_buffer = generate_biography_pdf(
+                chapters,
+                title,
+                subtitle,
+                UPLOAD_FOLDER,
+                hero_photo=None,
+                db_connection=db
+            )
         
         filename = f'family_biography_{title.replace(" ", "_").lower()}.pdf'
         
@@ -1225,37 +1293,42 @@ def serve_uploaded_file(filename):
 def get_all_media():
     """Get all uploaded media files."""
     try:
+        return json_list_response(MEDIA_LIBRARY, get_db())
+        
+    except Exception as e:
+        print(f"Error getting media: {e}")
+        return jsonify({"status": "error", "message": "Failed to retrieve media"}), 500
+
+@app.route('/api/media/search', methods=['GET'])
+@login_required
+def search_media():
+    """Full-text search over media titles, descriptions and people."""
+    try:
+        query = request.args.get('q', '').strip()
+        limit = min(request.args.get('limit', 50, type=int), 200)
+        
+        if not query:
+            return jsonify({"status": "error", "message": "No query provided"}), 400
+        
         db = get_db()
-        cursor = db.cursor()
-        cursor.execute("""
-            SELECT id, filename, original_filename, file_type, file_size, title, 
-                   description, memory_date, year, people, created_at 
-            FROM media 
-            ORDER BY created_at DESC
-        """)
-        
-        media_items = []
-        for row in cursor.fetchall():
-            media_items.append({
-                "id": row[0],
-                "filename": row[1],
-                "original_filename": row[2],
-                "file_type": row[3],
-                "file_size": row[4],
-                "title": row[5],
-                "description": row[6],
-                "memory_date": row[7],
-                "year": row[8],
-                "people": row[9],
-                "created_at": row[10],
-                "url": f"/uploads/{row[1]}"
+        results = []
+        for row in fts_index.search_media(db, query, limit):
+            results.append({
+                "id": row['id'],
+                "filename": row['filename'],
+                "title": row['title'],
+                "description": row['description'],
+                "people": row['people'],
+                "year": row['year'],
+                "file_type": row['file_type'],
+                "url": f"/uploads/{row['filename']}"
             })
         
-        return jsonify(media_items)
+        return jsonify({"status": "success", "query": query, "media": results})
         
     except Exception as e:
-        print(f"Error getting media: {e}")
-        return jsonify({"status": "error", "message": "Failed to retrieve media"}), 500
+        print(f"Media search error: {e}")
+        return jsonify({"status": "error", "message": "Failed to search media"}), 500
 
 @app.route('/api/media/delete/<int:media_id>', methods=['DELETE'])
 @login_required
@@ -1276,7 +1349,7 @@ def delete_media(media_id):
         filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
         
         # Delete from memory_media links first
-        cursor.execute("DELETE FROM memory_media WHERE media_id = ?", (media_id,))
+        cursor.execute(DELETE_MEDIA_LINKS_SQL, (media_id,))
         
         # Delete from database
         cursor.execute("DELETE FROM media WHERE id = ?", (media_id,))
@@ -1425,38 +1498,13 @@ def get_photo_suggestions(memory_id):
 def browse_all_photos(memory_id):
     """Get all unlinked photos for manual selection."""
     try:
-        db = get_db()
-        
-        # Get all photos NOT already linked to this memory
-        cursor = db.execute('''
-            SELECT m.id, m.filename, m.title, m.description, m.year
-            FROM media m
-            WHERE m.file_type = 'image'
-            AND m.id NOT IN (
-                SELECT media_id FROM memory_media WHERE memory_id = ?
-            )
-            ORDER BY m.year DESC, m.created_at DESC
-        ''', (memory_id,))
-        
-        photos = cursor.fetchall()
-        
-        results = []
-        for photo in photos:
-            photo_id, filename, title, desc, year = photo
-            results.append({
-                'id': photo_id,
-                'filename': filename,
-                'title': title or filename,
-                'description': desc or '',
-                'year': year or 'Unknown'
-            })
-        
-        return jsonify({
-            'status': 'success',
-            'memory_id': memory_id,
-            'photos': results,
-            'count': len(results)
-        })
+        # All photos NOT already linked to this memory
+        return json_list_response(
+            UNLINKED_PHOTOS, get_db(), (memory_id,),
+            key='photos',
+            envelope={'status': 'success', 'memory_id': memory_id},
+            trailer=lambda count: {'count': count},
+        )
     
     except Exception as e:
         print(f"Browse photos error: {e}")
@@ -1564,6 +1612,56 @@ def debug_media():
         "uploads_folder": uploads_dir
     })
 
+@app.route('/api/debug/db', methods=['GET'])
+@login_required
+def debug_db():
+    """Debug endpoint exposing connection pool, write-behind, search, name, vector and suggest index, cache and LLM client statistics."""
+    stats = pool_stats()
+    stats['write_behind'] = write_behind.stats()
+    stats['search_index'] = search_index.memory_index.stats()
+    stats['name_index'] = name_index.name_index.stats()
+    stats['vector_index'] = vector_index.vector_index.stats()
+    stats['suggest_index'] = suggest_index.suggest_index.stats()
+    stats['llm_cache'] = llm_cache.stats(get_db())
+    stats['llm_clients'] = llm_clients.stats()
+    stats['query_cache'] = {
+        'smart': EnhancedSearch.cache.stats(),
+        'ai': ai_searcher.cache.stats(),
+    }
+    return jsonify(stats)
+
+@app.route('/api/admin/maintenance', methods=['GET'])
+@admin_required
+def maintenance_status():
+    """Database space usage and the recent maintenance log."""
+    try:
+        db = get_db()
+        return jsonify({
+            'status': 'success',
+            'database': maintenance.status(db),
+            'runs': maintenance.recent_runs(db)
+        })
+    except Exception as e:
+        print(f"Maintenance status error: {e}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@app.route('/api/admin/maintenance', methods=['POST'])
+@admin_required
+def run_maintenance_now():
+    """Run maintenance tasks now. Body: {"tasks": ["analyze", ...]} (default: all)."""
+    try:
+        data = request.get_json(silent=True) or {}
+        tasks = data.get('tasks')
+        if tasks is not None and not isinstance(tasks, list):
+            return jsonify({'status': 'error', 'message': 'tasks must be a list'}), 400
+        results = maintenance.run_maintenance(tasks, force=True)
+        return jsonify({'status': 'success', 'results': results})
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    except Exception as e:
+        print(f"Maintenance error: {e}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
 # ============================================
 # ERROR HANDLERS
 # ============================================
@@ -1592,38 +1690,46 @@ def get_chat_session_id():
     return session['chat_session_id']
 
 def save_chat_message(session_id, role, message, tokens_used=0):
-    """Save a chat message to database"""
-    db = get_db()
-    cursor = db.cursor()
-    
-    cursor.execute("""
-        INSERT INTO chat_messages (session_id, role, message, tokens_used)
-        VALUES (?, ?, ?, ?)
-    """, (session_id, role, message, tokens_used))
-    
-    db.commit()
+    """Queue a chat message for the write-behind buffer"""
+    # Stamp it now (same format as CURRENT_TIMESTAMP) rather than at flush time
+    timestamp = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+    write_behind.submit(CHAT_MESSAGE_INSERT, (session_id, timestamp, role, message, tokens_used))
 
 def get_chat_history(session_id, limit=50):
     """Retrieve recent chat history for context"""
     db = get_db()
-    cursor = db.cursor()
+    # Messages still in the write-behind buffer are merged in, not flushed
+    with write_behind.holding():
+        stored = db.execute(CHAT_HISTORY_SQL, (session_id, limit)).fetchall()
+        queued = [params for params in write_behind.pending(CHAT_MESSAGE_INSERT) if params[0] == session_id]
     
-    cursor.execute("""
-        SELECT role, message, timestamp
-        FROM chat_messages
-        WHERE session_id = ?
-        ORDER BY timestamp DESC
-        LIMIT ?
-    """, (session_id, limit))
-    
-    messages = cursor.fetchall()
-    return [
+    # Oldest first; a queued message was submitted after every stored one
+    messages = [
         {
             'role': msg[0],
             'content': msg[1],
             'timestamp': msg[2]
         }
-        for msg in reversed(messages)
+        for msg in reversed(stored)
+    ]
+    messages.extend(
+        {'role': role, 'content': message, 'timestamp': timestamp}
+        for _, timestamp, role, message, _ in queued
+    )
+    return messages[-limit:]
+
+def search_chat_history(query, limit=10):
+    """Search past chat messages, ranked by the full-text index"""
+    db = get_db()
+    
+    return [
+        {
+            'role': msg['role'],
+            'message': msg['message'],
+            'timestamp': msg['timestamp'],
+            'session_id': msg['session_id']
+        }
+        for msg in fts_index.search_chat(db, query, limit)
     ]
 
 @app.route('/chat')
@@ -1632,6 +1738,37 @@ def chat_page():
     """Render chat interface"""
     return render_template('chat.html')
 
+CHAT_SYSTEM_PROMPT = '''You are a thoughtful AI companion in The Circle, a memory preservation app. 
+
+Your role is to:
+- Have natural, friendly conversations
+- Help users reflect on their experiences
+- Ask thoughtful follow-up questions
+- Remember context from the conversation
+- Gently encourage users to share stories worth preserving
+
+Keep responses conversational and warm, not formal or robotic.'''
+
+def build_chat_messages(session_id, user_message):
+    """Queue the user's message and return the DeepSeek messages for this turn"""
+    # Read history before queueing the new message, or the buffer merge
+    # would return it twice
+    history = get_chat_history(session_id, limit=19)
+    history.append({'role': 'user', 'content': user_message})
+    save_chat_message(session_id, 'user', user_message)
+    
+    messages = [{'role': 'system', 'content': CHAT_SYSTEM_PROMPT}]
+    for msg in history:
+        messages.append({
+            'role': msg['role'],
+            'content': msg['content']
+        })
+    return messages
+
+def sse_event(event, data):
+    """One Server-Sent Events frame with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
 @app.route('/api/chat/send', methods=['POST'])
 @login_required
 def chat_send():
@@ -1644,39 +1781,11 @@ def chat_send():
             return jsonify({'error': 'Empty message'}), 400
         
         session_id = get_chat_session_id()
-        save_chat_message(session_id, 'user', user_message)
-        
-        history = get_chat_history(session_id, limit=20)
-        
-        messages = [
-            {
-                'role': 'system',
-                'content': '''You are a thoughtful AI companion in The Circle, a memory preservation app. 
-
-Your role is to:
-- Have natural, friendly conversations
-- Help users reflect on their experiences
-- Ask thoughtful follow-up questions
-- Remember context from the conversation
-- Gently encourage users to share stories worth preserving
-
-Keep responses conversational and warm, not formal or robotic.'''
-            }
-        ]
-        
-        for msg in history:
-            messages.append({
-                'role': msg['role'],
-                'content': msg['content']
-            })
+        messages = build_chat_messages(session_id, user_message)
         
         # Use DeepSeek
-        client = OpenAI(
-            api_key=os.getenv('DEEPSEEK_API_KEY'),
-            base_url="https://api.deepseek.com"
-        )
-        
-        response = client.chat.completions.create(
+        response = llm_clients.create(
+            'deepseek', 'chat',
             model='deepseek-chat',
             messages=messages,
             temperature=0.7,
@@ -1700,6 +1809,72 @@ Keep responses conversational and warm, not formal or robotic.'''
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/chat/stream', methods=['POST'])
+@login_required
+def chat_stream():
+    """Send message and stream the AI response as Server-Sent Events.
+
+    Events: "delta" {"text"} for each piece of the reply as DeepSeek
+    writes it, then "done" {"message", "timestamp", "tokens_used"} once
+    the reply is saved, or "error" {"error"}.
+    """
+    data = request.json or {}
+    user_message = data.get('message', '').strip()
+    
+    if not user_message:
+        return jsonify({'error': 'Empty message'}), 400
+    
+    try:
+        session_id = get_chat_session_id()
+        messages = build_chat_messages(session_id, user_message)
+        # Opening the stream is retried like any call; once tokens flow it is not
+        stream = llm_clients.create(
+            'deepseek', 'chat',
+            model='deepseek-chat',
+            messages=messages,
+            temperature=0.7,
+            max_tokens=500,
+            stream=True,
+            stream_options={'include_usage': True}
+        )
+    except Exception as e:
+        print(f"Chat stream error: {e}")
+        return jsonify({'error': str(e)}), 500
+    
+    def generate():
+        # Runs after the request has ended, so it touches neither the
+        # request, the session nor the request's database connection
+        parts = []
+        tokens_used = 0
+        finished = False
+        try:
+            for chunk in stream:
+                if chunk.usage:
+                    tokens_used = chunk.usage.total_tokens
+                if chunk.choices and chunk.choices[0].delta.content:
+                    parts.append(chunk.choices[0].delta.content)
+                    yield sse_event('delta', {'text': chunk.choices[0].delta.content})
+            finished = True
+        except Exception as e:
+            print(f"Chat stream error: {e}")
+            yield sse_event('error', {'error': str(e)})
+        finally:
+            stream.close()
+            # A reply cut short by a closed tab is still kept
+            if parts:
+                save_chat_message(session_id, 'assistant', ''.join(parts), tokens_used)
+        if finished:
+            yield sse_event('done', {
+                'message': ''.join(parts),
+                'timestamp': datetime.now().isoformat(),
+                'tokens_used': tokens_used
+            })
+    
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'  # let nginx pass each event straight through
+    })
+
 @app.route('/api/chat/history')
 @login_required
 def chat_history():
@@ -1712,6 +1887,19 @@ def chat_history():
         'session_id': session_id
     })
 
+@app.route('/api/chat/search')
+@login_required
+def chat_search():
+    """Search chat history"""
+    query = request.args.get('q', '')
+    
+    if not query:
+        return jsonify({'results': []})
+    
+    results = search_chat_history(query, limit=20)
+    
+    return jsonify({'results': results})
+
 @app.route('/api/chat/new-session', methods=['POST'])
 @login_required
 def new_chat_session():
@@ -1,9 +1,20 @@
 # auth.py - User authentication and management
 import bcrypt
+import os
 import sqlite3
 from datetime import datetime
-from flask_login import UserMixin
+from functools import wraps
+from flask import jsonify
+from flask_login import UserMixin, current_user
 from database import get_db
+import write_behind
+
+# Comma-separated usernames allowed to use admin endpoints. When unset,
+# the first account created (the family administrator) is the admin.
+ADMIN_USERNAMES = {name.strip() for name in os.getenv('ADMIN_USERNAMES', '').split(',') if name.strip()}
+
+_LOGIN_SQL = "SELECT id, username, email, password_hash FROM users WHERE username = ?"
+_USER_COUNT_SQL = "SELECT COUNT(*) as count FROM users"
 
 class User(UserMixin):
     """User class for Flask-Login"""
@@ -42,7 +53,6 @@ def create_user(username, password, email=None):
         )
         db.commit()
         user_id = cursor.lastrowid
-        db.close()
         
         return User(user_id, username, email), None
     except Exception as e:
@@ -55,7 +65,6 @@ def get_user_by_username(username):
         cursor = db.cursor()
         cursor.execute("SELECT id, username, email FROM users WHERE username = ?", (username,))
         row = cursor.fetchone()
-        db.close()
         
         if row:
             return User(row['id'], row['username'], row['email'])
@@ -71,7 +80,6 @@ def get_user_by_id(user_id):
         cursor = db.cursor()
         cursor.execute("SELECT id, username, email FROM users WHERE id = ?", (user_id,))
         row = cursor.fetchone()
-        db.close()
         
         if row:
             return User(row['id'], row['username'], row['email'])
@@ -85,18 +93,16 @@ def authenticate_user(username, password):
     try:
         db = get_db()
         cursor = db.cursor()
-        cursor.execute("SELECT id, username, email, password_hash FROM users WHERE username = ?", (username,))
+        cursor.execute(_LOGIN_SQL, (username,))
         row = cursor.fetchone()
         
         if row and verify_password(password, row['password_hash']):
-            # Update last login
-            cursor.execute("UPDATE users SET last_login = ? WHERE id = ?", 
-                         (datetime.now().isoformat(), row['id']))
-            db.commit()
-            db.close()
+            # Update last login off the request path; repeat logins coalesce
+            write_behind.submit("UPDATE users SET last_login = ? WHERE id = ?",
+                                (datetime.now().isoformat(), row['id']),
+                                key=('last_login', row['id']))
             return User(row['id'], row['username'], row['email'])
         
-        db.close()
         return None
     except Exception as e:
         print(f"Authentication error: {e}")
@@ -113,14 +119,12 @@ def change_password(user_id, old_password, new_password):
         row = cursor.fetchone()
         
         if not row or not verify_password(old_password, row['password_hash']):
-            db.close()
             return False, "Current password is incorrect"
         
         # Update to new password
         new_hash = hash_password(new_password)
         cursor.execute("UPDATE users SET password_hash = ? WHERE id = ?", (new_hash, user_id))
         db.commit()
-        db.close()
         
         return True, "Password changed successfully"
     except Exception as e:
@@ -131,10 +135,29 @@ def get_user_count():
     try:
         db = get_db()
         cursor = db.cursor()
-        cursor.execute("SELECT COUNT(*) as count FROM users")
+        cursor.execute(_USER_COUNT_SQL)
         count = cursor.fetchone()['count']
-        db.close()
         return count
     except Exception as e:
         print(f"Error counting users: {e}")
         return 0
+
+def is_admin(user):
+    """Check whether a user may use admin endpoints"""
+    if not user or not user.is_authenticated:
+        return False
+    if ADMIN_USERNAMES:
+        return user.username in ADMIN_USERNAMES
+    row = get_db().execute("SELECT MIN(id) FROM users").fetchone()
+    return row[0] is not None and row[0] == int(user.id)
+
+def admin_required(view):
+    """Like login_required, but for admins only"""
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        if not current_user.is_authenticated:
+            return jsonify({"status": "error", "message": "Login required"}), 401
+        if not is_admin(current_user):
+            return jsonify({"status": "error", "message": "Admin access required"}), 403
+        return view(*args, **kwargs)
+    return wrapped
@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+Online backup and restore for the memories database.
+
+Backups use the SQLite backup API, copying BACKUP_PAGES pages per step
+and pausing between steps, so a large archive is copied in the
+background without holding a lock long enough for users to notice.
+
+In WAL mode the source connection holds one read transaction for the
+whole copy. Writers carry on, and the backup is the database exactly as
+it was when the copy started. Without that pin, every concurrent write
+would restart the copy from the first page. With a rollback journal a
+read transaction would block writers, so the copy runs in a single step
+instead.
+
+Each backup is checked with PRAGMA quick_check, switched to a rollback
+journal so it is one self-contained file, then renamed into place.
+Retention keeps the newest KEEP_LAST backups plus the newest backup of
+each of the last KEEP_DAILY days and KEEP_WEEKLY ISO weeks.
+
+Usage:
+    python backup.py create [--pages 256] [--sleep-ms 5]
+    python backup.py list
+    python backup.py prune [--dry-run]
+    python backup.py verify backups/circle_memories-20240101-020000.db
+    python backup.py restore backups/circle_memories-20240101-020000.db
+"""
+
+import os
+import re
+import sqlite3
+import sys
+import time
+from datetime import datetime, timezone
+
+import database
+
+BACKUP_DIR = os.getenv('DB_BACKUP_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backups'))
+BACKUP_PAGES = int(os.getenv('DB_BACKUP_PAGES', '256'))
+BACKUP_SLEEP_MS = float(os.getenv('DB_BACKUP_SLEEP_MS', '5'))
+
+KEEP_LAST = int(os.getenv('DB_BACKUP_KEEP_LAST', '7'))
+KEEP_DAILY = int(os.getenv('DB_BACKUP_KEEP_DAILY', '14'))
+KEEP_WEEKLY = int(os.getenv('DB_BACKUP_KEEP_WEEKLY', '8'))
+
+_NAME_RE = re.compile(r'^(?P<stem>.+)-(?P<stamp>\d{8}-\d{6})(?:-(?P<seq>\d+))?\.db$')
+_STAMP_FORMAT = '%Y%m%d-%H%M%S'
+
+
+def _stem(db_path):
+    return os.path.splitext(os.path.basename(db_path))[0]
+
+
+def list_backups(backup_dir=None, db_path=None):
+    """[(taken_at, path), ...] for this database's backups, newest first."""
+    backup_dir = backup_dir or BACKUP_DIR
+    stem = _stem(db_path or database.DB_PATH)
+    if not os.path.isdir(backup_dir):
+        return []
+    backups = []
+    for name in os.listdir(backup_dir):
+        match = _NAME_RE.match(name)
+        if not match or match.group('stem') != stem:
+            continue
+        taken_at = datetime.strptime(match.group('stamp'), _STAMP_FORMAT).replace(tzinfo=timezone.utc)
+        backups.append((taken_at, int(match.group('seq') or 0), os.path.join(backup_dir, name)))
+    backups.sort(reverse=True)
+    return [(taken_at, path) for taken_at, _, path in backups]
+
+
+def verify(path):
+    """Run quick_check on a backup file. Returns 'ok' or the first problem found."""
+    conn = sqlite3.connect(f"file:{os.path.abspath(path)}?mode=ro", uri=True)
+    try:
+        return conn.execute("PRAGMA quick_check").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def _copy(source, dest, pages, sleep_ms, stepped):
+    """Run the backup API from source to dest, returning the number of steps."""
+    steps = [0]
+
+    def progress(status, remaining, total):
+        steps[0] += 1
+        # sqlite3 only sleeps when a step reports BUSY; pausing here gives
+        # other connections room between every step
+        if remaining and sleep_ms:
+            time.sleep(sleep_ms / 1000.0)
+
+    source.backup(dest, pages=pages if stepped else -1, progress=progress)
+    return steps[0]
+
+
+def create_backup(db_path=None, backup_dir=None, pages=None, sleep_ms=None):
+    """Take a consistent online backup. Returns a report dict."""
+    db_path = db_path or database.DB_PATH
+    backup_dir = backup_dir or BACKUP_DIR
+    pages = pages or BACKUP_PAGES
+    sleep_ms = BACKUP_SLEEP_MS if sleep_ms is None else sleep_ms
+    os.makedirs(backup_dir, exist_ok=True)
+
+    stamp = datetime.now(timezone.utc).strftime(_STAMP_FORMAT)
+    final_path = os.path.join(backup_dir, f"{_stem(db_path)}-{stamp}.db")
+    seq = 0
+    while os.path.exists(final_path):  # several backups within one second
+        seq += 1
+        final_path = os.path.join(backup_dir, f"{_stem(db_path)}-{stamp}-{seq}.db")
+    partial_path = final_path + '.partial'
+
+    source = sqlite3.connect(db_path, isolation_level=None)
+    dest = sqlite3.connect(partial_path, isolation_level=None)
+    start = time.perf_counter()
+    try:
+        source.execute(f"PRAGMA busy_timeout = {int(database.get_profile()['pragmas'].get('busy_timeout', 5000))}")
+        wal = source.execute("PRAGMA journal_mode").fetchone()[0].lower() == 'wal'
+        if wal:
+            # Pin the snapshot: concurrent writes no longer restart the copy
+            source.execute("BEGIN")
+            source.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+        steps = _copy(source, dest, pages, sleep_ms, stepped=wal)
+        if source.in_transaction:
+            source.execute("COMMIT")
+        dest.execute("PRAGMA journal_mode = DELETE")
+        page_size = dest.execute("PRAGMA page_size").fetchone()[0]
+        page_count = dest.execute("PRAGMA page_count").fetchone()[0]
+    except Exception:
+        dest.close()
+        if os.path.exists(partial_path):
+            os.unlink(partial_path)
+        raise
+    finally:
+        source.close()
+    dest.close()
+    elapsed = time.perf_counter() - start
+
+    check = verify(partial_path)
+    if check != 'ok':
+        os.unlink(partial_path)
+        raise RuntimeError(f"Backup failed quick_check: {check}")
+    os.replace(partial_path, final_path)
+
+    size = page_count * page_size
+    return {
+        'path': final_path,
+        'bytes': size,
+        'pages': page_count,
+        'steps': steps,
+        'seconds': round(elapsed, 3),
+        'mb_per_second': round(size / 2**20 / elapsed, 1) if elapsed else None,
+        'pinned_snapshot': wal,
+    }
+
+
+def plan_retention(backups, keep_last=None, keep_daily=None, keep_weekly=None):
+    """Split [(taken_at, path), ...] (newest first) into (keep, delete) path lists."""
+    keep_last = KEEP_LAST if keep_last is None else keep_last
+    keep_daily = KEEP_DAILY if keep_daily is None else keep_daily
+    keep_weekly = KEEP_WEEKLY if keep_weekly is None else keep_weekly
+
+    keep = set(path for _, path in backups[:keep_last])
+    days, weeks = set(), set()
+    for taken_at, path in backups:
+        day = taken_at.date()
+        week = taken_at.isocalendar()[:2]
+        if day not in days and len(days) < keep_daily:
+            days.add(day)
+            keep.add(path)
+        if week not in weeks and len(weeks) < keep_weekly:
+            weeks.add(week)
+            keep.add(path)
+
+    ordered = [path for _, path in backups]
+    return ([p for p in ordered if p in keep], [p for p in ordered if p not in keep])
+
+
+def prune(backup_dir=None, db_path=None, dry_run=False):
+    """Delete backups outside the retention rules. Returns the deleted paths."""
+    _, delete = plan_retention(list_backups(backup_dir, db_path))
+    if not dry_run:
+        for path in delete:
+            os.unlink(path)
+    return delete
+
+
+def restore_backup(backup_path, db_path=None, backup_dir=None):
+    """Replace the live database's contents with a backup.
+
+    The current database is backed up first, so a restore can be undone.
+    The copy goes through the backup API into the live file, so the
+    app's open connections see the restored data rather than a file
+    swapped out from under them.
+    """
+    db_path = db_path or database.DB_PATH
+    check = verify(backup_path)
+    if check != 'ok':
+        raise RuntimeError(f"Refusing to restore, backup failed quick_check: {check}")
+
+    safety = create_backup(db_path, backup_dir) if os.path.exists(db_path) else None
+
+    source = sqlite3.connect(f"file:{os.path.abspath(backup_path)}?mode=ro", uri=True)
+    dest = sqlite3.connect(db_path)
+    start = time.perf_counter()
+    try:
+        dest.execute(f"PRAGMA busy_timeout = {int(database.get_profile()['pragmas'].get('busy_timeout', 5000))}")
+        source.backup(dest)
+    finally:
+        source.close()
+        dest.close()
+    return {
+        'restored_from': backup_path,
+        'previous_saved_to': safety['path'] if safety else None,
+        'seconds': round(time.perf_counter() - start, 3),
+    }
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Online backups of the memories database')
+    parser.add_argument('--dir', default=None, help=f'backup directory (default {BACKUP_DIR})')
+    sub = parser.add_subparsers(dest='command', required=True)
+    create_cmd = sub.add_parser('create', help='Take a backup, then apply retention')
+    create_cmd.add_argument('--pages', type=int, default=None, help='pages copied per step')
+    create_cmd.add_argument('--sleep-ms', type=float, default=None, help='pause between steps')
+    sub.add_parser('list', help='List backups, newest first')
+    prune_cmd = sub.add_parser('prune', help='Delete backups outside the retention rules')
+    prune_cmd.add_argument('--dry-run', action='store_true')
+    verify_cmd = sub.add_parser('verify', help='quick_check a backup file')
+    verify_cmd.add_argument('path')
+    restore_cmd = sub.add_parser('restore', help='Restore the database from a backup')
+    restore_cmd.add_argument('path')
+    restore_cmd.add_argument('--yes', action='store_true', help='skip the confirmation prompt')
+    args = parser.parse_args()
+
+    try:
+        if args.command == 'create':
+            report = create_backup(backup_dir=args.dir, pages=args.pages, sleep_ms=args.sleep_ms)
+            print(f"✓ Backed up {report['bytes'] / 2**20:.1f} MB to {report['path']}")
+            print(f"  {report['steps']} steps in {report['seconds']}s "
+                  f"({report['mb_per_second']} MB/s, pinned snapshot: {report['pinned_snapshot']})")
+            for path in prune(args.dir):
+                print(f"  pruned {os.path.basename(path)}")
+
+        elif args.command == 'list':
+            keep, _ = plan_retention(list_backups(args.dir))
+            for taken_at, path in list_backups(args.dir):
+                flag = '' if path in keep else '  (expired)'
+                print(f"{taken_at:%Y-%m-%d %H:%M:%S}  {os.path.getsize(path) / 2**20:>8.1f} MB  "
+                      f"{os.path.basename(path)}{flag}")
+
+        elif args.command == 'prune':
+            for path in prune(args.dir, dry_run=args.dry_run):
+                print(f"{'would delete' if args.dry_run else '✓ deleted'} {os.path.basename(path)}")
+
+        elif args.command == 'verify':
+            result = verify(args.path)
+            print(f"{'✓' if result == 'ok' else '✗'} {args.path}: {result}")
+            sys.exit(0 if result == 'ok' else 1)
+
+        elif args.command == 'restore':
+            if not args.yes:
+                confirm = input(f"Replace {database.DB_PATH} with {args.path}? (yes/no): ")
+                if confirm.lower() != 'yes':
+                    print("Cancelled")
+                    return
+            report = restore_backup(args.path, backup_dir=args.dir)
+            print(f"✓ Restored from {report['restored_from']} in {report['seconds']}s")
+            if report['previous_saved_to']:
+                print(f"  previous database saved to {report['previous_saved_to']}")
+
+    except (sqlite3.Error, RuntimeError, OSError) as e:
+        print(f"✗ {e}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,6 @@
+# benchmarks - Performance benchmarks for The Circle
+"""
+Each module runs as a script (python benchmarks/bench_search.py) or as
+a module from the repository root (python -m benchmarks.bench_search).
+corpus.py generates the synthetic family archives they run against.
+"""
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Facet drill-down benchmark for /api/search/facets.
+
+Seeds a synthetic archive (default 100k memories, 1.5 person tags per
+memory) and times facets.facet_counts for the drill-down steps a
+timeline user takes, from the unfiltered landing view to category,
+decade and person filters and a search query.
+
+Usage:
+    python benchmarks/bench_facets.py
+    python benchmarks/bench_facets.py --memories 20000 --repeat 50
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+import facets
+import search_index
+
+CATEGORIES = ('childhood', 'family', 'work', 'holidays', 'school', 'war', 'home', 'friends')
+WORDS = ['garden', 'beach', 'school', 'dog', 'car', 'church', 'wedding', 'snow', 'farm', 'train']
+
+STEPS = (
+    ('unfiltered', {}),
+    ('category', {'category': 'work'}),
+    ('decade', {'decade': 1960}),
+    ('category + decade', {'category': 'work', 'decade': 1960}),
+    ('person', {'person': 'Person 7'}),
+    ('category + decade + person', {'category': 'work', 'decade': 1960, 'person': 'Person 7'}),
+    ('query', {'query': 'rare7'}),
+    ('query + category', {'query': 'wedding', 'category': 'work'}),
+)
+
+
+def seed(conn, memories, people=500):
+    rnd = random.Random(1)
+    words = WORDS + [f'rare{i}' for i in range(300)]
+    conn.executemany(
+        "INSERT INTO memories (text, category, year, created_at) VALUES (?, ?, ?, '2024-01-01')",
+        ((' '.join(rnd.choices(words, k=6)), rnd.choice(CATEGORIES),
+          rnd.choice([None] + list(range(1900, 2021)))) for _ in range(memories))
+    )
+    conn.executemany(
+        "INSERT INTO memory_people (memory_id, person_name) VALUES (?, ?)",
+        ((rnd.randint(1, memories), f'Person {rnd.randrange(people)}') for _ in range(memories * 3 // 2))
+    )
+    conn.commit()
+    conn.execute("ANALYZE")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--memories', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    fd, db_path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    database.DB_PATH = db_path
+    try:
+        database.init_db()
+        database.migrate_db()
+        conn = database.connect(db_path)
+        seed(conn, args.memories)
+        search_index.get_index(conn)
+
+        print(f"\n{args.memories:,} memories, best of {args.repeat}")
+        for label, filters in STEPS:
+            timings = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                total, _ = facets.facet_counts(conn, **filters)
+                timings.append(time.perf_counter() - start)
+            print(f"  {label:28s} {min(timings) * 1000:7.2f} ms  ({total:,} memories)")
+        conn.close()
+    finally:
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(db_path + suffix):
+                os.unlink(db_path + suffix)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Row-layer benchmark for the list endpoints.
+
+Compares the old pattern (fetchall, build a dict per row by position,
+json.dumps the whole list) with data_access streaming (fetchmany into
+namedtuples, encode one row at a time). Each mode runs in its own
+process so peak RSS is not polluted by the other.
+
+Usage:
+    python benchmarks/bench_rows.py
+    python benchmarks/bench_rows.py --rows 50000 --repeat 3
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+from data_access import MEDIA_LIBRARY, stream_json_array
+
+MODES = ('legacy', 'streaming')
+
+
+def seed(db_path, rows):
+    """Create a media table with synthetic rows."""
+    database.DB_PATH = db_path
+    database.init_db()
+    conn = database.connect(db_path)
+    conn.executemany(
+        '''INSERT INTO media (filename, original_filename, file_type, file_size, title,
+                              description, memory_date, year, people)
+           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+        ((f'{i:08d}.jpg', f'IMG_{i}.JPG', 'image', 1024 * (i % 900 + 100),
+          f'Photo {i}', f'Family gathering number {i} at the seaside',
+          f'{1950 + i % 70}-06-01', 1950 + i % 70, 'Mum, Dad, Peter')
+         for i in range(rows)))
+    conn.commit()
+    conn.close()
+
+
+def legacy(conn):
+    cursor = conn.cursor()
+    cursor.execute(MEDIA_LIBRARY.sql)
+    media_items = []
+    for row in cursor.fetchall():
+        media_items.append({
+            "id": row[0],
+            "filename": row[1],
+            "original_filename": row[2],
+            "file_type": row[3],
+            "file_size": row[4],
+            "title": row[5],
+            "description": row[6],
+            "memory_date": row[7],
+            "year": row[8],
+            "people": row[9],
+            "created_at": row[10],
+            "url": f"/uploads/{row[1]}"
+        })
+    return len(json.dumps(media_items))
+
+
+def streaming(conn):
+    size = 0
+    for chunk in stream_json_array(MEDIA_LIBRARY.iter_json(conn)):
+        size += len(chunk)  # stands in for writing to the socket
+    return size
+
+
+def run_mode(db_path, mode, repeat):
+    """Run one mode in this process and print its measurements as JSON."""
+    conn = database.connect(db_path)
+    func = legacy if mode == 'legacy' else streaming
+    func(conn)  # warm the page cache
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        size = func(conn)
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    func(conn)
+    _, traced_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    conn.close()
+
+    print(json.dumps({
+        'mode': mode,
+        'bytes': size,
+        'best_ms': round(min(timings) * 1000, 1),
+        'traced_peak_mb': round(traced_peak / 2**20, 2),
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark list endpoint serialization')
+    parser.add_argument('--rows', type=int, default=50000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--mode', choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument('--db', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        run_mode(args.db, args.mode, args.repeat)
+        return
+
+    workdir = tempfile.mkdtemp(prefix='bench_rows_')
+    db_path = os.path.join(workdir, 'bench.db')
+    print(f"Seeding {args.rows} media rows...")
+    seed(db_path, args.rows)
+
+    results = []
+    for mode in MODES:
+        out = subprocess.run(
+            [sys.executable, __file__, '--mode', mode, '--db', db_path,
+             '--repeat', str(args.repeat)],
+            check=True, capture_output=True, text=True,
+        ).stdout
+        results.append(json.loads(out.strip().splitlines()[-1]))
+
+    print(f"\n{'mode':<10} {'best ms':>9} {'traced MB':>10} {'peak RSS MB':>12} {'bytes':>11}")
+    for r in results:
+        print(f"{r['mode']:<10} {r['best_ms']:>9} {r['traced_peak_mb']:>10} "
+              f"{r['peak_rss_mb']:>12} {r['bytes']:>11}")
+
+    for name in os.listdir(workdir):
+        os.remove(os.path.join(workdir, name))
+    os.rmdir(workdir)
+
+
+if __name__ == '__main__':
+    main()
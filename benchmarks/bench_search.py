@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+Search latency and memory benchmark across archive sizes.
+
+For each size a synthetic archive is generated (benchmarks/corpus.py),
+then every engine runs the fixed query mix in its own process, so peak
+RSS belongs to that engine alone:
+
+    smart        EnhancedSearch.search_memories (/api/search/smart)
+    ai_fallback  DeepSeekSearch without an API key: load memories + _enhanced_search
+    chat         fts_index.search_chat, the query behind chat_routes.search_chat_history
+    vector       vector_index, the offline TF-IDF index
+
+Result caches are cleared before every query, so each one is timed
+cold; the first query, which also builds the in-process indexes, is
+reported on its own. Results are saved as JSON, and --compare prints
+the change against an earlier run.
+
+Usage:
+    python benchmarks/bench_search.py
+    python benchmarks/bench_search.py --sizes 1000 10000 100000 1000000 --repeat 5
+    python benchmarks/bench_search.py --engines smart vector --compare benchmarks/results/search-20250101-120000.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks import corpus
+
+ENGINES = ('smart', 'ai_fallback', 'chat', 'vector')
+DEFAULT_SIZES = (1000, 10000, 100000)
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+
+def percentile(values, pct):
+    if not values:
+        return float('nan')
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def load_engine(name):
+    """A function running one query cold, with every result cache emptied first."""
+    import database
+
+    if name == 'smart':
+        from search_engine import EnhancedSearch
+        search = EnhancedSearch()
+
+        def run(query):
+            EnhancedSearch.cache.clear()
+            return len(search.search_memories(query))
+    elif name == 'ai_fallback':
+        from ai_search import DeepSeekSearch
+        searcher = DeepSeekSearch()
+        searcher.client = None  # never leave the machine
+
+        def run(query):
+            return len(searcher._answer(query)['memories'])
+    elif name == 'chat':
+        import fts_index
+
+        def run(query):
+            return len(fts_index.search_chat(database.get_db(), query))
+    else:
+        import vector_index
+
+        def run(query):
+            return len(vector_index.similar(database.get_db(), query))
+    return run
+
+
+def run_engine(db_path, name, repeat):
+    """Run one engine in this process and print its measurements as JSON."""
+    from flask import Flask
+    import database
+
+    database.DB_PATH = db_path
+    app = Flask(__name__)
+    database.init_app(app)
+
+    with app.app_context():
+        run = load_engine(name)
+        start = time.perf_counter()
+        run(corpus.QUERIES[0])
+        first_ms = (time.perf_counter() - start) * 1000
+
+        latencies, hits = [], 0
+        for _ in range(repeat):
+            for query in corpus.QUERIES:
+                start = time.perf_counter()
+                hits += run(query)
+                latencies.append((time.perf_counter() - start) * 1000)
+
+        tracemalloc.start()
+        for query in corpus.QUERIES:
+            run(query)
+        _, traced_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    print(json.dumps({
+        'engine': name,
+        'queries': len(latencies),
+        'hits_per_query': round(hits / len(latencies), 1),
+        'first_ms': round(first_ms, 2),
+        'p50_ms': round(percentile(latencies, 50), 3),
+        'p95_ms': round(percentile(latencies, 95), 3),
+        'p99_ms': round(percentile(latencies, 99), 3),
+        'max_ms': round(max(latencies), 3),
+        'query_peak_mb': round(traced_peak / 2**20, 2),
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }))
+
+
+def corpus_path(workdir, size, seed):
+    """Generate the archive for a size, or reuse one already in workdir."""
+    db_path = os.path.join(workdir, f'archive-{size}-seed{seed}.db')
+    if not os.path.exists(db_path):
+        print(f"Generating {size:,} memories...")
+        tmp_path = db_path + '.partial'
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(tmp_path + suffix):
+                os.unlink(tmp_path + suffix)
+        corpus.generate(tmp_path, size, seed)
+        os.replace(tmp_path, db_path)
+    return db_path
+
+
+def print_table(results):
+    print(f"\n{'memories':>9} {'engine':<12} {'first ms':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+          f"{'hits':>5} {'query MB':>9} {'RSS MB':>8}")
+    print('-' * 86)
+    for r in results:
+        print(f"{r['memories']:>9,} {r['engine']:<12} {r['first_ms']:>9.1f} {r['p50_ms']:>8.2f} "
+              f"{r['p95_ms']:>8.2f} {r['p99_ms']:>8.2f} {r['hits_per_query']:>5} "
+              f"{r['query_peak_mb']:>9.2f} {r['peak_rss_mb']:>8.1f}")
+
+
+def print_comparison(results, previous_path):
+    with open(previous_path) as f:
+        previous = {(r['memories'], r['engine']): r for r in json.load(f)['results']}
+    print(f"\nCompared with {previous_path}")
+    print(f"{'memories':>9} {'engine':<12} {'p50 ms':>19} {'p95 ms':>19} {'RSS MB':>17}")
+    for r in results:
+        old = previous.get((r['memories'], r['engine']))
+        if not old:
+            continue
+        cells = []
+        for key, width in (('p50_ms', 19), ('p95_ms', 19), ('peak_rss_mb', 17)):
+            change = (r[key] / old[key] - 1) * 100 if old[key] else 0.0
+            cells.append(f"{old[key]:.2f} → {r[key]:.2f} {change:+4.0f}%".rjust(width))
+        print(f"{r['memories']:>9,} {r['engine']:<12} {' '.join(cells)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark search engines over synthetic archives')
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES))
+    parser.add_argument('--engines', nargs='+', choices=ENGINES, default=list(ENGINES))
+    parser.add_argument('--repeat', type=int, default=5, help='Passes over the query mix per engine')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workdir', help='Keep generated archives here and reuse them on the next run')
+    parser.add_argument('--output', help='Results JSON (default benchmarks/results/search-<time>.json)')
+    parser.add_argument('--compare', help='Earlier results JSON to compare against')
+    parser.add_argument('--engine', choices=ENGINES, help=argparse.SUPPRESS)
+    parser.add_argument('--db', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.engine:
+        run_engine(args.db, args.engine, args.repeat)
+        return
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix='bench_search_')
+    os.makedirs(workdir, exist_ok=True)
+    env = dict(os.environ, DB_MAINTENANCE='0')
+    env.pop('DEEPSEEK_API_KEY', None)
+    results = []
+    try:
+        for size in args.sizes:
+            db_path = corpus_path(workdir, size, args.seed)
+            for name in args.engines:
+                print(f"  {size:,} memories: {name}")
+                # The on-disk vector index (ai_fallback reads it too) is built
+                # on each engine's first query, as after a fresh deploy
+                shutil.rmtree(db_path + '.vectors', ignore_errors=True)
+                out = subprocess.run(
+                    [sys.executable, os.path.abspath(__file__), '--engine', name, '--db', db_path,
+                     '--repeat', str(args.repeat)],
+                    check=True, capture_output=True, text=True, env=env,
+                ).stdout
+                results.append(dict(json.loads(out.strip().splitlines()[-1]), memories=size))
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print_table(results)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"search-{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump({
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'machine': {
+                'platform': platform.platform(),
+                'python': platform.python_version(),
+                'sqlite': sqlite3.sqlite_version,
+                'cpus': os.cpu_count(),
+            },
+            'config': {
+                'sizes': args.sizes,
+                'engines': args.engines,
+                'repeat': args.repeat,
+                'seed': args.seed,
+                'queries': list(corpus.QUERIES),
+            },
+            'results': results,
+        }, f, indent=2)
+    print(f"\n✓ Results saved to {output}")
+
+    if args.compare:
+        print_comparison(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
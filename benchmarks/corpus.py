@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Synthetic family archives for the search benchmarks.
+
+generate() fills a fresh database with memories written from templates
+("Grandma Margaret was born in Hastings in 1921."), tags them with the
+people they mention and adds chat messages about the same people and
+places. Memory tokens are stored as the app stores them on save. All
+choices come from a seeded random.Random, so the same size and seed
+always produce the same archive and runs can be compared.
+
+QUERIES is the fixed query mix the benchmarks run: names, a misspelled
+name, places, years, topics and a question with no answer.
+
+Usage:
+    python -m benchmarks.corpus /tmp/archive.db --memories 10000
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+import memory_tokens
+
+FIRST_NAMES = (
+    'Margaret', 'Peter', 'Jon', 'Mary', 'Albert', 'Rose', 'Arthur', 'Edith', 'George', 'Dorothy',
+    'Harold', 'Joan', 'Frank', 'Iris', 'Walter', 'Doris', 'Ernest', 'Vera', 'Stanley', 'Ivy',
+    'Leonard', 'Hilda', 'Norman', 'Gladys', 'Ronald', 'Elsie', 'Kenneth', 'Mabel', 'Dennis', 'Winifred',
+    'Derek', 'Brenda', 'Colin', 'Sheila', 'Keith', 'Maureen', 'Trevor', 'Pauline', 'Graham', 'Valerie',
+    'Susan', 'David', 'Carol', 'Michael', 'Linda', 'John', 'Patricia', 'Robert', 'Janet', 'Brian',
+)
+SURNAMES = (
+    'Elger', 'Clarke', 'Smith', 'Jones', 'Taylor', 'Brown', 'Wilson', 'Evans', 'Thomas', 'Roberts',
+    'Walker', 'Wright', 'Thompson', 'White', 'Hughes', 'Edwards', 'Green', 'Hall', 'Wood', 'Harris',
+    'Lewis', 'Martin', 'Jackson', 'Clark', 'Turner', 'Hill', 'Scott', 'Cooper', 'Morris', 'Ward',
+)
+RELATIONS = ('Grandma', 'Grandad', 'Uncle', 'Aunt', 'Cousin', 'Mum', 'Dad', 'Nan')
+PLACES = (
+    'Hastings', 'Battle', 'Rye', 'Brighton', 'Eastbourne', 'London', 'Bexhill', 'Lewes', 'Dover',
+    'Folkestone', 'Canterbury', 'Tunbridge Wells', 'Margate', 'Bournemouth', 'Bristol', 'Bath',
+    'York', 'Cardiff', 'Edinburgh', 'Cornwall', 'Devon', 'Whitby', 'Blackpool', 'Scarborough',
+)
+TOPICS = (
+    'wedding', 'christening', 'funeral', 'birthday party', 'Christmas dinner', 'summer holiday',
+    'first day at school', 'new house', 'garden party', 'fishing trip', 'day at the races',
+    'church fete', 'village dance', 'school sports day', 'caravan holiday', 'the evacuation',
+)
+CATEGORIES = ('childhood', 'family', 'work', 'holidays', 'school', 'war', 'home', 'friends')
+TEMPLATES = (
+    '{person} was born in {place} in {year}.',
+    'We spent the summer of {year} at {place} with {person} and {other}.',
+    '{person} and {other} met at a {topic} in {place}.',
+    'I remember the {topic} in {year}, {person} wore a blue hat and {other} sang.',
+    '{person} worked at the station in {place} until {year}.',
+    'Every Sunday {person} took us to {place} for a walk along the front.',
+    'The {topic} was in {place}; {person} drove everyone in the old Morris.',
+    '{person} moved from {place} to {other_place} in {year} after the war.',
+    'My favourite photo of {person} is from the {topic} at {place}.',
+    'In {year} {person} won first prize at the {topic}, {other} never forgot it.',
+)
+CHAT_TEMPLATES = (
+    ('user', 'Do you remember when {person} lived in {place}?'),
+    ('assistant', 'You mentioned {person} before. What was {place} like in {year}?'),
+    ('user', 'The {topic} in {year} was the best one, {person} organised it.'),
+    ('assistant', 'That sounds lovely. Who else came to the {topic} in {place}?'),
+)
+
+# Fixed query mix: every engine runs exactly these, in this order
+QUERIES = (
+    'Where was Margaret Elger born?',
+    'Peter Elgar',
+    'Who was Uncle Albert?',
+    'holidays in Hastings',
+    'Brighton 1962',
+    'What happened in 1975?',
+    'wedding in Rye',
+    'Christmas dinner with Grandma',
+    'first day at school',
+    'fishing trip Cornwall',
+    'Tell me about the evacuation',
+    'zebra xylophone quartz',
+)
+
+_BATCH = 5000
+
+
+def person(rnd):
+    if rnd.random() < 0.3:
+        return f'{rnd.choice(RELATIONS)} {rnd.choice(FIRST_NAMES)}'
+    return f'{rnd.choice(FIRST_NAMES)} {rnd.choice(SURNAMES)}'
+
+
+def _fields(rnd):
+    year = rnd.randint(1900, 2020)
+    return {
+        'person': person(rnd),
+        'other': person(rnd),
+        'place': rnd.choice(PLACES),
+        'other_place': rnd.choice(PLACES),
+        'topic': rnd.choice(TOPICS),
+        'year': year,
+    }
+
+
+def memories(count, seed=0):
+    """Yield (text, category, memory_date, year, people) for count synthetic memories."""
+    rnd = random.Random(seed)
+    for _ in range(count):
+        fields = _fields(rnd)
+        text = rnd.choice(TEMPLATES).format(**fields)
+        people = [name for name in (fields['person'], fields['other']) if name in text]
+        year = fields['year'] if rnd.random() < 0.8 else None
+        memory_date = f'{year}-{rnd.randint(1, 12):02d}-{rnd.randint(1, 28):02d}' if year and rnd.random() < 0.5 else None
+        yield text, rnd.choice(CATEGORIES), memory_date, year, people
+
+
+def chat_messages(count, seed=0):
+    """Yield (session_id, role, message) for count synthetic chat messages."""
+    rnd = random.Random(seed + 1)
+    for i in range(count):
+        role, template = CHAT_TEMPLATES[i % len(CHAT_TEMPLATES)]
+        yield f'session-{i // 20}', role, template.format(**_fields(rnd))
+
+
+def generate(db_path, count, seed=0, chat_ratio=0.5, progress=True):
+    """Create db_path and fill it with count memories and count * chat_ratio chat messages."""
+    database.DB_PATH = db_path
+    database.init_db()
+    database.migrate_db()
+    conn = database.connect(db_path)
+    started = time.perf_counter()
+
+    batch = []
+
+    def flush():
+        cursor = conn.cursor()
+        for text, category, memory_date, year, people in batch:
+            cursor.execute(
+                '''INSERT INTO memories (text, category, memory_date, year, created_at)
+                   VALUES (?, ?, ?, ?, '2024-01-01T00:00:00')''',
+                (text, category, memory_date, year)
+            )
+            memory_id = cursor.lastrowid
+            memory_tokens.store(conn, memory_id, text)
+            cursor.executemany(
+                "INSERT INTO memory_people (memory_id, person_name) VALUES (?, ?)",
+                ((memory_id, name) for name in people)
+            )
+        conn.commit()
+        batch.clear()
+
+    for done, memory in enumerate(memories(count, seed), 1):
+        batch.append(memory)
+        if len(batch) == _BATCH:
+            flush()
+            if progress and done % (_BATCH * 20) == 0:
+                print(f"  {done:,} memories...")
+    flush()
+
+    conn.executemany(
+        "INSERT INTO chat_messages (session_id, role, message) VALUES (?, ?, ?)",
+        chat_messages(int(count * chat_ratio), seed)
+    )
+    conn.commit()
+    conn.execute("ANALYZE")
+    conn.close()
+    if progress:
+        print(f"✓ Generated {count:,} memories in {time.perf_counter() - started:.1f}s: {db_path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate a synthetic family archive')
+    parser.add_argument('db_path')
+    parser.add_argument('--memories', type=int, default=10000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--chat-ratio', type=float, default=0.5, help='Chat messages per memory')
+    args = parser.parse_args()
+
+    if os.path.exists(args.db_path):
+        parser.error(f'{args.db_path} already exists')
+    generate(args.db_path, args.memories, args.seed, args.chat_ratio)
+
+
+if __name__ == '__main__':
+    main()
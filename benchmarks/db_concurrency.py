@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Concurrency benchmark for the database connection profiles.
+
+Simulates several gunicorn workers: writer processes run long transactions
+shaped like link_multiple_media_to_memory / bulk imports while reader
+threads repeatedly run the timeline query. Reports read latency
+percentiles and "database is locked" errors for each profile.
+
+Usage:
+    python benchmarks/db_concurrency.py
+    python benchmarks/db_concurrency.py --profiles legacy concurrent --writers 3 --seconds 10
+"""
+
+import argparse
+import multiprocessing
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+
+TIMELINE_QUERY = '''SELECT id, text, category, memory_date, year,
+                    audio_filename, created_at
+                    FROM memories
+                    ORDER BY COALESCE(year, 9999) ASC, created_at ASC
+                    LIMIT 200'''
+
+
+def seed(db_path, memories, media):
+    """Create a database with synthetic memories and media rows."""
+    database.DB_PATH = db_path
+    database.init_db()
+    conn = sqlite3.connect(db_path)
+    conn.executescript('''CREATE TABLE IF NOT EXISTS memory_media (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        memory_id INTEGER NOT NULL,
+        media_id INTEGER NOT NULL,
+        display_order INTEGER DEFAULT 0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        UNIQUE(memory_id, media_id)
+    )''')
+    conn.executemany(
+        "INSERT INTO memories (text, category, year, created_at) VALUES (?, ?, ?, ?)",
+        ((f"Memory {i} about the family in {1950 + i % 70}", 'family', 1950 + i % 70, f"2024-01-01T00:{i % 60:02d}")
+         for i in range(memories))
+    )
+    conn.executemany(
+        "INSERT INTO media (filename, file_type, title, year, created_at) VALUES (?, 'image', ?, ?, ?)",
+        ((f"photo_{i}.jpg", f"Photo {i}", 1950 + i % 70, '2024-01-01') for i in range(media))
+    )
+    conn.commit()
+    conn.close()
+
+
+def writer(db_path, profile_name, stop_at, links_per_txn, hold_seconds, counts):
+    """Relink media in long transactions until stop_at."""
+    database.DB_PATH = db_path
+    conn = database.connect(db_path, database.get_profile(profile_name))
+    memory_id = 0
+    while time.time() < stop_at:
+        memory_id = memory_id % 1000 + 1
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.execute('DELETE FROM memory_media WHERE memory_id = ?', (memory_id,))
+            for order in range(links_per_txn):
+                conn.execute(
+                    'INSERT OR IGNORE INTO memory_media (memory_id, media_id, display_order) VALUES (?, ?, ?)',
+                    (memory_id, order + 1, order)
+                )
+            time.sleep(hold_seconds)  # simulate request work while holding the write lock
+            conn.commit()
+            with counts.get_lock():
+                counts[0] += 1
+        except sqlite3.OperationalError:
+            conn.rollback()
+            with counts.get_lock():
+                counts[1] += 1
+    conn.close()
+
+
+def reader(db_path, profile_name, stop_at, latencies, errors):
+    """Run the timeline query in a loop, recording latency in ms."""
+    conn = database.connect(db_path, database.get_profile(profile_name))
+    while time.time() < stop_at:
+        started = time.perf_counter()
+        try:
+            conn.execute(TIMELINE_QUERY).fetchall()
+            latencies.append((time.perf_counter() - started) * 1000)
+        except sqlite3.OperationalError:
+            errors.append(1)
+    conn.close()
+
+
+def percentile(values, pct):
+    if not values:
+        return float('nan')
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def run_profile(profile_name, args, workdir):
+    db_path = os.path.join(workdir, f'{profile_name}.db')
+    os.environ['DB_PROFILE'] = profile_name
+    database.DB_PROFILE = profile_name
+    seed(db_path, args.memories, args.media)
+
+    stop_at = time.time() + args.seconds
+    counts = multiprocessing.Array('i', [0, 0])
+    writers = [
+        multiprocessing.Process(
+            target=writer,
+            args=(db_path, profile_name, stop_at, args.links, args.hold, counts)
+        )
+        for _ in range(args.writers)
+    ]
+    latencies, errors = [], []
+    readers = [
+        threading.Thread(target=reader, args=(db_path, profile_name, stop_at, latencies, errors))
+        for _ in range(args.readers)
+    ]
+    for proc in writers:
+        proc.start()
+    for thread in readers:
+        thread.start()
+    for thread in readers:
+        thread.join()
+    for proc in writers:
+        proc.join()
+
+    return {
+        'profile': profile_name,
+        'reads': len(latencies),
+        'read_errors': len(errors),
+        'p50': percentile(latencies, 50),
+        'p95': percentile(latencies, 95),
+        'p99': percentile(latencies, 99),
+        'max': max(latencies) if latencies else float('nan'),
+        'write_txns': counts[0],
+        'write_errors': counts[1],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Read latency under concurrent writers, per DB profile')
+    parser.add_argument('--profiles', nargs='+', default=list(database.DB_PROFILES))
+    parser.add_argument('--writers', type=int, default=2, help='Writer processes (simulated workers)')
+    parser.add_argument('--readers', type=int, default=4, help='Reader threads')
+    parser.add_argument('--seconds', type=float, default=5.0)
+    parser.add_argument('--memories', type=int, default=5000)
+    parser.add_argument('--media', type=int, default=2000)
+    parser.add_argument('--links', type=int, default=200, help='Links written per transaction')
+    parser.add_argument('--hold', type=float, default=0.02, help='Seconds each write transaction stays open')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='circle_bench_')
+    try:
+        results = [run_profile(name, args, workdir) for name in args.profiles]
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"\n{'Profile':<12} {'Reads':>7} {'Locked':>7} {'p50 ms':>8} {'p95 ms':>8} "
+          f"{'p99 ms':>8} {'max ms':>8} {'Writes':>7} {'W.err':>6}")
+    print('-' * 82)
+    for r in results:
+        print(f"{r['profile']:<12} {r['reads']:>7} {r['read_errors']:>7} {r['p50']:>8.2f} {r['p95']:>8.2f} "
+              f"{r['p99']:>8.2f} {r['max']:>8.2f} {r['write_txns']:>7} {r['write_errors']:>6}")
+
+
+if __name__ == '__main__':
+    main()
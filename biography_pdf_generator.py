@@ -21,6 +21,14 @@ logger = logging.getLogger(__name__)
 # Track used images to avoid duplicates
 used_images_global = set()
 
+# Photos offered to the chapters, newest first
+_PHOTOS_SQL = '''
+    SELECT id, filename, title, description, year, people
+    FROM media
+    WHERE file_type = 'image'
+    ORDER BY year DESC NULLS LAST, created_at DESC
+'''
+
 
 class BiographyPDFGenerator:
     """Magazine-style PDF generator for biographies."""
@@ -700,12 +708,7 @@ class BiographyPDFGenerator:
         available_photos = []
         if db_connection:
             try:
-                cursor = db_connection.execute('''
-                    SELECT id, filename, title, description, year, people
-                    FROM media
-                    WHERE file_type = 'image'
-                    ORDER BY year DESC NULLS LAST, created_at DESC
-                ''')
+                cursor = db_connection.execute(_PHOTOS_SQL)
                 
                 for row in cursor.fetchall():
                     available_photos.append({
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+Background categorization of memories.
+
+Saving or editing a memory no longer waits on a DeepSeek round-trip:
+the route stores the keyword category from utils.keyword_category()
+with category_status 'provisional' and calls wake(). A worker thread
+in each process then claims provisional memories, asks DeepSeek for the
+category and writes it back as 'final'.
+
+    provisional  keyword category, waiting for the worker
+    refining     claimed by a worker; the claim lapses after CLAIM_SECONDS
+    final        category from DeepSeek (or keywords, with no API key)
+    failed       DeepSeek failed MAX_ATTEMPTS times; the keyword category stays
+    NULL         categorized before this existed
+
+Claims are a single UPDATE, so gunicorn workers never refine the same
+memory twice. A failed call is retried after RETRY_SECONDS, doubling
+each time. A memory edited while it was being refined is left for the
+next pass instead of getting the category of its old text. While
+DeepSeek's circuit breaker is open, memories wait for it to close
+without using up an attempt. The UI polls
+GET /api/memories/<id>/category until the status is no longer
+provisional or refining.
+
+Usage:
+    python categorizer.py run       # refine every provisional memory now
+    python categorizer.py status
+"""
+
+import os
+import threading
+import time
+
+import database
+from llm_clients import CircuitOpenError
+from utils import ai_category, keyword_category
+
+ENABLED = os.getenv('CATEGORIZER', '1') != '0'
+POLL_SECONDS = float(os.getenv('CATEGORIZER_POLL_SECONDS', '30'))
+MAX_ATTEMPTS = int(os.getenv('CATEGORIZER_MAX_ATTEMPTS', '5'))
+RETRY_SECONDS = 30
+CLAIM_SECONDS = 300
+BATCH = 10
+
+PROVISIONAL = 'provisional'
+REFINING = 'refining'
+FINAL = 'final'
+FAILED = 'failed'
+PENDING = (PROVISIONAL, REFINING)
+
+# One UPDATE, so concurrent workers never claim the same memory
+_CLAIM_SQL = '''
+    UPDATE memories
+    SET category_status = ?, category_due_at = ?
+    WHERE id IN (
+        SELECT id FROM memories
+        WHERE category_status IN (?, ?) AND category_due_at <= ?
+        ORDER BY category_due_at LIMIT ?)
+    RETURNING id, text, year
+'''
+_STATUS_SQL = "SELECT category, category_status FROM memories WHERE id = ?"
+_COUNTS_SQL = "SELECT category_status, COUNT(*) FROM memories GROUP BY category_status"
+
+
+def available():
+    """True when provisional categories will be refined."""
+    return ENABLED and bool(os.getenv('DEEPSEEK_API_KEY'))
+
+
+def provisional_category(text, year=None):
+    """(category, status) to store with a memory being saved."""
+    return keyword_category(text, year=year), PROVISIONAL if available() else FINAL
+
+
+def claim(conn, limit=BATCH):
+    """Claim up to `limit` due memories for this worker: [(id, text, year), ...]."""
+    now = time.time()
+    rows = conn.execute(
+        _CLAIM_SQL, (REFINING, now + CLAIM_SECONDS, PROVISIONAL, REFINING, now, limit)
+    ).fetchall()
+    conn.commit()
+    return [tuple(row) for row in rows]
+
+
+def refine(conn, memory_id, text, year):
+    """Ask DeepSeek for one claimed memory's category and store the outcome. Returns the status."""
+    try:
+        category = ai_category(text, year=year)
+    except CircuitOpenError as e:
+        # Not this memory's failure: wait for the breaker, keep the attempt
+        conn.execute(
+            '''UPDATE memories SET category_status = ?, category_due_at = ?
+               WHERE id = ? AND category_status = ? AND text = ?''',
+            (PROVISIONAL, time.time() + max(e.retry_after, 1.0), memory_id, REFINING, text)
+        )
+        conn.commit()
+        return PROVISIONAL
+    except Exception as e:
+        print(f"Categorization of memory {memory_id} failed: {e}")
+        attempts = conn.execute(
+            "SELECT category_attempts FROM memories WHERE id = ?", (memory_id,)
+        ).fetchone()
+        attempts = (attempts[0] if attempts else 0) + 1
+        outcome = FAILED if attempts >= MAX_ATTEMPTS else PROVISIONAL
+        conn.execute(
+            '''UPDATE memories SET category_status = ?, category_attempts = ?, category_due_at = ?
+               WHERE id = ? AND category_status = ? AND text = ?''',
+            (outcome, attempts, time.time() + RETRY_SECONDS * 2 ** (attempts - 1),
+             memory_id, REFINING, text)
+        )
+        conn.commit()
+        return outcome
+
+    # Guarded on the text, so an edit made meanwhile keeps its own category
+    conn.execute(
+        '''UPDATE memories SET category = COALESCE(?, category), category_status = ?, category_due_at = NULL
+           WHERE id = ? AND category_status = ? AND text = ?''',
+        (category, FINAL, memory_id, REFINING, text)
+    )
+    conn.commit()
+    return FINAL
+
+
+def run_once(conn, limit=BATCH):
+    """Refine one batch of due memories. Returns how many were claimed."""
+    claimed = claim(conn, limit)
+    for memory_id, text, year in claimed:
+        refine(conn, memory_id, text, year)
+    return len(claimed)
+
+
+def status(conn, memory_id):
+    """{'category', 'category_status'} of one memory, or None if it doesn't exist."""
+    row = conn.execute(_STATUS_SQL, (memory_id,)).fetchone()
+    if row is None:
+        return None
+    return {'category': row[0], 'category_status': row[1] or FINAL}
+
+
+def counts(conn):
+    """Memories in each category status."""
+    return {status or FINAL: count for status, count in conn.execute(_COUNTS_SQL)}
+
+
+# ============================================
+# WORKER
+# ============================================
+
+_worker = None
+_worker_pid = None
+_worker_lock = threading.Lock()
+_wake = threading.Event()
+
+
+def wake():
+    """Tell this process's worker a memory is waiting, instead of it finding out on the next poll."""
+    _wake.set()
+
+
+def _worker_loop():
+    while True:
+        _wake.wait(POLL_SECONDS)
+        _wake.clear()
+        try:
+            with database.pooled_connection() as conn:
+                while run_once(conn):
+                    pass
+        except Exception as e:
+            print(f"Categorizer error: {e}")
+
+
+def start_worker():
+    """Start the background categorization thread once per process."""
+    global _worker, _worker_pid
+    if not available():
+        return None
+    with _worker_lock:
+        if _worker is None or _worker_pid != os.getpid() or not _worker.is_alive():
+            _worker = threading.Thread(target=_worker_loop, name='categorizer', daemon=True)
+            _worker_pid = os.getpid()
+            _worker.start()
+    return _worker
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Refine provisional memory categories with DeepSeek')
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('run', help='Refine every due provisional memory now')
+    sub.add_parser('status', help='Show memories per category status')
+    args = parser.parse_args()
+
+    database.migrate_db()
+    conn = database.connect()
+    try:
+        if args.command == 'run':
+            if not available():
+                print("✗ Set DEEPSEEK_API_KEY (and leave CATEGORIZER on) to refine categories")
+                return
+            total = 0
+            while True:
+                done = run_once(conn)
+                if not done:
+                    break
+                total += done
+            print(f"✓ Refined {total} memories")
+        else:
+            for name, count in sorted(counts(conn).items()):
+                print(f"{name:<12} {count}")
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
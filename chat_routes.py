@@ -1,17 +1,14 @@
 # chat_routes.py - General Chat with Memory Storage
 # Add this to app.py or import as a module
 
-import os
 import uuid
-from datetime import datetime
+from datetime import datetime, timezone
 from flask import session, request, jsonify, render_template
-from openai import OpenAI
-
-# Initialize DeepSeek client
-deepseek_client = OpenAI(
-    api_key=os.getenv('DEEPSEEK_API_KEY'),
-    base_url="https://api.deepseek.com"
-)
+from database import get_db
+from data_access import CHAT_MESSAGE_INSERT, CHAT_HISTORY_SQL
+import fts_index
+import llm_clients
+import write_behind
 
 def init_chat_db():
     """Initialize chat messages table"""
@@ -31,62 +28,46 @@ def get_chat_session_id():
     return session['chat_session_id']
 
 def save_chat_message(session_id, role, message, tokens_used=0):
-    """Save a chat message to database"""
-    db = get_db()
-    cursor = db.cursor()
-    
-    cursor.execute("""
-        INSERT INTO chat_messages (session_id, role, message, tokens_used)
-        VALUES (?, ?, ?, ?)
-    """, (session_id, role, message, tokens_used))
-    
-    db.commit()
+    """Queue a chat message for the write-behind buffer"""
+    # Stamp it now (same format as CURRENT_TIMESTAMP) rather than at flush time
+    timestamp = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+    write_behind.submit(CHAT_MESSAGE_INSERT, (session_id, timestamp, role, message, tokens_used))
 
 def get_chat_history(session_id, limit=50):
     """Retrieve recent chat history for context"""
     db = get_db()
-    cursor = db.cursor()
+    # Messages still in the write-behind buffer are merged in, not flushed
+    with write_behind.holding():
+        stored = db.execute(CHAT_HISTORY_SQL, (session_id, limit)).fetchall()
+        queued = [params for params in write_behind.pending(CHAT_MESSAGE_INSERT) if params[0] == session_id]
     
-    cursor.execute("""
-        SELECT role, message, timestamp
-        FROM chat_messages
-        WHERE session_id = ?
-        ORDER BY timestamp DESC
-        LIMIT ?
-    """, (session_id, limit))
-    
-    # Return in chronological order (oldest first)
-    messages = cursor.fetchall()
-    return [
+    # Oldest first; a queued message was submitted after every stored one
+    messages = [
         {
             'role': msg[0],
             'content': msg[1],
             'timestamp': msg[2]
         }
-        for msg in reversed(messages)
+        for msg in reversed(stored)
     ]
+    messages.extend(
+        {'role': role, 'content': message, 'timestamp': timestamp}
+        for _, timestamp, role, message, _ in queued
+    )
+    return messages[-limit:]
 
 def search_chat_history(query, limit=10):
-    """Search past chat messages"""
+    """Search past chat messages, ranked by the full-text index"""
     db = get_db()
-    cursor = db.cursor()
-    
-    cursor.execute("""
-        SELECT role, message, timestamp, session_id
-        FROM chat_messages
-        WHERE message LIKE ?
-        ORDER BY timestamp DESC
-        LIMIT ?
-    """, (f'%{query}%', limit))
     
     return [
         {
-            'role': msg[0],
-            'message': msg[1],
-            'timestamp': msg[2],
-            'session_id': msg[3]
+            'role': msg['role'],
+            'message': msg['message'],
+            'timestamp': msg['timestamp'],
+            'session_id': msg['session_id']
         }
-        for msg in cursor.fetchall()
+        for msg in fts_index.search_chat(db, query, limit)
     ]
 
 # Flask Routes
@@ -107,12 +88,12 @@ def chat_send():
         
         session_id = get_chat_session_id()
         
-        # Save user message
+        # Read history before queueing the new message so the read never
+        # waits on a flush of this turn
+        history = get_chat_history(session_id, limit=19)
+        history.append({'role': 'user', 'content': user_message})
         save_chat_message(session_id, 'user', user_message)
         
-        # Get conversation history for context
-        history = get_chat_history(session_id, limit=20)
-        
         # Build messages for DeepSeek
         messages = [
             {
@@ -138,7 +119,8 @@ Keep responses conversational and warm, not formal or robotic.'''
             })
         
         # Call DeepSeek API
-        response = deepseek_client.chat.completions.create(
+        response = llm_clients.create(
+            'deepseek', 'chat',
             model='deepseek-chat',
             messages=messages,
             temperature=0.7,
@@ -0,0 +1,257 @@
+# data_access.py - Compact row access and streaming JSON for list endpoints
+"""
+List endpoints used to fetchall() and then build a dict per row, holding
+the whole result twice. A RowQuery instead pairs one SELECT with its
+column map; rows are pulled from the cursor in arraysize batches and
+either yielded as namedtuples (for Python callers) or encoded straight
+to JSON and streamed to the client one row at a time.
+"""
+
+import json
+from collections import namedtuple
+
+from flask import Response, stream_with_context
+
+# Rows fetched per sqlite3 step; large enough to amortise the call
+# overhead, small enough that a batch is never a meaningful allocation.
+ARRAYSIZE = 512
+
+_encode = json.JSONEncoder(separators=(',', ':')).encode
+
+
+class RowQuery:
+    """A SELECT plus the JSON key for each column it returns.
+
+    `columns` are the output keys in SELECT order, so a column can be
+    renamed for the API without aliasing it in SQL. `computed` adds
+    derived fields from the namedtuple row (e.g. has_audio, url).
+    """
+
+    __slots__ = ('name', 'sql', 'columns', 'row_type', 'computed')
+
+    def __init__(self, name, sql, columns, computed=None):
+        self.name = name
+        self.sql = sql
+        self.columns = tuple(columns)
+        self.row_type = namedtuple(f'{name}_row', self.columns)
+        self.computed = computed
+
+    def rows(self, conn, params=(), arraysize=ARRAYSIZE):
+        """Iterate namedtuple rows without materialising the full result.
+
+        The statement runs immediately, so SQL errors surface in the
+        caller rather than halfway through a streamed response.
+        """
+        return self._iterate(self._execute(conn, params, arraysize))
+
+    def _execute(self, conn, params, arraysize):
+        cursor = conn.cursor()
+        cursor.row_factory = None  # plain tuples; the namedtuple is built here
+        cursor.arraysize = arraysize
+        cursor.execute(self.sql, params)
+        return cursor
+
+    def _iterate(self, cursor):
+        make = self.row_type._make
+        while True:
+            batch = cursor.fetchmany()
+            if not batch:
+                break
+            for values in batch:
+                yield make(values)
+
+    def as_dict(self, row):
+        """JSON-ready dict for one row, including computed fields."""
+        data = dict(zip(self.columns, row))
+        if self.computed:
+            data.update(self.computed(row))
+        return data
+
+    def dicts(self, conn, params=()):
+        """Iterate one dict per row."""
+        return map(self.as_dict, self.rows(conn, params))
+
+    def iter_json(self, conn, params=(), counter=None, arraysize=ARRAYSIZE):
+        """Iterate JSON chunks of comma-separated objects, one chunk per batch.
+
+        Encoding a whole fetchmany() batch in one call keeps the C encoder
+        busy instead of paying Python call overhead on every row. If given,
+        counter[0] is incremented by the number of rows encoded.
+        """
+        return self._iterate_json(self._execute(conn, params, arraysize), counter)
+
+    def _iterate_json(self, cursor, counter):
+        as_dict = self.as_dict
+        make = self.row_type._make
+        while True:
+            batch = cursor.fetchmany()
+            if not batch:
+                break
+            if counter is not None:
+                counter[0] += len(batch)
+            yield _encode([as_dict(make(values)) for values in batch])[1:-1]
+
+
+def stream_json_array(chunks, head=''):
+    """Wrap already-encoded JSON chunks in '[...]', after optional head text."""
+    yield head + '['
+    first = True
+    for chunk in chunks:
+        if first:
+            first = False
+            yield chunk
+        else:
+            yield ',' + chunk
+    yield ']'
+
+
+def json_list_response(query, conn, params=(), key=None, envelope=None, trailer=None):
+    """Stream a query result as JSON.
+
+    With key=None the body is a bare array. Otherwise it is an object whose
+    `key` holds the array, preceded by the `envelope` fields. `trailer` is
+    called with the row count once streaming finishes and returns fields to
+    append after the array (e.g. a total count).
+    """
+    count = [0]
+    chunks = query.iter_json(conn, params, counter=count)
+
+    def body():
+        if key is None:
+            yield from stream_json_array(chunks)
+            return
+        head = '{'
+        for name, value in (envelope or {}).items():
+            head += _encode(name) + ':' + _encode(value) + ','
+        head += _encode(key) + ':'
+        yield from stream_json_array(chunks, head=head)
+        tail = ''
+        if trailer:
+            for name, value in trailer(count[0]).items():
+                tail += ',' + _encode(name) + ':' + _encode(value)
+        yield tail + '}'
+
+    return Response(stream_with_context(body()), mimetype='application/json')
+
+
+# ============================================
+# LIST QUERIES
+# ============================================
+
+MEMORY_TIMELINE = RowQuery(
+    'memory_timeline',
+    '''SELECT id, text, category, memory_date, year,
+              audio_filename, created_at
+       FROM memories
+       ORDER BY COALESCE(year, 9999) ASC, created_at ASC''',
+    ('id', 'text', 'category', 'memory_date', 'year', 'audio_filename', 'created_at'),
+    computed=lambda row: {'has_audio': bool(row.audio_filename)},
+)
+
+MEDIA_LIBRARY = RowQuery(
+    'media_library',
+    '''SELECT id, filename, original_filename, file_type, file_size, title,
+              description, memory_date, year, people, created_at
+       FROM media
+       ORDER BY created_at DESC''',
+    ('id', 'filename', 'original_filename', 'file_type', 'file_size', 'title',
+     'description', 'memory_date', 'year', 'people', 'created_at'),
+    computed=lambda row: {'url': f"/uploads/{row.filename}"},
+)
+
+AVAILABLE_MEDIA = RowQuery(
+    'available_media',
+    '''SELECT id, filename, original_filename, file_type,
+              title, description, memory_date, year, created_at
+       FROM media
+       ORDER BY COALESCE(year, 9999) DESC, created_at DESC''',
+    # memory_date is exposed as media_date to the photo picker
+    ('id', 'filename', 'original_filename', 'file_type',
+     'title', 'description', 'media_date', 'year', 'created_at'),
+)
+
+
+def _photo_defaults(row):
+    return {
+        'title': row.title or row.filename,
+        'description': row.description or '',
+        'year': row.year or 'Unknown',
+    }
+
+
+UNLINKED_PHOTOS = RowQuery(
+    'unlinked_photos',
+    '''SELECT m.id, m.filename, m.title, m.description, m.year
+       FROM media m
+       WHERE m.file_type = 'image'
+       AND m.id NOT IN (
+           SELECT media_id FROM memory_media WHERE memory_id = ?
+       )
+       ORDER BY m.year DESC, m.created_at DESC''',
+    ('id', 'filename', 'title', 'description', 'year'),
+    computed=_photo_defaults,
+)
+
+SEARCH_MEMORIES = RowQuery(
+    'search_memories',
+    '''SELECT m.id, m.text, m.category, m.memory_date, m.year
+       FROM memories m
+       ORDER BY m.year DESC''',
+    ('id', 'text', 'category', 'date', 'year'),
+)
+
+MEMORY_MEDIA = RowQuery(
+    'memory_media',
+    '''SELECT m.id, m.filename, m.original_filename, m.file_type,
+              m.title, m.description, m.memory_date, m.year,
+              mm.display_order
+       FROM media m
+       JOIN memory_media mm ON m.id = mm.media_id
+       WHERE mm.memory_id = ?
+       ORDER BY mm.display_order''',
+    # memory_date is exposed as media_date, as in AVAILABLE_MEDIA
+    ('id', 'filename', 'original_filename', 'file_type',
+     'title', 'description', 'media_date', 'year', 'display_order'),
+)
+
+
+# ============================================
+# ROUTE STATEMENTS
+# ============================================
+
+MEDIA_FILENAMES_SQL = "SELECT filename FROM media"
+
+MEMORY_SQL = '''
+    SELECT id, text, category, memory_date, year, created_at
+    FROM memories
+    WHERE id = ?
+'''
+
+BIOGRAPHY_MEMORIES_SQL = '''
+    SELECT id, text, year, category, memory_date
+    FROM memories
+    ORDER BY COALESCE(year, 9999) ASC, created_at ASC
+'''
+
+UPDATE_TRANSCRIPTION_SQL = '''
+    UPDATE audio_transcriptions
+    SET transcription_text = ?
+    WHERE audio_filename = ?
+'''
+
+DELETE_MEMORY_COMMENTS_SQL = 'DELETE FROM comments WHERE memory_id = ?'
+DELETE_MEMORY_LINKS_SQL = 'DELETE FROM memory_media WHERE memory_id = ?'
+DELETE_TRANSCRIPTION_SQL = 'DELETE FROM audio_transcriptions WHERE audio_filename = ?'
+DELETE_MEDIA_LINKS_SQL = 'DELETE FROM memory_media WHERE media_id = ?'
+
+CHAT_MESSAGE_INSERT = """
+    INSERT INTO chat_messages (session_id, timestamp, role, message, tokens_used)
+    VALUES (?, ?, ?, ?, ?)
+"""
+CHAT_HISTORY_SQL = """
+    SELECT role, message, timestamp
+    FROM chat_messages
+    WHERE session_id = ?
+    ORDER BY timestamp DESC, id DESC
+    LIMIT ?
+"""
@@ -1,18 +1,421 @@
 # database.py - Database setup and connection
 import sqlite3
 import os
+import queue
+import tempfile
+import threading
+import time
+from urllib.request import pathname2url
+
+from flask import g, has_app_context
 
 DB_PATH = os.getenv('DATABASE_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'circle_memories.db'))
 
+# Pool sizing - one connection is checked out per request, so this caps
+# the number of concurrent requests a single worker can serve from SQLite.
+POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '8'))
+POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '30'))
+
+# Connection profiles. Each profile is a set of PRAGMAs applied once when a
+# connection is opened plus a WAL checkpoint policy. Pick one with
+# DB_PROFILE and override single PRAGMAs with DB_PRAGMA_<NAME>, e.g.
+# DB_PRAGMA_BUSY_TIMEOUT=10000.
+DB_PROFILES = {
+    # Default: WAL so readers in one gunicorn worker are never blocked by a
+    # writer in another, and writers queue on busy_timeout instead of
+    # failing with "database is locked".
+    'concurrent': {
+        'pragmas': {
+            'journal_mode': 'WAL',
+            'synchronous': 'NORMAL',
+            'busy_timeout': 5000,
+            'cache_size': -16000,          # negative = KiB, so ~16 MB
+            'mmap_size': 128 * 1024 * 1024,
+            'temp_store': 'MEMORY',
+            'wal_autocheckpoint': 1000,    # pages
+            'journal_size_limit': 64 * 1024 * 1024,
+        },
+        'checkpoint': {
+            'every_n_releases': 500,
+            'truncate_above_bytes': 64 * 1024 * 1024,
+        },
+    },
+    # WAL with a full fsync on every commit, for hosts without a UPS.
+    'durable': {
+        'pragmas': {
+            'journal_mode': 'WAL',
+            'synchronous': 'FULL',
+            'busy_timeout': 5000,
+            'cache_size': -16000,
+            'mmap_size': 128 * 1024 * 1024,
+            'temp_store': 'MEMORY',
+            'wal_autocheckpoint': 1000,
+            'journal_size_limit': 64 * 1024 * 1024,
+        },
+        'checkpoint': {
+            'every_n_releases': 500,
+            'truncate_above_bytes': 64 * 1024 * 1024,
+        },
+    },
+    # SQLite defaults (rollback journal) apart from a busy timeout.
+    'legacy': {
+        'pragmas': {
+            'journal_mode': 'DELETE',
+            'synchronous': 'FULL',
+            'busy_timeout': 5000,
+        },
+        'checkpoint': None,
+    },
+}
+
+DB_PROFILE = os.getenv('DB_PROFILE', 'concurrent')
+
+# journal_mode is persistent in the database file, so it is only set by
+# init_db(); everything else is per connection.
+PERSISTENT_PRAGMAS = ('journal_mode',)
+
+
+def get_profile(name=None):
+    """Return the active profile with any DB_PRAGMA_* overrides applied."""
+    name = name or DB_PROFILE
+    if name not in DB_PROFILES:
+        raise ValueError(f"Unknown DB_PROFILE '{name}'. Choose from: {', '.join(DB_PROFILES)}")
+
+    profile = DB_PROFILES[name]
+    pragmas = dict(profile['pragmas'])
+    for key, value in os.environ.items():
+        if key.startswith('DB_PRAGMA_'):
+            pragmas[key[len('DB_PRAGMA_'):].lower()] = value
+    return {'name': name, 'pragmas': pragmas, 'checkpoint': profile['checkpoint']}
+
+
+def apply_pragmas(conn, profile=None):
+    """Apply the per-connection PRAGMAs of a profile."""
+    profile = profile or get_profile()
+    pragmas = profile['pragmas']
+    # busy_timeout first so the remaining PRAGMAs wait out a busy writer
+    if 'busy_timeout' in pragmas:
+        conn.execute(f"PRAGMA busy_timeout = {int(pragmas['busy_timeout'])}")
+    for name, value in pragmas.items():
+        if name == 'busy_timeout' or name in PERSISTENT_PRAGMAS:
+            continue
+        conn.execute(f"PRAGMA {name} = {value}")
+
+
+def connect(db_path=None, profile=None):
+    """Open a new connection with the standard row factory and PRAGMAs."""
+    conn = sqlite3.connect(db_path or DB_PATH, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    apply_pragmas(conn, profile)
+    return conn
+
+
+def checkpoint(conn, mode='PASSIVE'):
+    """Run a WAL checkpoint. Returns (busy, wal_pages, checkpointed_pages)."""
+    if mode not in ('PASSIVE', 'FULL', 'RESTART', 'TRUNCATE'):
+        raise ValueError(f"Invalid checkpoint mode: {mode}")
+    row = conn.execute(f"PRAGMA wal_checkpoint({mode})").fetchone()
+    return tuple(row)
+
+
+def wal_size(db_path=None):
+    """Size of the -wal file in bytes (0 when not in WAL mode)."""
+    wal_path = (db_path or DB_PATH) + '-wal'
+    return os.path.getsize(wal_path) if os.path.exists(wal_path) else 0
+
+
+def maybe_checkpoint(conn, db_path=None, policy=None):
+    """Apply the profile's checkpoint policy.
+
+    SQLite's own wal_autocheckpoint runs PASSIVE checkpoints, which never
+    wait for readers - under steady read traffic the WAL can keep growing.
+    Once it passes truncate_above_bytes we force a TRUNCATE checkpoint so
+    the file shrinks back to zero.
+    """
+    policy = policy if policy is not None else get_profile()['checkpoint']
+    if not policy:
+        return None
+    if wal_size(db_path) > policy['truncate_above_bytes']:
+        return checkpoint(conn, 'TRUNCATE')
+    return None
+
+
+class ConnectionPool:
+    """Bounded pool of SQLite connections shared by the threads of one process."""
+
+    def __init__(self, db_path, max_size=POOL_SIZE, timeout=POOL_TIMEOUT):
+        self.db_path = db_path
+        self.max_size = max_size
+        self.timeout = timeout
+        self.pid = os.getpid()
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._open = 0
+        self._in_use = 0
+        self._checkouts = 0
+        self._waits = 0
+        self._wait_time = 0.0
+        self._max_wait = 0.0
+        self._releases = 0
+        self._checkpoints = 0
+        self.checkpoint_policy = get_profile()['checkpoint']
+
+    def acquire(self):
+        """Check out a connection, opening a new one if the pool is not full."""
+        started = time.perf_counter()
+        conn = None
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                if self._open < self.max_size:
+                    self._open += 1
+                    create = True
+                else:
+                    create = False
+            if create:
+                try:
+                    conn = connect(self.db_path)
+                except Exception:
+                    with self._lock:
+                        self._open -= 1
+                    raise
+            else:
+                try:
+                    conn = self._idle.get(timeout=self.timeout)
+                except queue.Empty:
+                    raise RuntimeError(
+                        f"Timed out after {self.timeout}s waiting for a database connection"
+                    )
+
+        waited = time.perf_counter() - started
+        with self._lock:
+            self._in_use += 1
+            self._checkouts += 1
+            if waited > 0.001:
+                self._waits += 1
+            self._wait_time += waited
+            self._max_wait = max(self._max_wait, waited)
+        return conn
+
+    def release(self, conn):
+        """Return a connection to the pool, discarding any uncommitted work."""
+        policy = self.checkpoint_policy
+        with self._lock:
+            self._in_use -= 1
+            self._releases += 1
+            due = bool(policy) and self._releases % policy['every_n_releases'] == 0
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            if due and maybe_checkpoint(conn, self.db_path, policy) is not None:
+                with self._lock:
+                    self._checkpoints += 1
+        except sqlite3.Error:
+            # Broken connection - drop it so the next checkout opens a fresh one
+            with self._lock:
+                self._open -= 1
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+            return
+        self._idle.put(conn)
+
+    def close_all(self):
+        """Close every idle connection (checked-out ones close on release)."""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._open -= 1
+
+    def stats(self):
+        """Snapshot of pool usage counters."""
+        with self._lock:
+            return {
+                'db_path': self.db_path,
+                'max_size': self.max_size,
+                'open_connections': self._open,
+                'in_use': self._in_use,
+                'idle': self._idle.qsize(),
+                'checkouts': self._checkouts,
+                'waits': self._waits,
+                'total_wait_ms': round(self._wait_time * 1000, 3),
+                'avg_wait_ms': round(self._wait_time * 1000 / self._checkouts, 3) if self._checkouts else 0.0,
+                'max_wait_ms': round(self._max_wait * 1000, 3),
+                'profile': get_profile()['name'],
+                'forced_checkpoints': self._checkpoints,
+                'wal_bytes': wal_size(self.db_path),
+            }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Return the process-wide pool, recreating it after a fork or DB_PATH change."""
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool.pid != os.getpid() or _pool.db_path != DB_PATH:
+            if _pool is not None and _pool.pid == os.getpid():
+                _pool.close_all()
+            _pool = ConnectionPool(DB_PATH)
+        return _pool
+
+
+def pool_stats():
+    """Pool statistics for the debug endpoint."""
+    return get_pool().stats()
+
+
+class pooled_connection:
+    """Context manager for code running outside a request (scripts, background threads)."""
+
+    def __enter__(self):
+        self.pool = get_pool()
+        self.conn = self.pool.acquire()
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.pool.release(self.conn)
+        return False
+
+
 def get_db():
-    """Get a database connection."""
-    conn = sqlite3.connect(DB_PATH)
+    """Get a database connection.
+
+    Inside a Flask app context this returns the connection checked out for
+    the current request, which is handed back to the pool on teardown.
+    Outside an app context (startup code, CLI scripts) a standalone
+    connection is returned and the caller is responsible for closing it.
+    """
+    if has_app_context():
+        if 'db' not in g:
+            g.db_pool = get_pool()
+            g.db = g.db_pool.acquire()
+        return g.db
+    return connect()
+
+
+def close_db(exc=None):
+    """Return the request's connection to the pool."""
+    conn = g.pop('db', None)
+    pool = g.pop('db_pool', None)
+    if conn is not None:
+        pool.release(conn)
+
+
+# ============================================
+# READ-ONLY SNAPSHOTS
+# ============================================
+# Long reporting scans (PDF exports, batch photo suggestions) read through
+# a snapshot so they see one consistent state of the archive and never
+# hold a lock that stalls save_memory or upload_media.
+#
+#   'wal'  - read-only connection inside one read transaction. In WAL mode
+#            readers never block writers, and the transaction pins the
+#            snapshot for the whole export.
+#   'copy' - copy the database with the backup API (a few pages at a time)
+#            to a scratch file and read the copy. Needed with a rollback
+#            journal, where an open read transaction would block writers.
+#   'auto' - 'wal' when the database is in WAL mode, otherwise 'copy'.
+SNAPSHOT_MODE = os.getenv('DB_SNAPSHOT_MODE', 'auto')
+SNAPSHOT_COPY_PAGES = 1024
+
+
+def connect_readonly(db_path=None):
+    """Open a connection that cannot write: mode=ro plus query_only."""
+    path = os.path.abspath(db_path or DB_PATH)
+    conn = sqlite3.connect(f"file:{pathname2url(path)}?mode=ro", uri=True, check_same_thread=False)
     conn.row_factory = sqlite3.Row
+    apply_pragmas(conn)
+    conn.execute("PRAGMA query_only = ON")
     return conn
 
+
+def copy_database(source_path, dest_path, pages=SNAPSHOT_COPY_PAGES, sleep=0.0):
+    """Copy a live database with the backup API, `pages` pages per step."""
+    source = sqlite3.connect(source_path)
+    dest = sqlite3.connect(dest_path)
+    try:
+        source.execute(f"PRAGMA busy_timeout = {int(get_profile()['pragmas'].get('busy_timeout', 5000))}")
+        source.backup(dest, pages=pages, sleep=sleep)
+    finally:
+        dest.close()
+        source.close()
+
+
+class read_snapshot:
+    """Context manager yielding a read-only connection to a consistent snapshot.
+
+    with read_snapshot() as db:
+        rows = db.execute("SELECT ...").fetchall()
+    """
+
+    def __init__(self, db_path=None, mode=None):
+        self.db_path = db_path or DB_PATH
+        self.mode = mode or SNAPSHOT_MODE
+        self.conn = None
+        self.copy_path = None
+
+    def __enter__(self):
+        mode = self.mode
+        if mode == 'auto':
+            probe = sqlite3.connect(self.db_path)
+            try:
+                journal_mode = probe.execute("PRAGMA journal_mode").fetchone()[0]
+            finally:
+                probe.close()
+            mode = 'wal' if journal_mode.lower() == 'wal' else 'copy'
+        if mode not in ('wal', 'copy'):
+            raise ValueError(f"Unknown snapshot mode '{mode}'")
+        self.resolved_mode = mode
+
+        if mode == 'copy':
+            fd, self.copy_path = tempfile.mkstemp(prefix='circle_snapshot_', suffix='.db')
+            os.close(fd)
+            copy_database(self.db_path, self.copy_path)
+            self.conn = connect_readonly(self.copy_path)
+        else:
+            self.conn = connect_readonly(self.db_path)
+            # A read transaction only pins its snapshot once it reads something
+            self.conn.execute("BEGIN")
+            self.conn.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if self.conn is not None:
+                if self.conn.in_transaction:
+                    self.conn.rollback()
+                self.conn.close()
+        finally:
+            if self.copy_path and os.path.exists(self.copy_path):
+                os.unlink(self.copy_path)
+        return False
+
+
+def init_app(app):
+    """Register connection teardown with the Flask app."""
+    app.teardown_appcontext(close_db)
+
+
 def init_db():
     """Initialize database with all tables."""
+    profile = get_profile()
     conn = sqlite3.connect(DB_PATH)
+    conn.execute(f"PRAGMA busy_timeout = {int(profile['pragmas'].get('busy_timeout', 5000))}")
+    # Only takes effect on a new, empty file; existing databases are
+    # converted with `python maintenance.py enable-incremental`
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    journal_mode = profile['pragmas'].get('journal_mode')
+    if journal_mode:
+        conn.execute(f"PRAGMA journal_mode = {journal_mode}")
     cursor = conn.cursor()
     
     # User profile
@@ -102,10 +505,366 @@ def init_db():
     conn.close()
     print(f"Database initialized at: {DB_PATH}")
 
+# ============================================
+# VERSIONED MIGRATIONS
+# ============================================
+# Each migration runs once, in order, inside its own transaction. The
+# schema version is kept in PRAGMA user_version. Append new steps to
+# MIGRATIONS - never edit or reorder one that has shipped.
+
+def _migration_link_and_chat_tables(cursor):
+    """Tables previously created by the loose .sql migration files."""
+    cursor.execute('''CREATE TABLE IF NOT EXISTS memory_media (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        memory_id INTEGER NOT NULL,
+        media_id INTEGER NOT NULL,
+        display_order INTEGER DEFAULT 0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (memory_id) REFERENCES memories(id) ON DELETE CASCADE,
+        FOREIGN KEY (media_id) REFERENCES media(id) ON DELETE CASCADE,
+        UNIQUE(memory_id, media_id)
+    )''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_memory_media_memory_id ON memory_media(memory_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_memory_media_media_id ON memory_media(media_id)")
+
+    cursor.execute('''CREATE TABLE IF NOT EXISTS chat_messages (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        session_id TEXT NOT NULL,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+        role TEXT NOT NULL CHECK(role IN ('user', 'assistant')),
+        message TEXT NOT NULL,
+        tokens_used INTEGER DEFAULT 0,
+        model TEXT DEFAULT 'deepseek-chat'
+    )''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_chat_session ON chat_messages(session_id, timestamp)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_chat_timestamp ON chat_messages(timestamp DESC)")
+
+
+def _migration_hot_query_indexes(cursor):
+    """Indexes for the timeline, photo picker, PDF export and link queries."""
+    # Timeline (get_memories, biography draft): ORDER BY COALESCE(year, 9999), created_at
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_memories_timeline ON memories(COALESCE(year, 9999), created_at)")
+    # Album PDF / AI search / helper CLI: ORDER BY year DESC[, created_at DESC]
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_memories_year ON memories(year, created_at)")
+
+    # Photo picker, photo matcher and biography PDF: WHERE file_type = 'image' ORDER BY year, created_at
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_media_type_year ON media(file_type, year, created_at)")
+    # Album PDF: WHERE file_type = 'image' ORDER BY created_at DESC
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_media_type_created ON media(file_type, created_at)")
+    # Media library: ORDER BY created_at DESC
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_media_created ON media(created_at)")
+    # Available media: ORDER BY COALESCE(year, 9999) DESC, created_at DESC
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_media_year_sort ON media(COALESCE(year, 9999), created_at)")
+    # Year-proximity auto-linking
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_media_year ON media(year)")
+    # scan_existing_uploads reads every filename - answered from this index alone
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_media_filename ON media(filename)")
+
+    # Link lookups ordered by display_order, covering media_id
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_memory_media_order ON memory_media(memory_id, display_order, media_id)")
+
+    # Child tables joined on memory_id; the second column makes them covering
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_comments_memory ON comments(memory_id, created_at)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_memory_people_memory ON memory_people(memory_id, person_name)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_memory_people_name ON memory_people(person_name COLLATE NOCASE, memory_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_memory_tags_memory ON memory_tags(memory_id, tag)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_memory_tags_tag ON memory_tags(tag COLLATE NOCASE, memory_id)")
+
+    # save_memory / delete_memory update transcriptions by filename
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_audio_filename ON audio_transcriptions(audio_filename)")
+
+    # The message index only served LIKE 'x%' lookups, which nothing runs
+    cursor.execute("DROP INDEX IF EXISTS idx_chat_content")
+
+
+def _migration_full_text_search(cursor):
+    """FTS5 indexes over memories, media metadata and chat messages."""
+    import fts_index
+
+    if not fts_index.has_fts5(cursor.connection):
+        print("⚠️  SQLite was built without FTS5 - search will scan tables instead")
+        return
+    fts_index.create_fts_tables(cursor)
+
+
+def _migration_maintenance_log(cursor):
+    cursor.execute('''CREATE TABLE IF NOT EXISTS maintenance_log (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        task TEXT NOT NULL,
+        started_at TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'running',
+        duration_ms REAL,
+        bytes_before INTEGER,
+        bytes_after INTEGER,
+        bytes_reclaimed INTEGER,
+        detail TEXT
+    )''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_maintenance_log_task ON maintenance_log(task, started_at)")
+
+
+def _migration_memory_change_log(cursor):
+    # Feeds search_index.MemoryIndex.sync(); every process replays the
+    # memory ids logged since its last sync
+    cursor.execute('''CREATE TABLE IF NOT EXISTS memory_changes (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        memory_id INTEGER NOT NULL,
+        changed_at TEXT DEFAULT CURRENT_TIMESTAMP
+    )''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_memory_changes_changed_at ON memory_changes(changed_at)")
+    for name, event, table, ref in (
+        ('memory_changes_ai', 'AFTER INSERT', 'memories', 'new.id'),
+        ('memory_changes_au', 'AFTER UPDATE OF text', 'memories', 'new.id'),
+        ('memory_changes_ad', 'AFTER DELETE', 'memories', 'old.id'),
+        ('memory_people_changes_ai', 'AFTER INSERT', 'memory_people', 'new.memory_id'),
+        ('memory_people_changes_ad', 'AFTER DELETE', 'memory_people', 'old.memory_id'),
+    ):
+        cursor.execute(f'''CREATE TRIGGER IF NOT EXISTS {name} {event} ON {table} BEGIN
+            INSERT INTO memory_changes(memory_id) VALUES ({ref});
+        END''')
+
+
+def _migration_log_all_memory_updates(cursor):
+    # Category and year edits change search results too, not just text
+    cursor.execute("DROP TRIGGER IF EXISTS memory_changes_au")
+    cursor.execute('''CREATE TRIGGER memory_changes_au AFTER UPDATE ON memories BEGIN
+        INSERT INTO memory_changes(memory_id) VALUES (new.id);
+    END''')
+
+
+def _migration_media_change_log(cursor):
+    # Feeds name_index.NameIndex.sync() with media whose people changed
+    cursor.execute('''CREATE TABLE IF NOT EXISTS media_changes (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        media_id INTEGER NOT NULL,
+        changed_at TEXT DEFAULT CURRENT_TIMESTAMP
+    )''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_media_changes_changed_at ON media_changes(changed_at)")
+    for name, event, ref in (
+        ('media_changes_ai', 'AFTER INSERT', 'new.id'),
+        ('media_changes_au', 'AFTER UPDATE OF people', 'new.id'),
+        ('media_changes_ad', 'AFTER DELETE', 'old.id'),
+    ):
+        cursor.execute(f'''CREATE TRIGGER IF NOT EXISTS {name} {event} ON media BEGIN
+            INSERT INTO media_changes(media_id) VALUES ({ref});
+        END''')
+
+
+def _migration_memory_tokens(cursor):
+    # Written by memory_tokens.store() when a memory is saved; the
+    # triggers drop a row as soon as its memory's text changes
+    cursor.execute('''CREATE TABLE IF NOT EXISTS memory_tokens (
+        memory_id INTEGER PRIMARY KEY,
+        version INTEGER NOT NULL,
+        terms TEXT NOT NULL,
+        keywords TEXT NOT NULL,
+        names TEXT NOT NULL,
+        updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+    )''')
+    cursor.execute('''CREATE TRIGGER IF NOT EXISTS memory_tokens_au AFTER UPDATE OF text ON memories BEGIN
+        DELETE FROM memory_tokens WHERE memory_id = old.id;
+    END''')
+    cursor.execute('''CREATE TRIGGER IF NOT EXISTS memory_tokens_ad AFTER DELETE ON memories BEGIN
+        DELETE FROM memory_tokens WHERE memory_id = old.id;
+    END''')
+    import memory_tokens
+    memory_tokens.refresh(cursor.connection, commit=False)
+
+
+def _migration_facet_counts(cursor):
+    # Pre-aggregated counts for facets.facet_counts(): one row per
+    # (category, decade, person) cell. person '' rows count memories, the
+    # others count memory_people tags. Keys are NOT NULL text, so '' also
+    # stands for a missing category or year.
+    cursor.execute('''CREATE TABLE IF NOT EXISTS memory_facet_counts (
+        category TEXT NOT NULL,
+        decade TEXT NOT NULL,
+        person TEXT NOT NULL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (category, decade, person)
+    ) WITHOUT ROWID''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_memory_facet_counts_person "
+                   "ON memory_facet_counts(person, category, decade, count)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_memory_facet_counts_decade "
+                   "ON memory_facet_counts(decade, person, category, count)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_memories_facets ON memories(category, year)")
+
+    def cell(ref):
+        return f"COALESCE({ref}.category, ''), COALESCE(CAST({ref}.year / 10 * 10 AS TEXT), '')"
+
+    def bump(select):
+        return (f"INSERT INTO memory_facet_counts (category, decade, person, count) {select} "
+                f"ON CONFLICT (category, decade, person) DO UPDATE SET count = count + excluded.count;")
+
+    def move_tags(ref, sign):
+        # Every tag of the memory, counted in the memory's cell
+        return bump(f"SELECT {cell(ref)}, person_name, {sign}COUNT(*) FROM memory_people "
+                    f"WHERE memory_id = {ref}.id AND person_name IS NOT NULL GROUP BY person_name")
+
+    def tag(ref, sign):
+        return bump(f"SELECT {cell('m')}, {ref}.person_name, {sign}1 FROM memories m "
+                    f"WHERE m.id = {ref}.memory_id AND {ref}.person_name IS NOT NULL")
+
+    for name, event, body in (
+        ('memory_facets_ai', 'AFTER INSERT ON memories',
+         bump(f"SELECT {cell('new')}, '', 1 WHERE true")),
+        # Tags of a deleted memory go with it, while the memory row is still
+        # there for the memory_people trigger to find its cell
+        ('memory_facets_bd', 'BEFORE DELETE ON memories',
+         "DELETE FROM memory_people WHERE memory_id = old.id;"),
+        ('memory_facets_ad', 'AFTER DELETE ON memories',
+         bump(f"SELECT {cell('old')}, '', -1 WHERE true")),
+        ('memory_facets_au', 'AFTER UPDATE OF category, year ON memories '
+                             'WHEN old.category IS NOT new.category OR old.year IS NOT new.year',
+         bump(f"SELECT {cell('old')}, '', -1 WHERE true") + move_tags('old', '-')
+         + bump(f"SELECT {cell('new')}, '', 1 WHERE true") + move_tags('new', '')),
+        ('memory_people_facets_ai', 'AFTER INSERT ON memory_people', tag('new', '')),
+        ('memory_people_facets_ad', 'AFTER DELETE ON memory_people', tag('old', '-')),
+        ('memory_people_facets_au', 'AFTER UPDATE OF person_name, memory_id ON memory_people',
+         tag('old', '-') + tag('new', '')),
+    ):
+        cursor.execute(f"CREATE TRIGGER IF NOT EXISTS {name} {event} BEGIN {body} END")
+
+    cursor.execute("DELETE FROM memory_people WHERE memory_id NOT IN (SELECT id FROM memories)")
+    cursor.execute("DELETE FROM memory_facet_counts")
+    cursor.execute(f'''INSERT INTO memory_facet_counts (category, decade, person, count)
+        SELECT {cell('m')}, '', COUNT(*) FROM memories m GROUP BY 1, 2
+        UNION ALL
+        SELECT {cell('m')}, mp.person_name, COUNT(*)
+        FROM memory_people mp JOIN memories m ON m.id = mp.memory_id
+        WHERE mp.person_name IS NOT NULL
+        GROUP BY 1, 2, 3''')
+
+
+def _migration_memory_entities(cursor):
+    # memory_entities.store() marks the people and tags it extracts from
+    # the text with source 'text'; NULL is a hand-made tag it never touches
+    cursor.execute("ALTER TABLE memory_people ADD COLUMN source TEXT")
+    cursor.execute("ALTER TABLE memory_tags ADD COLUMN source TEXT")
+    cursor.execute('''CREATE TRIGGER IF NOT EXISTS memory_tags_ad AFTER DELETE ON memories BEGIN
+        DELETE FROM memory_tags WHERE memory_id = old.id;
+    END''')
+    cursor.execute("DELETE FROM memory_tags WHERE memory_id NOT IN (SELECT id FROM memories)")
+    # Checkpoints of resumable batch jobs; memory_entities.backfill() is
+    # left to the maintenance scheduler so the migration stays quick
+    cursor.execute('''CREATE TABLE IF NOT EXISTS backfill_progress (
+        task TEXT PRIMARY KEY,
+        last_id INTEGER NOT NULL,
+        updated_at TEXT
+    )''')
+
+
+def _migration_log_media_titles(cursor):
+    # suggest_index completes media titles, so title edits are logged too
+    cursor.execute("DROP TRIGGER IF EXISTS media_changes_au")
+    cursor.execute('''CREATE TRIGGER media_changes_au AFTER UPDATE OF people, title ON media BEGIN
+        INSERT INTO media_changes(media_id) VALUES (new.id);
+    END''')
+
+
+def _migration_llm_cache(cursor):
+    # llm_cache.py: responses keyed by a hash of provider, model, prompt and
+    # parameters; times are Unix seconds
+    cursor.execute('''CREATE TABLE IF NOT EXISTS llm_cache (
+        key TEXT PRIMARY KEY,
+        provider TEXT NOT NULL,
+        model TEXT NOT NULL,
+        response TEXT NOT NULL,
+        created_at REAL NOT NULL,
+        used_at REAL NOT NULL,
+        expires_at REAL NOT NULL
+    )''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_used ON llm_cache(used_at)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_expires ON llm_cache(expires_at)")
+
+
+def _migration_category_status(cursor):
+    # categorizer.py: saves store a keyword category as 'provisional' and a
+    # background worker refines it. category_due_at (Unix seconds) is when a
+    # provisional row may next be tried, or when a worker's claim on a
+    # 'refining' row lapses. NULL status is a category set before this.
+    cursor.execute("ALTER TABLE memories ADD COLUMN category_status TEXT")
+    cursor.execute("ALTER TABLE memories ADD COLUMN category_attempts INTEGER NOT NULL DEFAULT 0")
+    cursor.execute("ALTER TABLE memories ADD COLUMN category_due_at REAL")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_memories_category_status ON memories(category_status, category_due_at)")
+    # Only content edits reach the change log, not the worker's bookkeeping
+    cursor.execute("DROP TRIGGER IF EXISTS memory_changes_au")
+    cursor.execute('''CREATE TRIGGER memory_changes_au AFTER UPDATE OF
+        text, category, memory_date, year, audio_filename, people, places, created_at ON memories BEGIN
+        INSERT INTO memory_changes(memory_id) VALUES (new.id);
+    END''')
+
+
+def _migration_drop_memories_fts(cursor):
+    # Memory search ranks with search_index.py's BM25 index; nothing reads
+    # memories_fts, so stop paying for its triggers on every memory write
+    for trigger in ('memories_fts_ai', 'memories_fts_ad', 'memories_fts_au'):
+        cursor.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    cursor.execute("DROP TABLE IF EXISTS memories_fts")
+
+
+def _migration_reextract_people(cursor):
+    # TOKENIZER_VERSION 3 strips calendar words from names ("Boxing Day
+    # Peter" -> "Peter"). Restart the memory_entities backfill so the
+    # hourly task replaces names extracted by the old rules.
+    cursor.execute("DELETE FROM backfill_progress WHERE task = 'memory_entities'")
+
+
+MIGRATIONS = [
+    (1, 'memory_media and chat_messages tables', _migration_link_and_chat_tables),
+    (2, 'hot query indexes', _migration_hot_query_indexes),
+    (3, 'full-text search indexes', _migration_full_text_search),
+    (4, 'maintenance log', _migration_maintenance_log),
+    (5, 'memory change log for the search index', _migration_memory_change_log),
+    (6, 'log every memory update', _migration_log_all_memory_updates),
+    (7, 'media change log for the name index', _migration_media_change_log),
+    (8, 'memory tokens stored at write time', _migration_memory_tokens),
+    (9, 'facet counts', _migration_facet_counts),
+    (10, 'extracted memory people and tags', _migration_memory_entities),
+    (11, 'log media title edits', _migration_log_media_titles),
+    (12, 'LLM response cache', _migration_llm_cache),
+    (13, 'background categorization status', _migration_category_status),
+    (14, 'drop the unused memory FTS index', _migration_drop_memories_fts),
+    (15, 're-extract people after the calendar-word fix', _migration_reextract_people),
+]
+
+
+def schema_version(conn):
+    """Current schema version of a connection's database."""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def run_migrations(conn):
+    """Apply pending migrations. Safe to call from several workers at once."""
+    applied = []
+    for version, description, step in MIGRATIONS:
+        # BEGIN IMMEDIATE takes the write lock before re-checking the
+        # version, so two workers starting together cannot both apply a step
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if schema_version(conn) >= version:
+                conn.rollback()
+                continue
+            step(conn.cursor())
+            conn.execute(f"PRAGMA user_version = {version}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        applied.append(version)
+        print(f"✓ Applied migration {version}: {description}")
+
+    if applied:
+        # Refresh planner statistics for the new indexes
+        conn.execute("ANALYZE")
+        conn.commit()
+    return applied
+
+
 def migrate_db():
-    """Add file_size column if it doesn't exist."""
+    """Add file_size column if it doesn't exist, then run versioned migrations."""
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = sqlite3.connect(DB_PATH, isolation_level=None)
+        conn.execute(f"PRAGMA busy_timeout = {int(get_profile()['pragmas'].get('busy_timeout', 5000))}")
         cursor = conn.cursor()
         
         # Check if file_size column exists
@@ -114,9 +873,9 @@ def migrate_db():
         
         if 'file_size' not in columns:
             cursor.execute("ALTER TABLE media ADD COLUMN file_size INTEGER")
-            conn.commit()
             print("✓ Added file_size column to media table")
         
+        run_migrations(conn)
         conn.close()
     except Exception as e:
-        print(f"Migration error: {e}")
\ No newline at end of file
+        print(f"Migration error: {e}")
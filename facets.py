@@ -0,0 +1,116 @@
+# facets.py - Counts by category, decade and person for search drill-down
+"""
+Category and decade filters are answered from memory_facet_counts, a
+table of counts per (category, decade, person) cell that triggers on
+memories and memory_people keep current. Drilling down costs an index
+range scan over a few hundred cells, however large the archive is.
+
+Filtering by person or by a search query needs to know which memories
+match, so those go to one SQL statement over the matching memory ids,
+counted through the (category, year) and memory_people indexes. Either
+way the counting happens in SQLite, not by iterating rows in Python.
+"""
+
+import json
+
+import search_index
+
+FACETS = ('category', 'decade', 'person')
+PERSON_LIMIT = 20
+
+_CELL_SQL = '''
+    SELECT 'category', category, SUM(count) FROM memory_facet_counts
+    WHERE person = '' {where} GROUP BY category
+    UNION ALL
+    SELECT 'decade', decade, SUM(count) FROM memory_facet_counts
+    WHERE person = '' {where} GROUP BY decade
+    UNION ALL
+    SELECT * FROM (
+        SELECT 'person', person, SUM(count) AS n FROM memory_facet_counts
+        WHERE person != '' {where} GROUP BY person
+        HAVING n > 0 ORDER BY n DESC, person LIMIT ?
+    )
+    UNION ALL
+    SELECT 'total', NULL, SUM(count) FROM memory_facet_counts
+    WHERE person = '' {where}
+'''
+
+_HITS_SQL = '''
+    WITH hits(id, category, decade) AS (
+        SELECT m.id, m.category, m.year / 10 * 10 FROM memories m
+        WHERE {where}
+    )
+    SELECT 'category', category, COUNT(*) FROM hits GROUP BY category
+    UNION ALL
+    SELECT 'decade', decade, COUNT(*) FROM hits GROUP BY decade
+    UNION ALL
+    SELECT * FROM (
+        SELECT 'person', mp.person_name, COUNT(*) AS n
+        FROM hits JOIN memory_people mp ON mp.memory_id = hits.id
+        GROUP BY mp.person_name
+        ORDER BY n DESC, mp.person_name
+        LIMIT ?
+    )
+    UNION ALL
+    SELECT 'total', NULL, COUNT(*) FROM hits
+'''
+
+
+def _cell_counts(conn, category, decade, person_limit):
+    where, params = '', []
+    if category is not None:
+        where += " AND category = ?"
+        params.append(category)
+    if decade is not None:
+        where += " AND decade = ?"
+        params.append(str(decade))
+    sql = _CELL_SQL.format(where=where)
+    rows = conn.execute(sql, params * 2 + params + [person_limit] + params).fetchall()
+    # Cell keys are NOT NULL text: '' is a missing category or year
+    return [
+        (facet, None if value == '' else int(value) if facet == 'decade' else value, count or 0)
+        for facet, value, count in rows
+    ]
+
+
+def _hit_counts(conn, query, category, decade, person, person_limit):
+    where, params = [], []
+    if category is not None:
+        where.append("m.category = ?")
+        params.append(category)
+    if decade is not None:
+        where.append("m.year BETWEEN ? AND ?")
+        params.extend((decade, decade + 9))
+    if person is not None:
+        where.append("m.id IN (SELECT memory_id FROM memory_people WHERE person_name = ? COLLATE NOCASE)")
+        params.append(person)
+    if query is not None:
+        where.append("m.id IN (SELECT value FROM json_each(?))")
+        params.append(json.dumps(search_index.get_index(conn).matching(query)))
+    sql = _HITS_SQL.format(where=' AND '.join(where))
+    return conn.execute(sql, params + [person_limit]).fetchall()
+
+
+def facet_counts(conn, query=None, category=None, decade=None, person=None, person_limit=PERSON_LIMIT):
+    """Counts per category, decade and person for the memories matching every filter.
+
+    decade is the first year of a decade (1960). Returns (total, facets)
+    where facets maps each of FACETS to [{'value', 'count'}, ...],
+    largest count first; person lists at most person_limit names.
+    """
+    query = query.strip() if query else None
+    if query is None and person is None:
+        rows = _cell_counts(conn, category, decade, person_limit)
+    else:
+        rows = _hit_counts(conn, query, category, decade, person, person_limit)
+
+    facets = {facet: [] for facet in FACETS}
+    total = 0
+    for facet, value, count in rows:
+        if facet == 'total':
+            total = count or 0
+        elif count > 0:
+            facets[facet].append({'value': value, 'count': count})
+    for facet in ('category', 'decade'):
+        facets[facet].sort(key=lambda item: (-item['count'], item['value'] is None, item['value']))
+    return total, facets
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+SQLite FTS5 full-text indexes for media metadata and chat messages.
+
+Memory text is ranked by the in-process BM25 index in search_index.py
+instead; migration 14 drops the memories_fts table it replaced. The FTS
+tables are external-content tables: they store only the inverted
+index and read the text back from the source tables. Triggers on the
+source tables keep them in sync, so application code never writes to
+them directly.
+
+Usage:
+    python fts_index.py rebuild            # rebuild every index
+    python fts_index.py rebuild media      # rebuild one index
+    python fts_index.py search "wedding"
+"""
+
+import sqlite3
+import sys
+
+from tokenizer import STOPWORDS, words
+
+# index name -> (source table, indexed columns, bm25 column weights)
+FTS_TABLES = {
+    'media_fts': ('media', ('title', 'description', 'people'), (10.0, 4.0, 8.0)),
+    'chat_messages_fts': ('chat_messages', ('message',), (1.0,)),
+}
+
+TOKENIZER = 'porter unicode61 remove_diacritics 2'
+
+
+def has_fts5(conn):
+    """Check whether this SQLite build was compiled with FTS5."""
+    try:
+        conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS temp._fts5_probe USING fts5(x)")
+        conn.execute("DROP TABLE temp._fts5_probe")
+        return True
+    except sqlite3.OperationalError:
+        return False
+
+
+def fts_ready(conn, index='media_fts'):
+    """True if the given FTS table exists in this database."""
+    row = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (index,)
+    ).fetchone()
+    return row is not None
+
+
+def create_fts_tables(cursor):
+    """Create FTS tables and sync triggers, then index existing rows."""
+    for index, (table, columns, _) in FTS_TABLES.items():
+        column_list = ', '.join(columns)
+        new_values = ', '.join(f'new.{c}' for c in columns)
+        old_values = ', '.join(f'old.{c}' for c in columns)
+
+        cursor.execute(f'''CREATE VIRTUAL TABLE IF NOT EXISTS {index} USING fts5(
+            {column_list}, content='{table}', content_rowid='id', tokenize='{TOKENIZER}'
+        )''')
+        cursor.execute(f'''CREATE TRIGGER IF NOT EXISTS {index}_ai AFTER INSERT ON {table} BEGIN
+            INSERT INTO {index}(rowid, {column_list}) VALUES (new.id, {new_values});
+        END''')
+        cursor.execute(f'''CREATE TRIGGER IF NOT EXISTS {index}_ad AFTER DELETE ON {table} BEGIN
+            INSERT INTO {index}({index}, rowid, {column_list}) VALUES ('delete', old.id, {old_values});
+        END''')
+        cursor.execute(f'''CREATE TRIGGER IF NOT EXISTS {index}_au AFTER UPDATE OF {column_list} ON {table} BEGIN
+            INSERT INTO {index}({index}, rowid, {column_list}) VALUES ('delete', old.id, {old_values});
+            INSERT INTO {index}(rowid, {column_list}) VALUES (new.id, {new_values});
+        END''')
+        cursor.execute(f"INSERT INTO {index}({index}) VALUES ('rebuild')")
+
+
+def rebuild(conn, only=None):
+    """Rebuild one or all FTS indexes from their source tables."""
+    if only is None:
+        names = list(FTS_TABLES)
+    else:
+        names = [only if only.endswith('_fts') else f'{only}_fts']
+    for index in names:
+        if index not in FTS_TABLES:
+            raise ValueError(f"Unknown FTS index '{only}'. Choose from: {', '.join(FTS_TABLES)}")
+        conn.execute(f"INSERT INTO {index}({index}) VALUES ('rebuild')")
+        conn.execute(f"INSERT INTO {index}({index}) VALUES ('optimize')")
+    conn.commit()
+    return names
+
+
+def build_match_query(text):
+    """Turn free text into a safe FTS5 MATCH expression.
+
+    Every term is quoted so user input can never be parsed as FTS syntax,
+    and terms are OR-ed so a question like "Where was Dad born?" still
+    matches memories that mention only some of the words - bm25 ranks
+    the ones matching more terms higher.
+    """
+    terms = []
+    for token in words(text):
+        if token in STOPWORDS or token in terms:
+            continue
+        terms.append(token)
+    if not terms:
+        return None
+    return ' OR '.join(f'"{term}"' for term in terms)
+
+
+def _weights(index):
+    return ', '.join(str(w) for w in FTS_TABLES[index][2])
+
+
+_MEDIA_SEARCH_SQL = f'''
+    SELECT m.id, m.filename, m.title, m.description, m.people, m.year, m.file_type,
+           bm25(media_fts, {_weights('media_fts')}) AS rank
+    FROM media_fts
+    JOIN media m ON m.id = media_fts.rowid
+    WHERE media_fts MATCH ?
+    ORDER BY rank
+    LIMIT ?
+'''
+
+_CHAT_SEARCH_SQL = f'''
+    SELECT c.role, c.message, c.timestamp, c.session_id,
+           bm25(chat_messages_fts, {_weights('chat_messages_fts')}) AS rank
+    FROM chat_messages_fts
+    JOIN chat_messages c ON c.id = chat_messages_fts.rowid
+    WHERE chat_messages_fts MATCH ?
+    ORDER BY rank
+    LIMIT ?
+'''
+
+
+def search_media(conn, query, limit=50):
+    """Ranked media rows matching title, description or people."""
+    match = build_match_query(query)
+    if not match:
+        return []
+    return conn.execute(_MEDIA_SEARCH_SQL, (match, limit)).fetchall()
+
+
+def search_chat(conn, query, limit=10):
+    """Ranked chat messages matching a query."""
+    match = build_match_query(query)
+    if not match:
+        return []
+    return conn.execute(_CHAT_SEARCH_SQL, (match, limit)).fetchall()
+
+
+def main():
+    import argparse
+    import database
+
+    parser = argparse.ArgumentParser(description='Manage the SQLite full-text search indexes')
+    sub = parser.add_subparsers(dest='command', required=True)
+    rebuild_cmd = sub.add_parser('rebuild', help='Rebuild FTS indexes from the source tables')
+    rebuild_cmd.add_argument('index', nargs='?', choices=['media', 'chat_messages'])
+    search_cmd = sub.add_parser('search', help='Run a ranked media search')
+    search_cmd.add_argument('query')
+    search_cmd.add_argument('--limit', type=int, default=10)
+    args = parser.parse_args()
+
+    conn = database.connect()
+    try:
+        if not fts_ready(conn):
+            print("✗ FTS tables missing - start the app once or run migrations first")
+            sys.exit(1)
+
+        if args.command == 'rebuild':
+            for index in rebuild(conn, args.index):
+                count = conn.execute(f"SELECT COUNT(*) FROM {FTS_TABLES[index][0]}").fetchone()[0]
+                print(f"✓ Rebuilt {index} ({count} rows)")
+        elif args.command == 'search':
+            for row in search_media(conn, args.query, args.limit):
+                print(f"{row['id']:<6} {row['rank']:>8.3f}  {(row['title'] or row['filename'])[:70]}")
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+# llm_cache.py - Persistent LLM response cache shared by every worker
+"""
+Categorizing a memory, understanding and answering a question and
+writing a biography each cost a DeepSeek or Claude call, and the same
+prompts come back again and again (a question asked twice, a biography
+regenerated over unchanged memories). Responses are stored in the
+llm_cache table under a SHA-256 of provider, model, messages and
+sampling parameters, so an identical prompt from any gunicorn worker is
+answered from SQLite in milliseconds without spending a token.
+
+Keys are content-addressed: a prompt that embeds memory text changes
+its key as soon as the memories do, so no invalidation is needed.
+Entries expire after LLM_CACHE_TTL seconds, and the maintenance task
+prune_llm_cache drops expired entries and the least recently used ones
+beyond LLM_CACHE_MAX_ENTRIES. Set LLM_CACHE=0 to call the API every time.
+
+A hit is a plain read: used_at is refreshed at most once per
+TOUCH_SECONDS, so hits don't take the write lock that request writes
+in every worker wait on. Eviction order is therefore accurate to the
+hour, which is plenty for a 30-day cache.
+
+The cache never breaks a call: if it cannot be read or written, the
+provider is called as usual.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+
+import database
+
+ENABLED = os.getenv('LLM_CACHE', '1') != '0'
+TTL_SECONDS = int(os.getenv('LLM_CACHE_TTL', str(30 * 24 * 3600)))
+MAX_ENTRIES = int(os.getenv('LLM_CACHE_MAX_ENTRIES', '5000'))
+TOUCH_SECONDS = 3600
+
+_GET_SQL = "SELECT response, used_at FROM llm_cache WHERE key = ? AND expires_at > ?"
+_PRUNE_EXPIRED_SQL = "DELETE FROM llm_cache WHERE expires_at <= ?"
+
+_stats_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0, 'errors': 0}
+
+
+def cache_key(provider, model, messages, **params):
+    """SHA-256 of everything that decides the response."""
+    payload = json.dumps(
+        {'provider': provider, 'model': model, 'messages': messages, 'params': params},
+        sort_keys=True, ensure_ascii=False, separators=(',', ':')
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def get(conn, key):
+    """Cached response for key, or None when missing or expired."""
+    now = time.time()
+    row = conn.execute(_GET_SQL, (key, now)).fetchone()
+    if row is None:
+        return None
+    if now - row[1] >= TOUCH_SECONDS:
+        conn.execute("UPDATE llm_cache SET used_at = ? WHERE key = ?", (now, key))
+        conn.commit()
+    return json.loads(row[0])
+
+
+def put(conn, key, provider, model, response, ttl=None):
+    now = time.time()
+    conn.execute(
+        '''INSERT OR REPLACE INTO llm_cache (key, provider, model, response, created_at, used_at, expires_at)
+           VALUES (?, ?, ?, ?, ?, ?, ?)''',
+        (key, provider, model, json.dumps(response, ensure_ascii=False), now, now,
+         now + (TTL_SECONDS if ttl is None else ttl))
+    )
+    conn.commit()
+
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def cached_call(provider, model, messages, call, ttl=None, **params):
+    """The response to a prompt, from the cache or from call().
+
+    call() makes the API request and returns the JSON-serializable value
+    to keep, usually the parsed message content. If it raises, nothing is
+    cached and the error reaches the caller. `params` are the sampling
+    parameters sent with the request (temperature, max_tokens, ...).
+    """
+    if not ENABLED:
+        return call()
+    key = cache_key(provider, model, messages, **params)
+    try:
+        # A pooled connection of its own, so the caller's open transaction
+        # is never committed by the cache
+        with database.pooled_connection() as conn:
+            response = get(conn, key)
+    except Exception as e:
+        print(f"LLM cache read error: {e}")
+        _count('errors')
+        response = None
+    if response is not None:
+        _count('hits')
+        return response
+
+    _count('misses')
+    response = call()
+    try:
+        with database.pooled_connection() as conn:
+            put(conn, key, provider, model, response, ttl)
+    except Exception as e:
+        print(f"LLM cache write error: {e}")
+        _count('errors')
+    return response
+
+
+def prune(conn, max_entries=None):
+    """Drop expired entries, then the least recently used beyond max_entries. Returns rows deleted."""
+    max_entries = MAX_ENTRIES if max_entries is None else max_entries
+    deleted = conn.execute(_PRUNE_EXPIRED_SQL, (time.time(),)).rowcount
+    deleted += conn.execute(
+        '''DELETE FROM llm_cache WHERE key IN (
+               SELECT key FROM llm_cache ORDER BY used_at DESC LIMIT -1 OFFSET ?)''',
+        (max_entries,)
+    ).rowcount
+    conn.commit()
+    return deleted
+
+
+def stats(conn=None):
+    """Hits and misses in this process, plus the size of the shared table."""
+    with _stats_lock:
+        result = dict(_stats, enabled=ENABLED)
+    if conn is not None:
+        entries, size = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(LENGTH(response)), 0) FROM llm_cache"
+        ).fetchone()
+        result.update(entries=entries, bytes=size)
+    return result
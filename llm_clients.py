@@ -0,0 +1,249 @@
+# llm_clients.py - Shared DeepSeek and Anthropic clients with timeouts, retries and a circuit breaker
+"""
+Every LLM call in the app goes through this registry instead of building
+its own OpenAI(...) or Anthropic(...) client. Each process keeps one
+client per provider on a pooled keep-alive httpx connection, so only the
+first call pays for the TLS handshake.
+
+Calls are made with call(provider, route, request) or create():
+
+  - Each route has a time budget in TIMEOUTS. The budget covers every
+    attempt, so a chat reply never takes more than TIMEOUTS['chat']
+    seconds, retries included.
+  - Connection errors, timeouts, 429s and 5xx responses are retried up
+    to MAX_RETRIES times, with full-jitter exponential backoff. The SDKs'
+    own retries are turned off so the budget holds.
+  - After BREAKER_THRESHOLD calls in a row fail that way, the provider's
+    circuit opens. For BREAKER_RESET_SECONDS every call then fails at
+    once with CircuitOpenError, and callers take their non-AI fallback
+    instead of each waiting out a timeout. One trial call then decides
+    whether the circuit closes again.
+
+Client errors such as a bad request or a wrong key are raised straight
+away and never trip the breaker.
+"""
+
+import os
+import random
+import threading
+import time
+
+import httpx
+
+PROVIDERS = {
+    'deepseek': {'key_env': 'DEEPSEEK_API_KEY', 'base_url': 'https://api.deepseek.com'},
+    'anthropic': {'key_env': 'ANTHROPIC_API_KEY', 'base_url': None},
+}
+
+# Seconds each route may spend on one call, retries included
+TIMEOUTS = {
+    'categorize': 15.0,
+    'understand': 10.0,
+    'answer': 30.0,
+    'chat': 45.0,
+    'biography': 180.0,
+}
+DEFAULT_TIMEOUT = 30.0
+CONNECT_TIMEOUT = 5.0
+
+MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', '2'))
+BACKOFF_SECONDS = 0.5
+BACKOFF_MAX_SECONDS = 8.0
+BREAKER_THRESHOLD = int(os.getenv('LLM_BREAKER_THRESHOLD', '5'))
+BREAKER_RESET_SECONDS = float(os.getenv('LLM_BREAKER_RESET_SECONDS', '30'))
+MAX_CONNECTIONS = int(os.getenv('LLM_MAX_CONNECTIONS', '20'))
+KEEPALIVE_SECONDS = 60.0
+
+_RETRY_STATUS = {408, 409, 429}
+
+
+class CircuitOpenError(RuntimeError):
+    """The provider failed repeatedly and is not being called for now.
+
+    retry_after is the number of seconds until the breaker lets a trial call through.
+    """
+
+    def __init__(self, message, retry_after=0.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker: closed -> open -> half-open -> closed. Thread-safe."""
+
+    def __init__(self, threshold=None, reset_seconds=None):
+        self.threshold = threshold or BREAKER_THRESHOLD
+        self.reset_seconds = BREAKER_RESET_SECONDS if reset_seconds is None else reset_seconds
+        self._lock = threading.Lock()
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial = False
+
+    def allow(self):
+        """Whether a call may go out now. In half-open state only one trial call does."""
+        with self._lock:
+            if self.state == 'closed':
+                return True
+            if self.state == 'open':
+                if time.monotonic() - self.opened_at < self.reset_seconds:
+                    return False
+                self.state = 'half-open'
+                self._trial = False
+            if self._trial:
+                return False
+            self._trial = True
+            return True
+
+    def success(self):
+        with self._lock:
+            self.state = 'closed'
+            self.failures = 0
+            self._trial = False
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial = False
+            if self.state == 'half-open' or self.failures >= self.threshold:
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+
+    def retry_after(self):
+        """Seconds until an open circuit lets a trial call through, 0 when it would now."""
+        with self._lock:
+            if self.state != 'open':
+                return 0.0
+            return max(0.0, self.reset_seconds - (time.monotonic() - self.opened_at))
+
+    def stats(self):
+        with self._lock:
+            return {'state': self.state, 'consecutive_failures': self.failures}
+
+
+def retryable(error):
+    """Whether an error is worth retrying: the network or the provider, not the request."""
+    if isinstance(error, (httpx.TransportError, TimeoutError, ConnectionError)):
+        return True
+    status = getattr(error, 'status_code', None)
+    if status is not None:
+        return status in _RETRY_STATUS or status >= 500
+    # SDK connection and timeout errors carry no status code
+    return type(error).__name__ in ('APIConnectionError', 'APITimeoutError')
+
+
+class ClientRegistry:
+    """One SDK client per provider per process, plus its breaker and counters."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._clients = {}
+        self._pid = None
+        self.breakers = {name: CircuitBreaker() for name in PROVIDERS}
+        self._stats = {name: {'calls': 0, 'retries': 0, 'failures': 0, 'rejected': 0} for name in PROVIDERS}
+
+    def available(self, provider):
+        return bool(os.getenv(PROVIDERS[provider]['key_env']))
+
+    def get_client(self, provider):
+        """The shared client for a provider, or None without an API key."""
+        if not self.available(provider):
+            return None
+        with self._lock:
+            if self._pid != os.getpid():
+                # Pooled sockets must not be shared with a forked parent
+                self._clients = {}
+                self._pid = os.getpid()
+            client = self._clients.get(provider)
+            if client is None:
+                client = self._clients[provider] = _build_client(provider)
+            return client
+
+    def call(self, provider, route, request):
+        """Run request(timeout) against a provider with the route's budget, retries and breaker.
+
+        `request` makes one SDK call, passing `timeout` through, and
+        returns its response.
+        """
+        breaker = self.breakers[provider]
+        stats = self._stats[provider]
+        if not breaker.allow():
+            stats['rejected'] += 1
+            retry_after = breaker.retry_after()
+            raise CircuitOpenError(
+                f"{provider} is unavailable after repeated failures; retrying in {retry_after:.0f}s",
+                retry_after=retry_after)
+        deadline = time.monotonic() + TIMEOUTS.get(route, DEFAULT_TIMEOUT)
+        attempt = 0
+        while True:
+            remaining = deadline - time.monotonic()
+            stats['calls'] += 1
+            try:
+                response = request(httpx.Timeout(remaining, connect=min(CONNECT_TIMEOUT, remaining)))
+            except Exception as e:
+                if not retryable(e):
+                    breaker.success()  # the provider answered
+                    raise
+                stats['failures'] += 1
+                pause = random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_SECONDS * 2 ** attempt))
+                if attempt >= MAX_RETRIES or time.monotonic() + pause >= deadline:
+                    breaker.failure()
+                    raise
+                attempt += 1
+                stats['retries'] += 1
+                print(f"⚠️  {provider} {route} call failed ({e}); retry {attempt} in {pause:.1f}s")
+                time.sleep(pause)
+                continue
+            breaker.success()
+            return response
+
+    def create(self, provider, route, **kwargs):
+        """client.chat.completions.create (DeepSeek) or client.messages.create (Anthropic) through call()."""
+        client = self.get_client(provider)
+        if client is None:
+            raise ValueError(f"{PROVIDERS[provider]['key_env']} not configured")
+        method = client.messages.create if provider == 'anthropic' else client.chat.completions.create
+        return self.call(provider, route, lambda timeout: method(timeout=timeout, **kwargs))
+
+    def stats(self):
+        return {name: dict(self._stats[name], **self.breakers[name].stats(),
+                           connected=name in self._clients and self._pid == os.getpid())
+                for name in PROVIDERS}
+
+
+def _build_client(provider):
+    config = PROVIDERS[provider]
+    limits = httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_CONNECTIONS,
+                          keepalive_expiry=KEEPALIVE_SECONDS)
+    timeout = httpx.Timeout(DEFAULT_TIMEOUT, connect=CONNECT_TIMEOUT)
+    api_key = os.getenv(config['key_env'])
+    if provider == 'anthropic':
+        from anthropic import Anthropic, DefaultHttpxClient
+        return Anthropic(api_key=api_key, max_retries=0, timeout=timeout,
+                         http_client=DefaultHttpxClient(limits=limits, timeout=timeout))
+    from openai import DefaultHttpxClient, OpenAI
+    return OpenAI(api_key=api_key, base_url=config['base_url'], max_retries=0, timeout=timeout,
+                  http_client=DefaultHttpxClient(limits=limits, timeout=timeout))
+
+
+registry = ClientRegistry()
+
+
+def get_client(provider):
+    return registry.get_client(provider)
+
+
+def available(provider):
+    return registry.available(provider)
+
+
+def call(provider, route, request):
+    return registry.call(provider, route, request)
+
+
+def create(provider, route, **kwargs):
+    return registry.create(provider, route, **kwargs)
+
+
+def stats():
+    return registry.stats()
@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+"""
+Scheduled SQLite maintenance: planner statistics, incremental vacuum and
+WAL checkpoints.
+
+Each task has its own interval. Runs are claimed and recorded in the
+maintenance_log table, so gunicorn workers each running the scheduler
+never repeat a task, and every run records how long it took and how many
+bytes it gave back.
+
+Space is reclaimed with auto_vacuum=INCREMENTAL, a bounded number of pages
+at a time, so no single step holds the write lock for long. Databases
+created before that setting need one full VACUUM to switch over
+(`enable-incremental` below).
+
+Usage:
+    python maintenance.py run                    # run every task now
+    python maintenance.py run analyze checkpoint # run some tasks now
+    python maintenance.py due                    # run only tasks that are due
+    python maintenance.py status
+    python maintenance.py enable-incremental
+"""
+
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+import database
+import llm_cache
+import memory_entities
+import memory_tokens
+import name_index
+import search_index
+
+# Seconds between scheduled runs of each task, in the order they run.
+# incremental_vacuum precedes checkpoint because in WAL mode the file is
+# only truncated when the freed pages are checkpointed.
+SCHEDULE = {
+    'prune_change_log': 24 * 3600,
+    'refresh_memory_tokens': 3600,
+    'backfill_memory_entities': 3600,
+    'prune_llm_cache': 3600,
+    'analyze': 24 * 3600,
+    'optimize': 3600,
+    'incremental_vacuum': 6 * 3600,
+    'checkpoint': 15 * 60,
+}
+
+SCHEDULER_ENABLED = os.getenv('DB_MAINTENANCE', '1') != '0'
+POLL_SECONDS = float(os.getenv('DB_MAINTENANCE_POLL_SECONDS', '60'))
+
+# Pages freed per incremental_vacuum step; the write lock is released
+# between steps so requests can interleave.
+VACUUM_STEP_PAGES = 1000
+
+
+def _prune_change_log(conn):
+    deleted = search_index.prune_changes(conn) + name_index.prune_changes(conn)
+    return f'deleted {deleted} rows'
+
+
+def _refresh_memory_tokens(conn):
+    return f'tokenized {memory_tokens.refresh(conn)} memories'
+
+
+def _backfill_memory_entities(conn):
+    return f'extracted people and tags for {memory_entities.backfill(conn)} memories'
+
+
+def _prune_llm_cache(conn):
+    return f'deleted {llm_cache.prune(conn)} cached responses'
+
+
+def _analyze(conn):
+    conn.execute("ANALYZE")
+    return 'statistics refreshed'
+
+
+def _optimize(conn):
+    rows = conn.execute("PRAGMA optimize").fetchall()
+    return 'ok' if not rows else '; '.join(str(tuple(r)) for r in rows)
+
+
+def _incremental_vacuum(conn):
+    if pragma(conn, 'auto_vacuum') != 2:
+        return (f"skipped: auto_vacuum is not INCREMENTAL "
+                f"({pragma(conn, 'freelist_count')} free pages, run enable-incremental)")
+    freed = 0
+    while True:
+        free = pragma(conn, 'freelist_count')
+        if not free:
+            break
+        step = min(free, VACUUM_STEP_PAGES)
+        # execute() steps this pragma once, which frees a single page;
+        # executescript() runs it to completion
+        conn.executescript(f"PRAGMA incremental_vacuum({step})")
+        left = pragma(conn, 'freelist_count')
+        if left >= free:
+            break  # nothing freed this step; leave the rest for the next run
+        freed += free - left
+    return f'freed {freed} pages'
+
+
+def _checkpoint(conn):
+    busy, wal_pages, checkpointed = database.checkpoint(conn, 'TRUNCATE')
+    return f'busy={busy} wal_pages={wal_pages} checkpointed={checkpointed}'
+
+
+def _vacuum(conn):
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    conn.execute("VACUUM")
+    database.checkpoint(conn, 'TRUNCATE')  # in WAL mode the rewrite lands in the -wal first
+    return f"full vacuum, auto_vacuum={pragma(conn, 'auto_vacuum')}"
+
+
+TASKS = {
+    'prune_change_log': _prune_change_log,
+    'refresh_memory_tokens': _refresh_memory_tokens,
+    'backfill_memory_entities': _backfill_memory_entities,
+    'prune_llm_cache': _prune_llm_cache,
+    'analyze': _analyze,
+    'optimize': _optimize,
+    'incremental_vacuum': _incremental_vacuum,
+    'checkpoint': _checkpoint,
+    'vacuum': _vacuum,  # manual only
+}
+
+
+def pragma(conn, name):
+    return conn.execute(f"PRAGMA {name}").fetchone()[0]
+
+
+def file_bytes(db_path=None):
+    """Bytes used on disk by the database file plus its WAL."""
+    db_path = db_path or database.DB_PATH
+    return os.path.getsize(db_path) + database.wal_size(db_path)
+
+
+def _now():
+    return datetime.now(timezone.utc)
+
+
+def _claim(conn, task, force):
+    """Record a run as started unless the task ran within its interval.
+
+    BEGIN IMMEDIATE serialises the check-and-insert across processes.
+    Returns the log row id, or None if the task is not due.
+    """
+    now = _now()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        if not force and task in SCHEDULE:
+            cutoff = (now - timedelta(seconds=SCHEDULE[task])).isoformat()
+            recent = conn.execute(
+                "SELECT 1 FROM maintenance_log WHERE task = ? AND started_at > ? LIMIT 1",
+                (task, cutoff)
+            ).fetchone()
+            if recent:
+                conn.rollback()
+                return None
+        cursor = conn.execute(
+            "INSERT INTO maintenance_log (task, started_at) VALUES (?, ?)",
+            (task, now.isoformat())
+        )
+        conn.commit()
+        return cursor.lastrowid
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def run_task(conn, task, db_path=None, force=False):
+    """Run one task if it is due (or forced) and log the outcome."""
+    if task not in TASKS:
+        raise ValueError(f"Unknown maintenance task '{task}'. Choose from: {', '.join(TASKS)}")
+    log_id = _claim(conn, task, force)
+    if log_id is None:
+        return None
+
+    before = file_bytes(db_path)
+    start = time.perf_counter()
+    try:
+        detail = TASKS[task](conn)
+        status = 'ok'
+    except Exception as e:
+        detail = str(e)
+        status = 'error'
+    duration_ms = round((time.perf_counter() - start) * 1000, 1)
+    after = file_bytes(db_path)
+
+    conn.execute(
+        '''UPDATE maintenance_log
+           SET status = ?, duration_ms = ?, bytes_before = ?, bytes_after = ?,
+               bytes_reclaimed = ?, detail = ?
+           WHERE id = ?''',
+        (status, duration_ms, before, after, before - after, detail, log_id)
+    )
+    conn.commit()
+    return {
+        'task': task,
+        'status': status,
+        'duration_ms': duration_ms,
+        'bytes_before': before,
+        'bytes_after': after,
+        'bytes_reclaimed': before - after,
+        'detail': detail,
+    }
+
+
+def run_maintenance(tasks=None, force=False, db_path=None):
+    """Run the given tasks (default: all scheduled ones) and return their results."""
+    db_path = db_path or database.DB_PATH
+    conn = database.connect(db_path)
+    try:
+        results = []
+        for task in tasks or SCHEDULE:
+            result = run_task(conn, task, db_path, force)
+            if result:
+                results.append(result)
+        return results
+    finally:
+        conn.close()
+
+
+def recent_runs(conn, limit=50):
+    cursor = conn.execute(
+        '''SELECT task, started_at, status, duration_ms, bytes_before, bytes_after,
+                  bytes_reclaimed, detail
+           FROM maintenance_log
+           ORDER BY id DESC
+           LIMIT ?''',
+        (limit,)
+    )
+    columns = [c[0] for c in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+def status(conn, db_path=None):
+    """Space usage and vacuum mode of the database."""
+    page_size = pragma(conn, 'page_size')
+    return {
+        'file_bytes': file_bytes(db_path),
+        'wal_bytes': database.wal_size(db_path),
+        'page_size': page_size,
+        'page_count': pragma(conn, 'page_count'),
+        'freelist_pages': pragma(conn, 'freelist_count'),
+        'reclaimable_bytes': pragma(conn, 'freelist_count') * page_size,
+        'auto_vacuum': {0: 'NONE', 1: 'FULL', 2: 'INCREMENTAL'}[pragma(conn, 'auto_vacuum')],
+        'schedule_seconds': SCHEDULE,
+        'scheduler_running': _scheduler is not None and _scheduler.is_alive(),
+    }
+
+
+# ============================================
+# SCHEDULER
+# ============================================
+
+_scheduler = None
+_scheduler_pid = None
+_scheduler_lock = threading.Lock()
+
+
+def _scheduler_loop():
+    while True:
+        time.sleep(POLL_SECONDS)
+        try:
+            for result in run_maintenance():
+                print(f"✓ Maintenance {result['task']}: {result['status']} in "
+                      f"{result['duration_ms']}ms, reclaimed {result['bytes_reclaimed']} bytes")
+        except Exception as e:
+            print(f"Maintenance error: {e}")
+
+
+def start_scheduler():
+    """Start the background maintenance thread once per process."""
+    global _scheduler, _scheduler_pid
+    if not SCHEDULER_ENABLED:
+        return None
+    with _scheduler_lock:
+        if _scheduler is None or _scheduler_pid != os.getpid() or not _scheduler.is_alive():
+            _scheduler = threading.Thread(target=_scheduler_loop, name='db-maintenance', daemon=True)
+            _scheduler_pid = os.getpid()
+            _scheduler.start()
+    return _scheduler
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Run SQLite maintenance tasks')
+    sub = parser.add_subparsers(dest='command', required=True)
+    run_cmd = sub.add_parser('run', help='Run tasks now, ignoring the schedule')
+    run_cmd.add_argument('tasks', nargs='*', help=', '.join(SCHEDULE))
+    sub.add_parser('due', help='Run only the tasks that are due')
+    sub.add_parser('status', help='Show space usage and recent runs')
+    sub.add_parser('enable-incremental', help='Switch to auto_vacuum=INCREMENTAL (full VACUUM)')
+    args = parser.parse_args()
+
+    if args.command in ('run', 'due', 'enable-incremental'):
+        try:
+            if args.command == 'enable-incremental':
+                results = run_maintenance(['vacuum'], force=True)
+            else:
+                results = run_maintenance(getattr(args, 'tasks', None), force=args.command == 'run')
+        except ValueError as e:
+            print(f"✗ {e}")
+            sys.exit(2)
+        for r in results:
+            mark = '✓' if r['status'] == 'ok' else '✗'
+            print(f"{mark} {r['task']:<20} {r['duration_ms']:>9.1f}ms  "
+                  f"reclaimed {r['bytes_reclaimed']:>10} bytes  {r['detail']}")
+        if not results:
+            print("Nothing due")
+        sys.exit(0 if all(r['status'] == 'ok' for r in results) else 1)
+
+    conn = database.connect()
+    try:
+        for key, value in status(conn).items():
+            print(f"{key:<20} {value}")
+        print()
+        for run in recent_runs(conn, 20):
+            print(f"{run['started_at'][:19]}  {run['task']:<20} {run['status']:<8} "
+                  f"{run['duration_ms'] or 0:>9.1f}ms  {run['bytes_reclaimed'] or 0:>10} bytes")
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
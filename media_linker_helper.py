@@ -2,11 +2,22 @@
 """
 Helper script for media linking operations
 Use for testing, bulk operations, or data migration
+
+Usage:
+    python media_linker_helper.py [db_path]                       # interactive menu
+    python media_linker_helper.py db_path bulk-link links.json    # '-' reads stdin
+    python media_linker_helper.py db_path auto-link [tolerance]
+
+links.json holds {"memory_id": [media_id, ...], ...} or a list of
+{"memory_id": ..., "media_ids": [...]} objects.
 """
 
+import json
 import sqlite3
 import sys
 
+from media_links import bulk_link
+
 def connect_db(db_path='circle.db'):
     """Connect to the database."""
     return sqlite3.connect(db_path)
@@ -50,22 +61,27 @@ def list_media(conn):
 def link_media_to_memory(conn, memory_id, media_ids):
     """Link media items to a memory."""
     try:
-        # Clear existing links
-        conn.execute('DELETE FROM memory_media WHERE memory_id = ?', (memory_id,))
-        
-        # Add new links
-        for order, media_id in enumerate(media_ids):
-            conn.execute(
-                'INSERT INTO memory_media (memory_id, media_id, display_order) VALUES (?, ?, ?)',
-                (memory_id, media_id, order)
-            )
-        
-        conn.commit()
-        print(f"✓ Linked {len(media_ids)} media items to memory {memory_id}")
+        result = bulk_link(conn, [(memory_id, media_ids)])
+        print(f"✓ Linked {result['links']} media items to memory {memory_id}")
+        return True
+    
+    except Exception as e:
+        print(f"✗ Error linking media: {e}")
+        return False
+
+def bulk_link_from_file(conn, path):
+    """Apply many memory/media links from a JSON file in one transaction."""
+    try:
+        if path == '-':
+            links = json.load(sys.stdin)
+        else:
+            with open(path) as f:
+                links = json.load(f)
+        result = bulk_link(conn, links)
+        print(f"✓ Linked {result['links']} media items across {result['memories']} memories")
         return True
     
     except Exception as e:
-        conn.rollback()
         print(f"✗ Error linking media: {e}")
         return False
 
@@ -104,6 +120,7 @@ def auto_link_by_year(conn, year_tolerance=2):
     ''')
     
     memories = cursor.fetchall()
+    links = []
     
     for memory_id, text, memory_year in memories:
         # Find media within year range
@@ -124,7 +141,14 @@ def auto_link_by_year(conn, year_tolerance=2):
             print(f"\nMemory {memory_id} ({memory_year}): {text[:50]}...")
             print(f"  → Linking {len(media_ids)} photos: {', '.join(str(m[0]) for m in media_matches)}")
             
-            link_media_to_memory(conn, memory_id, media_ids)
+            links.append((memory_id, media_ids))
+    
+    # One transaction for the whole archive instead of a commit per memory
+    try:
+        result = bulk_link(conn, links)
+        print(f"\n✓ Linked {result['links']} media items across {result['memories']} memories")
+    except Exception as e:
+        print(f"\n✗ Error linking media: {e}")
 
 def unlink_all(conn):
     """Remove all media links."""
@@ -181,6 +205,20 @@ def main():
     try:
         conn = connect_db(db_path)
         
+        # Non-interactive commands for scripted bulk operations
+        if len(sys.argv) > 2:
+            command = sys.argv[2]
+            if command == 'bulk-link' and len(sys.argv) > 3:
+                ok = bulk_link_from_file(conn, sys.argv[3])
+            elif command == 'auto-link':
+                auto_link_by_year(conn, int(sys.argv[3]) if len(sys.argv) > 3 else 2)
+                ok = True
+            else:
+                print(__doc__)
+                ok = False
+            conn.close()
+            sys.exit(0 if ok else 1)
+        
         while True:
             print("\n" + "=" * 50)
             print("MEDIA LINKING HELPER")
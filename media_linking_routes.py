@@ -5,6 +5,8 @@ Add these routes to your Flask app.py
 
 from flask import Blueprint, request, jsonify
 from database import get_db
+from data_access import AVAILABLE_MEDIA, MEMORY_MEDIA
+from media_links import MAX_ORDER_SQL
 
 # Create a blueprint (or add directly to your main app)
 media_linking_bp = Blueprint('media_linking', __name__)
@@ -13,30 +15,7 @@ media_linking_bp = Blueprint('media_linking', __name__)
 def get_memory_media(memory_id):
     """Get all media linked to a specific memory."""
     try:
-        db = get_db()
-        cursor = db.execute('''
-            SELECT m.id, m.filename, m.original_filename, m.file_type, 
-                   m.title, m.description, m.media_date, m.year, 
-                   mm.display_order
-            FROM media m
-            JOIN memory_media mm ON m.id = mm.media_id
-            WHERE mm.memory_id = ?
-            ORDER BY mm.display_order
-        ''', (memory_id,))
-        
-        media = []
-        for row in cursor.fetchall():
-            media.append({
-                'id': row[0],
-                'filename': row[1],
-                'original_filename': row[2],
-                'file_type': row[3],
-                'title': row[4],
-                'description': row[5],
-                'media_date': row[6],
-                'year': row[7],
-                'display_order': row[8]
-            })
+        media = list(MEMORY_MEDIA.dicts(get_db(), (memory_id,)))
         
         return jsonify({'success': True, 'media': media})
     
@@ -82,10 +61,7 @@ def add_single_media_to_memory(memory_id, media_id):
         db = get_db()
         
         # Get current max display_order
-        cursor = db.execute(
-            'SELECT COALESCE(MAX(display_order), -1) FROM memory_media WHERE memory_id = ?',
-            (memory_id,)
-        )
+        cursor = db.execute(MAX_ORDER_SQL, (memory_id,))
         max_order = cursor.fetchone()[0]
         
         # Insert new link
@@ -127,29 +103,7 @@ def remove_media_from_memory(memory_id, media_id):
 def get_available_media():
     """Get all available media for linking."""
     try:
-        db = get_db()
-        cursor = db.execute('''
-            SELECT id, filename, original_filename, file_type, 
-                   title, description, media_date, year, created_at
-            FROM media
-            ORDER BY 
-                CASE WHEN year IS NOT NULL THEN year ELSE 9999 END DESC,
-                created_at DESC
-        ''')
-        
-        media = []
-        for row in cursor.fetchall():
-            media.append({
-                'id': row[0],
-                'filename': row[1],
-                'original_filename': row[2],
-                'file_type': row[3],
-                'title': row[4],
-                'description': row[5],
-                'media_date': row[6],
-                'year': row[7],
-                'created_at': row[8]
-            })
+        media = list(AVAILABLE_MEDIA.dicts(get_db()))
         
         return jsonify({'success': True, 'media': media})
     
@@ -0,0 +1,102 @@
+# media_links.py - Bulk memory/media link writes
+"""
+Every path that links photos to memories goes through bulk_link(), which
+writes any number of (memory_id, media_ids) pairs with executemany()
+inside one IMMEDIATE transaction. Relinking a whole archive is a single
+commit, and a failure part-way through leaves the old links untouched.
+Called inside a transaction the caller already opened, it works in a
+savepoint instead and leaves committing to the caller.
+"""
+
+import json
+
+# A memory's last display order, -1 with no links; a new link goes after it
+MAX_ORDER_SQL = 'SELECT COALESCE(MAX(display_order), -1) FROM memory_media WHERE memory_id = ?'
+
+
+def normalize_links(links):
+    """Turn API/CLI input into [(memory_id, [media_id, ...]), ...].
+
+    Accepts a {memory_id: media_ids} mapping (JSON object keys may be
+    strings), a list of {"memory_id": ..., "media_ids": [...]} objects, or
+    a list of (memory_id, media_ids) pairs. Repeated memory ids are merged
+    and duplicate media ids dropped, keeping first-seen order.
+    """
+    if isinstance(links, dict):
+        items = links.items()
+    else:
+        items = []
+        for entry in links:
+            if isinstance(entry, dict):
+                items.append((entry.get('memory_id'), entry.get('media_ids', [])))
+            else:
+                memory_id, media_ids = entry
+                items.append((memory_id, media_ids))
+
+    merged = {}
+    for memory_id, media_ids in items:
+        try:
+            memory_id = int(memory_id)
+            media_ids = [int(media_id) for media_id in media_ids]
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid link entry for memory {memory_id!r}")
+        ordered = merged.setdefault(memory_id, {})
+        for media_id in media_ids:
+            ordered.setdefault(media_id, None)
+    return [(memory_id, list(ordered)) for memory_id, ordered in merged.items()]
+
+
+def bulk_link(conn, links, replace=True):
+    """Link media to many memories in one transaction.
+
+    replace=True makes each memory's links exactly the given list, in that
+    display order (what the photo picker and auto-linker want).
+    replace=False appends after each memory's existing links and skips
+    media that are already linked.
+
+    Returns {'memories': n, 'links': rows inserted}. Rolls back its own
+    writes and re-raises on any error; a transaction the caller had open
+    stays open, with the caller's earlier writes intact.
+    """
+    pairs = normalize_links(links)
+    if not pairs:
+        return {'memories': 0, 'links': 0}
+
+    nested = conn.in_transaction
+    conn.execute('SAVEPOINT bulk_link' if nested else 'BEGIN IMMEDIATE')
+    try:
+        before = conn.total_changes
+        if replace:
+            conn.executemany('DELETE FROM memory_media WHERE memory_id = ?',
+                             [(memory_id,) for memory_id, _ in pairs])
+            start = {}
+        else:
+            cursor = conn.execute('''
+                SELECT memory_id, MAX(display_order) + 1
+                FROM memory_media
+                WHERE memory_id IN (SELECT value FROM json_each(?))
+                GROUP BY memory_id
+            ''', (json.dumps([memory_id for memory_id, _ in pairs]),))
+            start = dict(cursor.fetchall())
+        deleted = conn.total_changes - before
+
+        conn.executemany(
+            'INSERT OR IGNORE INTO memory_media (memory_id, media_id, display_order) VALUES (?, ?, ?)',
+            ((memory_id, media_id, start.get(memory_id, 0) + order)
+             for memory_id, media_ids in pairs
+             for order, media_id in enumerate(media_ids))
+        )
+        inserted = conn.total_changes - before - deleted
+    except Exception:
+        if nested:
+            conn.execute('ROLLBACK TO bulk_link')
+            conn.execute('RELEASE bulk_link')
+        else:
+            conn.rollback()
+        raise
+    if nested:
+        conn.execute('RELEASE bulk_link')
+    else:
+        conn.commit()
+
+    return {'memories': len(pairs), 'links': inserted}
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+People and tags of each memory, kept in memory_people and memory_tags.
+
+The routes that save or edit a memory call store() in the same
+transaction, right after memory_tokens.store(): the names found in the
+text plus the free-text people field go to memory_people, the top
+keywords plus the places field to memory_tags. Person and tag queries
+are then lookups on the (name, memory_id) and (tag, memory_id) indexes
+instead of scans over memory text.
+
+Extracted rows are marked source = 'text' and replaced on every edit;
+rows tagged by hand (source NULL) are never touched, and a name tagged
+by hand is not added again.
+
+Memories saved before extraction ran at write time are filled by
+backfill(), in batches that each commit with a checkpoint, so an
+interrupted run picks up where it stopped:
+
+    python memory_entities.py backfill
+    python memory_entities.py backfill --batch 2000 --restart
+    python memory_entities.py status
+"""
+
+import argparse
+
+import memory_tokens
+from name_index import split_people
+from tokenizer import words
+
+EXTRACTED = 'text'
+MAX_TAGS = 8
+BACKFILL_TASK = 'memory_entities'
+
+_TABLES = {
+    'people': ('memory_people', 'person_name'),
+    'tags': ('memory_tags', 'tag'),
+}
+
+# Formatted with a _TABLES entry: table=..., column=...
+_EXTRACTED_SQL = "SELECT {column} FROM {table} WHERE memory_id = ? AND source = ?"
+_INSERT_SQL = '''INSERT INTO {table} (memory_id, {column}, source)
+                 SELECT ?1, ?2, ?3 WHERE NOT EXISTS (
+                     SELECT 1 FROM {table} WHERE memory_id = ?1 AND {column} = ?2 COLLATE NOCASE)'''
+_BATCH_SQL = "SELECT id FROM memories WHERE id > ? ORDER BY id LIMIT ?"
+
+
+def extract(tokens, people=None, places=None):
+    """(names, tags) of one memory from its Tokens and free-text fields."""
+    found = {}
+    for name in tokens.names + split_people(people):
+        found.setdefault(name.lower(), name)
+    names = list(found.values())
+
+    # Name words make poor tags: "peter" is already a person
+    name_words = set(words(' '.join(names)))
+    tags = [word for word in tokens.keywords if word not in name_words][:MAX_TAGS]
+    for place in split_people(places):
+        if place.lower() not in tags:
+            tags.append(place.lower())
+    return names, tags
+
+
+def _replace(conn, kind, memory_id, values):
+    """Make the extracted rows of one memory exactly `values`, touching only the difference."""
+    table, column = _TABLES[kind]
+    existing = {row[0] for row in conn.execute(
+        _EXTRACTED_SQL.format(table=table, column=column), (memory_id, EXTRACTED))}
+    stale = existing.difference(values)
+    if stale:
+        conn.executemany(
+            f"DELETE FROM {table} WHERE memory_id = ? AND source = ? AND {column} = ?",
+            ((memory_id, EXTRACTED, value) for value in stale)
+        )
+    conn.executemany(
+        _INSERT_SQL.format(table=table, column=column),
+        ((memory_id, value, EXTRACTED) for value in values if value not in existing)
+    )
+
+
+def store(conn, memory_id, tokens):
+    """Extract and save one memory's people and tags. Runs in the caller's transaction."""
+    row = conn.execute("SELECT people, places FROM memories WHERE id = ?", (memory_id,)).fetchone()
+    if row is None:
+        return [], []
+    names, tags = extract(tokens, row[0], row[1])
+    _replace(conn, 'people', memory_id, names)
+    _replace(conn, 'tags', memory_id, tags)
+    return names, tags
+
+
+def progress(conn):
+    """Id of the last memory the backfill committed, 0 before the first run."""
+    row = conn.execute("SELECT last_id FROM backfill_progress WHERE task = ?", (BACKFILL_TASK,)).fetchone()
+    return row[0] if row else 0
+
+
+def backfill(conn, batch=500, restart=False):
+    """Extract people and tags for every memory past the checkpoint.
+
+    Each batch is committed together with its checkpoint, so stopping
+    at any point loses at most one batch. Memories saved later are
+    extracted by the routes, or by the next run if another tool wrote
+    them. Returns the number of memories processed.
+    """
+    if restart:
+        conn.execute("DELETE FROM backfill_progress WHERE task = ?", (BACKFILL_TASK,))
+        conn.commit()
+    last_id = progress(conn)
+    total = 0
+    while True:
+        rows = conn.execute(_BATCH_SQL, (last_id, batch)).fetchall()
+        if not rows:
+            return total
+        ids = [row[0] for row in rows]
+        for memory_id, tokens in memory_tokens.load(conn, ids).items():
+            store(conn, memory_id, tokens)
+        last_id = ids[-1]
+        conn.execute(
+            '''INSERT INTO backfill_progress (task, last_id, updated_at)
+               VALUES (?, ?, datetime('now'))
+               ON CONFLICT(task) DO UPDATE SET last_id = excluded.last_id, updated_at = excluded.updated_at''',
+            (BACKFILL_TASK, last_id)
+        )
+        conn.commit()
+        total += len(ids)
+
+
+def main():
+    import database
+
+    parser = argparse.ArgumentParser(description='Fill memory_people and memory_tags from memory text')
+    sub = parser.add_subparsers(dest='command', required=True)
+    backfill_cmd = sub.add_parser('backfill', help='Extract people and tags for memories past the checkpoint')
+    backfill_cmd.add_argument('--batch', type=int, default=500, help='Memories per committed batch')
+    backfill_cmd.add_argument('--restart', action='store_true', help='Start again from the first memory')
+    sub.add_parser('status', help='Show backfill progress')
+    args = parser.parse_args()
+
+    database.migrate_db()
+    conn = database.connect()
+    try:
+        if args.command == 'backfill':
+            done = backfill(conn, batch=args.batch, restart=args.restart)
+            print(f"✓ Extracted people and tags for {done} memories (checkpoint at id {progress(conn)})")
+        else:
+            last_id = progress(conn)
+            remaining = conn.execute("SELECT COUNT(*) FROM memories WHERE id > ?", (last_id,)).fetchone()[0]
+            counts = {kind: conn.execute(f"SELECT COUNT(*) FROM {table} WHERE source = ?", (EXTRACTED,)).fetchone()[0]
+                      for kind, (table, _) in _TABLES.items()}
+            print(f"Checkpoint: memory id {last_id}, {remaining} memories left")
+            print(f"Extracted rows: {counts['people']} people, {counts['tags']} tags")
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+# memory_tokens.py - Tokens of each memory, computed once when it is written
+"""
+The routes that save or edit a memory call store() in the same
+transaction, so search, the indexes and photo matching read terms,
+keywords and names back with load() instead of re-tokenizing the text
+on every query.
+
+Triggers delete a memory's row when its text changes or the memory is
+deleted, so a row is never stale. Memories written by other tools, or
+tokenized by an older TOKENIZER_VERSION, are tokenized on the fly by
+load() until refresh() (run by the maintenance scheduler) stores them.
+"""
+
+import json
+
+from tokenizer import TOKENIZER_VERSION, Tokens, analyze
+
+_CHUNK = 500
+
+# Stored tokens when current, otherwise the text to tokenize
+_LOAD_SQL = f'''
+    SELECT m.id,
+           CASE WHEN t.version = {TOKENIZER_VERSION} THEN NULL ELSE m.text END AS text,
+           t.terms, t.keywords, t.names
+    FROM memories m
+    LEFT JOIN memory_tokens t ON t.memory_id = m.id
+    {{where}}
+'''
+# Memories with no tokens or tokens from an older version
+_STALE_SQL = '''
+    SELECT m.id, m.text FROM memories m
+    LEFT JOIN memory_tokens t ON t.memory_id = m.id
+    WHERE t.memory_id IS NULL OR t.version != ?
+    LIMIT ?
+'''
+
+
+def _encode(tokens):
+    return (' '.join(tokens.terms), ' '.join(tokens.keywords), json.dumps(tokens.names))
+
+
+def decode(text, terms, keywords, names):
+    """Tokens from a _LOAD_SQL-shaped row: stored columns, or the text if they are stale."""
+    if text is not None or terms is None:
+        return analyze(text)
+    return Tokens(terms.split(), keywords.split(), json.loads(names))
+
+
+def store(conn, memory_id, text):
+    """Tokenize and save a memory's text. Runs in the caller's transaction."""
+    tokens = analyze(text)
+    conn.execute(
+        '''INSERT OR REPLACE INTO memory_tokens (memory_id, version, terms, keywords, names)
+           VALUES (?, ?, ?, ?, ?)''',
+        (memory_id, TOKENIZER_VERSION) + _encode(tokens)
+    )
+    return tokens
+
+
+def load(conn, memory_ids=None):
+    """{memory_id: Tokens} for the given memories, or all of them."""
+    if memory_ids is None:
+        return {row[0]: decode(*row[1:]) for row in conn.execute(_LOAD_SQL.format(where=''))}
+    memory_ids = list(memory_ids)
+    tokens = {}
+    for start in range(0, len(memory_ids), _CHUNK):
+        chunk = memory_ids[start:start + _CHUNK]
+        where = f"WHERE m.id IN ({','.join('?' * len(chunk))})"
+        for row in conn.execute(_LOAD_SQL.format(where=where), chunk):
+            tokens[row[0]] = decode(*row[1:])
+    return tokens
+
+
+def refresh(conn, batch=_CHUNK, commit=True):
+    """Store tokens for every memory missing them or tokenized by an older version.
+
+    Commits after each batch unless commit is False. Returns the number
+    of memories tokenized.
+    """
+    total = 0
+    while True:
+        rows = conn.execute(_STALE_SQL, (TOKENIZER_VERSION, batch)).fetchall()
+        if not rows:
+            return total
+        conn.executemany(
+            '''INSERT OR REPLACE INTO memory_tokens (memory_id, version, terms, keywords, names)
+               VALUES (?, ?, ?, ?, ?)''',
+            [(memory_id, TOKENIZER_VERSION) + _encode(analyze(text)) for memory_id, text in rows]
+        )
+        if commit:
+            conn.commit()
+        total += len(rows)
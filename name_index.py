@@ -0,0 +1,256 @@
+# name_index.py - Trigram index over the people named in the archive
+"""
+Names come from three places: capitalized runs in memory text ("Peter
+Elger", stored in memory_tokens when the memory is saved), tags in
+memory_people and the free-text people fields on memories and media.
+Each distinct name is broken into trigrams, pg_trgm style, so a lookup
+for a misspelling like "Peter Elgar" only scores the names sharing a
+trigram with it and ranks them by similarity.
+
+Like search_index, the index lives in each process and is kept current
+from change logs: memory_changes for memories and their tags, and
+media_changes for the media people field.
+"""
+
+import heapq
+import json
+import os
+import re
+import threading
+from collections import Counter
+from itertools import chain
+
+import tokenizer
+from tokenizer import STOPWORDS, TOKENIZER_VERSION, normalize, words
+
+MIN_SIMILARITY = 0.3
+
+_SPLIT_PEOPLE_RE = re.compile(r"\s*(?:[,;/&\n]|\band\b)\s*", re.IGNORECASE)
+
+# Names stored in memory_tokens, or the text when they are missing or stale
+_MEMORY_DOCS_SQL = f'''
+    SELECT m.id,
+           CASE WHEN t.version = {TOKENIZER_VERSION} THEN NULL ELSE m.text END AS text,
+           t.names, m.people, GROUP_CONCAT(mp.person_name, ',') AS tagged
+    FROM memories m
+    LEFT JOIN memory_tokens t ON t.memory_id = m.id
+    LEFT JOIN memory_people mp ON m.id = mp.memory_id
+    {{where}}
+    GROUP BY m.id
+'''
+_MEDIA_DOCS_SQL = "SELECT id, people FROM media WHERE people IS NOT NULL AND people != '' {where}"
+
+# Change logs an index of memories and media syncs from: kind -> (table, id column)
+CHANGE_LOGS = {
+    'memory': ('memory_changes', 'memory_id'),
+    'media': ('media_changes', 'media_id'),
+}
+# Formatted with a CHANGE_LOGS entry: table=..., column=...
+_CHANGES_SQL = "SELECT seq, {column} FROM {table} WHERE seq > ? ORDER BY seq"
+_RELOAD_CHUNK = 500
+
+
+def trigrams(name):
+    """Trigrams of each word padded with two leading and one trailing space."""
+    grams = set()
+    for word in words(name):
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def split_people(field):
+    """Names from a free-text people field such as "Jon, Mum and Dad"."""
+    return [name for name in _SPLIT_PEOPLE_RE.split(field or '') if name.strip()]
+
+
+class NameIndex:
+    """Distinct names with the memories and media they appear in. Thread-safe."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._reset()
+        self.pid = None
+        self.source = None
+
+    def _reset(self):
+        self.names = {}      # normalized name -> {'name', 'grams', 'docs': {(kind, id), ...}}
+        self.grams = {}      # trigram -> {normalized name, ...}
+        self.doc_names = {}  # (kind, id) -> normalized names, for removal
+        self.last_seq = {kind: None for kind in CHANGE_LOGS}
+
+    def __len__(self):
+        return len(self.names)
+
+    # ---------- maintenance ----------
+
+    def build(self, conn):
+        with self._lock:
+            self._reset()
+            self.pid = os.getpid()
+            self.source = conn.execute("PRAGMA database_list").fetchone()[2]
+            for kind in CHANGE_LOGS:
+                self.last_seq[kind] = log_version(conn, kind)
+            self._load(conn, 'memory', None)
+            self._load(conn, 'media', None)
+
+    def sync(self, conn):
+        """Re-index the memories and media changed since the last sync."""
+        with self._lock:
+            if (self.last_seq['memory'] is None or self.pid != os.getpid()
+                    or self.source != conn.execute("PRAGMA database_list").fetchone()[2]):
+                self.build(conn)
+                return len(self)
+
+            changed = read_changes(conn, self.last_seq)
+            if changed is None:
+                self.build(conn)
+                return len(self)
+
+            for kind, ids in changed.items():
+                for doc_id in ids:
+                    self._remove((kind, doc_id))
+                for start in range(0, len(ids), _RELOAD_CHUNK):
+                    self._load(conn, kind, ids[start:start + _RELOAD_CHUNK])
+            return sum(len(ids) for ids in changed.values())
+
+    def _load(self, conn, kind, ids):
+        if kind == 'memory':
+            where = f"WHERE m.id IN ({','.join('?' * len(ids))})" if ids else ''
+            for memory_id, text, names, people, tagged in conn.execute(_MEMORY_DOCS_SQL.format(where=where), ids or ()):
+                found = json.loads(names) if text is None else tokenizer.names(text)
+                self._add(('memory', memory_id), found + split_people(people) + split_people(tagged))
+        else:
+            where = f"AND id IN ({','.join('?' * len(ids))})" if ids else ''
+            for media_id, people in conn.execute(_MEDIA_DOCS_SQL.format(where=where), ids or ()):
+                self._add(('media', media_id), split_people(people))
+
+    def _add(self, doc, names):
+        keys = set()
+        for name in names:
+            key = normalize(name)
+            if not key or key in STOPWORDS:
+                continue
+            entry = self.names.get(key)
+            if entry is None:
+                grams = trigrams(key)
+                entry = self.names[key] = {'name': name.strip(), 'grams': len(grams), 'docs': set()}
+                for gram in grams:
+                    self.grams.setdefault(gram, set()).add(key)
+            entry['docs'].add(doc)
+            keys.add(key)
+        if keys:
+            self.doc_names[doc] = keys
+
+    def _remove(self, doc):
+        for key in self.doc_names.pop(doc, ()):
+            entry = self.names[key]
+            entry['docs'].discard(doc)
+            if entry['docs']:
+                continue
+            del self.names[key]
+            for gram in trigrams(key):
+                keys = self.grams[gram]
+                keys.discard(key)
+                if not keys:
+                    del self.grams[gram]
+
+    # ---------- queries ----------
+
+    def lookup(self, name, limit=5, min_similarity=MIN_SIMILARITY):
+        """Names similar to `name`, best first, with the memories and media they appear in."""
+        query = trigrams(name)
+        if not query:
+            return []
+        with self._lock:
+            grams = self.grams
+            shared = Counter(chain.from_iterable(grams.get(gram, ()) for gram in query))
+            query_len = len(query)
+            names = self.names
+            scored = []
+            for key, count in shared.items():
+                similarity = count / (query_len + names[key]['grams'] - count)
+                if similarity >= min_similarity:
+                    scored.append((similarity, key))
+            matches = []
+            for similarity, key in heapq.nlargest(limit, scored):
+                docs = names[key]['docs']
+                matches.append({
+                    'name': names[key]['name'],
+                    'similarity': round(similarity, 3),
+                    'memory_ids': sorted(doc_id for kind, doc_id in docs if kind == 'memory'),
+                    'media_ids': sorted(doc_id for kind, doc_id in docs if kind == 'media'),
+                })
+        return matches
+
+    def stats(self):
+        with self._lock:
+            return {
+                'names': len(self.names),
+                'trigrams': len(self.grams),
+                'documents': len(self.doc_names),
+                'last_seq': dict(self.last_seq),
+            }
+
+
+def log_version(conn, kind):
+    """Last seq written to one change log, in any process."""
+    row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = ?", (CHANGE_LOGS[kind][0],)).fetchone()
+    return row[0] if row else 0
+
+
+def read_changes(conn, last_seq):
+    """{kind: [changed ids]} logged after last_seq, advancing last_seq in place.
+
+    Returns None when the caller must rebuild instead: a log has a gap,
+    was pruned beyond last_seq or went backwards because the database
+    was restored from an older backup.
+    """
+    changed = {}
+    for kind, (table, column) in CHANGE_LOGS.items():
+        rows = conn.execute(
+            _CHANGES_SQL.format(table=table, column=column), (last_seq[kind],)
+        ).fetchall()
+        if not rows:
+            if log_version(conn, kind) != last_seq[kind]:
+                return None
+            continue
+        if rows[0][0] != last_seq[kind] + 1:
+            return None
+        changed[kind] = list(dict.fromkeys(doc_id for _, doc_id in rows))
+        last_seq[kind] = rows[-1][0]
+    return changed
+
+
+def prune_changes(conn, keep_days=7):
+    """Drop media change-log rows older than keep_days. Returns rows deleted."""
+    cursor = conn.execute(
+        "DELETE FROM media_changes WHERE changed_at < datetime('now', ?)",
+        (f'-{int(keep_days)} days',)
+    )
+    conn.commit()
+    return cursor.rowcount
+
+
+name_index = NameIndex()
+
+
+def get_index(conn):
+    """The process-wide name index, synced with the database."""
+    name_index.sync(conn)
+    return name_index
+
+
+def match_names(conn, names, limit=5):
+    """Best index matches for each name pulled out of a query, or [] on error."""
+    try:
+        index = get_index(conn)
+    except Exception as e:
+        print(f"Name index error: {e}")
+        return []
+    matches = {}
+    for name in names:
+        for match in index.lookup(name, limit=limit):
+            if match['similarity'] > matches.get(match['name'], {}).get('similarity', 0):
+                matches[match['name']] = match
+    return sorted(matches.values(), key=lambda m: -m['similarity'])[:limit]
@@ -10,7 +10,7 @@ from reportlab.platypus.flowables import Flowable
 from PIL import Image as PILImage
 import os
 from datetime import datetime
-from database import get_db
+from database import get_db, read_snapshot
 import re
 
 # Autumn color palette
@@ -19,6 +19,35 @@ AUTUMN_BROWN = colors.HexColor('#8B4513')
 AUTUMN_DARK = colors.HexColor('#654321')
 BACKGROUND_CREAM = colors.HexColor('#FFF8F0')
 
+# Queries behind the exports
+_LINKED_MEDIA_SQL = '''
+    SELECT m.id, m.filename, m.original_filename, m.file_type,
+           m.title, m.description, m.memory_date, m.year, m.created_at
+    FROM media m
+    JOIN memory_media mm ON m.id = mm.media_id
+    WHERE mm.memory_id = ?
+    ORDER BY mm.display_order
+'''
+_ALL_LINKED_MEDIA_SQL = '''
+    SELECT mm.memory_id, m.id, m.filename, m.original_filename, m.file_type,
+           m.title, m.description, m.memory_date, m.year, m.created_at
+    FROM memory_media mm
+    JOIN media m ON m.id = mm.media_id
+    ORDER BY mm.memory_id, mm.display_order
+'''
+_ALBUM_MEMORIES_SQL = '''
+    SELECT id, text, category, memory_date, year, created_at
+    FROM memories
+    ORDER BY year DESC, created_at DESC
+'''
+_ALBUM_PHOTOS_SQL = '''
+    SELECT id, filename, original_filename, file_type, title, description,
+           memory_date, year, created_at
+    FROM media
+    WHERE file_type = 'image'
+    ORDER BY created_at DESC
+'''
+
 class TimelineSidebar(Flowable):
     """Custom flowable for timeline markers in the margin."""
     
@@ -148,19 +177,20 @@ def extract_pull_quote(text):
     
     return None
 
-def get_linked_media(memory_id):
+def get_linked_media(memory_id, db=None):
     """Get media explicitly linked to this memory via memory_media table."""
-    db = get_db()
-    cursor = db.execute('''
-        SELECT m.id, m.filename, m.original_filename, m.file_type, 
-               m.title, m.description, m.memory_date, m.year, m.created_at
-        FROM media m
-        JOIN memory_media mm ON m.id = mm.media_id
-        WHERE mm.memory_id = ?
-        ORDER BY mm.display_order
-    ''', (memory_id,))
+    db = db or get_db()
+    cursor = db.execute(_LINKED_MEDIA_SQL, (memory_id,))
     return cursor.fetchall()
 
+def get_all_linked_media(db):
+    """Get linked media for every memory in one query: {memory_id: [rows]}."""
+    cursor = db.execute(_ALL_LINKED_MEDIA_SQL)
+    linked = {}
+    for row in cursor.fetchall():
+        linked.setdefault(row[0], []).append(tuple(row)[1:])
+    return linked
+
 def match_images_to_story(story_text, story_year, media_items):
     """Find images that relate to this story."""
     # DISABLED: Automatic matching was producing poor results
@@ -278,27 +308,20 @@ def generate_memory_album_pdf():
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         output_path = f"memory_archive_{timestamp}.pdf"
         
-        # Get data from database
-        db = get_db()
-        cursor = db.cursor()
-        
-        # Get memories grouped by year
-        cursor.execute("""
-            SELECT id, text, category, memory_date, year, created_at 
-            FROM memories 
-            ORDER BY year DESC, created_at DESC
-        """)
-        memories = cursor.fetchall()
-        
-        # Get all media
-        cursor.execute("""
-            SELECT id, filename, original_filename, file_type, title, description, 
-                   memory_date, year, created_at 
-            FROM media 
-            WHERE file_type = 'image'
-            ORDER BY created_at DESC
-        """)
-        media_items = cursor.fetchall()
+        # Load everything from one read-only snapshot up front, so the
+        # export is consistent and rendering holds no database locks
+        with read_snapshot() as db:
+            cursor = db.cursor()
+            
+            # Get memories grouped by year
+            cursor.execute(_ALBUM_MEMORIES_SQL)
+            memories = cursor.fetchall()
+            
+            # Get all media
+            cursor.execute(_ALBUM_PHOTOS_SQL)
+            media_items = cursor.fetchall()
+            
+            linked_media = get_all_linked_media(db)
         
         # Create document with custom page template
         doc = SimpleDocTemplate(
@@ -359,7 +382,7 @@ def generate_memory_album_pdf():
                     story.append(Paragraph(header, styles['StoryTitle']))
                     
                     # Get explicitly linked images (replaces automatic matching)
-                    related_images = get_linked_media(memory_id)
+                    related_images = linked_media.get(memory_id, [])
                     
                     # Split text into paragraphs
                     paragraphs = [p.strip() for p in text.split('\n') if p.strip()]
@@ -0,0 +1,76 @@
+# query_cache.py - Versioned LRU cache for search results
+"""
+Families ask the same questions again and again, so search results are
+cached by their normalized query text (tokenizer.normalize). Every entry
+is stored with the data version it was computed from
+(search_index.data_version(), which moves on every memory write in any
+worker). A lookup under a different
+version finds the cache stale and empties it, so a cached answer never
+outlives the memories it was built from.
+
+Cached values are shared between requests; callers must not mutate them.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+CACHE_SIZE = int(os.getenv('SEARCH_CACHE_SIZE', '256'))
+
+MISSING = object()
+
+
+class QueryCache:
+    """Bounded LRU of query results tagged with a data version."""
+
+    def __init__(self, maxsize=None):
+        self.maxsize = maxsize or CACHE_SIZE
+        self._entries = OrderedDict()
+        self._version = None
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'invalidations': 0}
+
+    def get(self, key, version):
+        """Cached value for key at this data version, or MISSING."""
+        with self._lock:
+            self._check_version(version)
+            try:
+                value = self._entries[key]
+            except KeyError:
+                self._stats['misses'] += 1
+                return MISSING
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+            return value
+
+    def put(self, key, version, value):
+        with self._lock:
+            self._check_version(version)
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = len(self._entries)
+        lookups = stats['hits'] + stats['misses']
+        stats['maxsize'] = self.maxsize
+        stats['hit_rate'] = round(stats['hits'] / lookups, 3) if lookups else None
+        stats['data_version'] = self._version
+        return stats
+
+    def _check_version(self, version):
+        # Called with the lock held. Any change empties the cache, not just
+        # a newer version: a restore from backup moves the version back.
+        if version != self._version:
+            if self._entries:
+                self._stats['invalidations'] += 1
+            self._entries.clear()
+            self._version = version
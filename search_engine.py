@@ -1,16 +1,48 @@
 # search_engine.py - Intelligent search with relevance scoring
+import base64
+import heapq
+import json
 import re
 import sqlite3
 from database import get_db
+import search_index
+import name_index
+from query_cache import MISSING, QueryCache
+from tokenizer import normalize
+
+PAGE_SIZE = 10
+MAX_PAGE_SIZE = 100
+
+# One page of ranked memories, by id
+_PAGE_SQL = '''
+    SELECT m.id, m.text, m.category, m.memory_date, m.year,
+           GROUP_CONCAT(DISTINCT mp.person_name) as people
+    FROM memories m
+    LEFT JOIN memory_people mp ON m.id = mp.memory_id
+    WHERE m.id IN ({placeholders})
+    GROUP BY m.id
+'''
+
+
+def encode_cursor(relevance, memory_id):
+    """Opaque cursor pointing just past a result."""
+    raw = json.dumps([relevance, memory_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """(relevance, memory_id) from encode_cursor. Raises ValueError if malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        relevance, memory_id = json.loads(raw)
+        return float(relevance), int(memory_id)
+    except (TypeError, ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
+
 
 class EnhancedSearch:
-    def __init__(self):
-        self.common_words = {
-            'who', 'what', 'when', 'where', 'why', 'how',
-            'was', 'is', 'are', 'were', 'did', 'do', 'does',
-            'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on',
-            'at', 'to', 'for', 'of', 'with', 'by', 'about'
-        }
+    # Shared by every request in the process
+    cache = QueryCache()
     
     def extract_names(self, query):
         """Extract person names from natural language queries."""
@@ -33,65 +65,83 @@ class EnhancedSearch:
         
         return names
     
-    def calculate_relevance(self, text, query, names):
-        """Calculate relevance score (0-100)."""
-        score = 0
-        text_lower = text.lower()
-        query_lower = query.lower()
+    def search_memories(self, query, threshold=10.0, limit=PAGE_SIZE):
+        """Top `limit` memories for a query. See search_page()."""
+        return self.search_page(query, threshold, limit)[0]
+    
+    def search_page(self, query, threshold=10.0, limit=PAGE_SIZE, cursor=None):
+        """One page of memories, ranked by BM25 over text and tagged people,
+        plus fuzzy matches from the name index for "who was ..." queries.
         
-        # 1. Exact phrase match
-        if query_lower in text_lower:
-            score += 50
+        relevance_score is scaled so the best match is 100; results
+        below `threshold` percent of the best are dropped. Results are
+        ordered by relevance, then id, and `cursor` is the next_cursor
+        from the previous page. Returns (results, next_cursor), with
+        next_cursor None on the last page.
         
-        # 2. Person name matches
-        for name in names:
-            if name.lower() in text_lower:
-                score += 40
+        The scores for a query are computed once per data version and
+        cached, so each further page is only a top-k pass over them.
+        """
+        after = decode_cursor(cursor) if cursor else None
+        db = get_db()
+        version = search_index.data_version(db)
+        key = (normalize(query), threshold, limit, cursor)
+        page = self.cache.get(key, version)
+        if page is MISSING:
+            page = self._page(db, self._relevance(db, query, threshold, version), limit, after)
+            self.cache.put(key, version, page)
+        return page
+    
+    def _relevance(self, db, query, threshold, version):
+        """{memory_id: relevance} for every memory at or above threshold."""
+        key = ('relevance', normalize(query), threshold)
+        relevance = self.cache.get(key, version)
+        if relevance is not MISSING:
+            return relevance
         
-        # 3. Word matches
-        query_words = [w for w in query_lower.split() if w not in self.common_words]
-        matches = sum(1 for word in query_words if word in text_lower)
+        relevance = {}
+        scores = search_index.get_index(db).scores(query)
+        if scores:
+            best = max(scores.values())
+            for memory_id, score in scores.items():
+                relevance[memory_id] = score / best * 100
         
-        if matches > 0:
-            score += (matches / len(query_words)) * 30
+        # "Who was Peter Elgar?" - fuzzy name matches rank with the best text match
+        for match in name_index.match_names(db, self.extract_names(query)):
+            for memory_id in match['memory_ids']:
+                relevance[memory_id] = max(relevance.get(memory_id, 0), match['similarity'] * 100)
         
-        return min(score, 100)
+        relevance = {memory_id: round(value, 2) for memory_id, value in relevance.items()
+                     if value >= threshold}
+        self.cache.put(key, version, relevance)
+        return relevance
     
-    def search_memories(self, query, threshold=10.0):
-        """Search memories with relevance scoring."""
-        names = self.extract_names(query)
+    def _page(self, db, relevance, limit, after):
+        # Keyset pagination on (-relevance, id): a heap keeps the next
+        # limit + 1 results, however deep the page
+        ranked = ((-value, memory_id) for memory_id, value in relevance.items())
+        if after:
+            ranked = (item for item in ranked if item > (-after[0], after[1]))
+        top = heapq.nsmallest(limit + 1, ranked)
+        next_cursor = encode_cursor(-top[limit - 1][0], top[limit - 1][1]) if len(top) > limit else None
+        top = top[:limit]
+        if not top:
+            return [], None
         
-        db = get_db()
-        cursor = db.cursor()
+        placeholders = ','.join('?' * len(top))
+        cursor = db.execute(_PAGE_SQL.format(placeholders=placeholders), [memory_id for _, memory_id in top])
+        rows = {memory['id']: memory for memory in cursor.fetchall()}
         
-        # Get all memories
-        cursor.execute("""
-            SELECT m.id, m.text, m.category, m.memory_date, m.year,
-                   GROUP_CONCAT(DISTINCT mp.person_name) as people
-            FROM memories m
-            LEFT JOIN memory_people mp ON m.id = mp.memory_id
-            GROUP BY m.id
-        """)
-        
-        results = []
-        for memory in cursor.fetchall():
-            search_text = f"{memory['text']}"
-            if memory['people']:
-                search_text += f" {memory['people']}"
-            
-            relevance = self.calculate_relevance(search_text, query, names)
-            
-            if relevance >= threshold:
-                results.append({
-                    'id': memory['id'],
-                    'text': memory['text'],
-                    'category': memory['category'],
-                    'date': memory['memory_date'],
-                    'year': memory['year'],
-                    'relevance_score': round(relevance, 2),
-                    'people': memory['people'].split(',') if memory['people'] else []
-                })
-        
-        # Sort by relevance
-        results.sort(key=lambda x: x['relevance_score'], reverse=True)
-        return results[:10]  # Return top 10
\ No newline at end of file
+        results = [
+            {
+                'id': memory['id'],
+                'text': memory['text'],
+                'category': memory['category'],
+                'date': memory['memory_date'],
+                'year': memory['year'],
+                'relevance_score': relevance[memory['id']],
+                'people': memory['people'].split(',') if memory['people'] else []
+            }
+            for memory in (rows.get(memory_id) for _, memory_id in top) if memory
+        ]
+        return results, next_cursor
@@ -0,0 +1,210 @@
+# search_index.py - In-process BM25 inverted index over memories
+"""
+Each process keeps an inverted index of memory text plus the names
+tagged in memory_people, so a query scores only the posting lists of
+its own terms instead of reading every memory.
+
+The index is built once per process, then kept current from the
+memory_changes table. Triggers on memories and memory_people append a
+row to that table for every change, and sync() re-indexes only the
+memory ids logged since the last sync. The routes call sync() right
+after they write, and every search calls it first, so other gunicorn
+workers and CLI tools are picked up too. If the log has been pruned past
+the last seq this index saw, sync() rebuilds it from scratch.
+
+Memory text is not re-tokenized here: the terms stored in memory_tokens
+when the memory was saved are read instead.
+"""
+
+import heapq
+import math
+import os
+import threading
+from collections import Counter
+
+from tokenizer import TOKENIZER_VERSION, terms as tokenize
+
+# Documents re-read per query when syncing a batch of changes
+_RELOAD_CHUNK = 500
+
+# Terms stored in memory_tokens, or the text when they are missing or stale
+_DOCS_SQL = f'''
+    SELECT m.id,
+           CASE WHEN t.version = {TOKENIZER_VERSION} THEN NULL ELSE m.text END AS text,
+           t.terms, GROUP_CONCAT(mp.person_name, ' ') AS people
+    FROM memories m
+    LEFT JOIN memory_tokens t ON t.memory_id = m.id
+    LEFT JOIN memory_people mp ON m.id = mp.memory_id
+    {{where}}
+    GROUP BY m.id
+'''
+_CHANGES_SQL = "SELECT seq, memory_id FROM memory_changes WHERE seq > ? ORDER BY seq"
+
+
+class MemoryIndex:
+    """BM25 over memory text and tagged people. Safe to share between threads."""
+
+    k1 = 1.2
+    b = 0.75
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._reset()
+        self.pid = None
+        self.source = None
+
+    def _reset(self):
+        self.postings = {}    # term -> {memory_id: term frequency}
+        self.doc_terms = {}   # memory_id -> distinct terms, for removal
+        self.doc_len = {}     # memory_id -> token count
+        self.total_len = 0
+        self.last_seq = None
+
+    def __len__(self):
+        return len(self.doc_len)
+
+    # ---------- maintenance ----------
+
+    def build(self, conn):
+        """Index every memory. Changes logged meanwhile are replayed by sync()."""
+        with self._lock:
+            self._reset()
+            self.pid = os.getpid()
+            self.source = _database_file(conn)
+            self.last_seq = data_version(conn)
+            for memory_id, text, terms, people in conn.execute(_DOCS_SQL.format(where='')):
+                self._add(memory_id, text, terms, people)
+
+    def sync(self, conn):
+        """Apply logged changes since the last sync. Returns memories re-indexed."""
+        with self._lock:
+            if (self.last_seq is None or self.pid != os.getpid()
+                    or self.source != _database_file(conn)):
+                self.build(conn)
+                return len(self)
+
+            rows = conn.execute(_CHANGES_SQL, (self.last_seq,)).fetchall()
+            if not rows:
+                # Pruned beyond us, or restored from an older backup
+                if data_version(conn) != self.last_seq:
+                    self.build(conn)
+                    return len(self)
+                return 0
+            if rows[0][0] != self.last_seq + 1:
+                self.build(conn)
+                return len(self)
+
+            changed = list(dict.fromkeys(memory_id for _, memory_id in rows))
+            for memory_id in changed:
+                self._remove(memory_id)
+            for start in range(0, len(changed), _RELOAD_CHUNK):
+                chunk = changed[start:start + _RELOAD_CHUNK]
+                placeholders = ','.join('?' * len(chunk))
+                where = f'WHERE m.id IN ({placeholders})'
+                for memory_id, text, terms, people in conn.execute(_DOCS_SQL.format(where=where), chunk):
+                    self._add(memory_id, text, terms, people)
+            self.last_seq = rows[-1][0]
+            return len(changed)
+
+    def _add(self, memory_id, text, terms, people):
+        # text is only read back when the stored terms are missing or stale
+        tokens = (terms.split() if text is None else tokenize(text)) + tokenize(people)
+        counts = Counter(tokens)
+        for term, tf in counts.items():
+            self.postings.setdefault(term, {})[memory_id] = tf
+        self.doc_terms[memory_id] = tuple(counts)
+        self.doc_len[memory_id] = len(tokens)
+        self.total_len += len(tokens)
+
+    def _remove(self, memory_id):
+        terms = self.doc_terms.pop(memory_id, None)
+        if terms is None:
+            return
+        for term in terms:
+            posting = self.postings[term]
+            del posting[memory_id]
+            if not posting:
+                del self.postings[term]
+        self.total_len -= self.doc_len.pop(memory_id)
+
+    # ---------- queries ----------
+
+    def scores(self, query):
+        """{memory_id: bm25 score} for every memory matching a query term."""
+        with self._lock:
+            n = len(self.doc_len)
+            if not n:
+                return {}
+            avgdl = self.total_len / n or 1.0
+            k1, b = self.k1, self.b
+            scores = {}
+            for term in dict.fromkeys(tokenize(query)):
+                posting = self.postings.get(term)
+                if not posting:
+                    continue
+                df = len(posting)
+                idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+                for memory_id, tf in posting.items():
+                    norm = k1 * (1 - b + b * self.doc_len[memory_id] / avgdl)
+                    scores[memory_id] = scores.get(memory_id, 0.0) + idf * tf * (k1 + 1) / (tf + norm)
+        return scores
+
+    def matching(self, query):
+        """Ids of every memory containing at least one query term, unscored."""
+        with self._lock:
+            postings = [self.postings[term] for term in set(tokenize(query)) if term in self.postings]
+            return sorted(set().union(*postings))
+
+    def search(self, query, limit=10):
+        """[(memory_id, bm25 score), ...] best first."""
+        return heapq.nlargest(limit, self.scores(query).items(), key=lambda item: item[1])
+
+    def stats(self):
+        with self._lock:
+            return {
+                'documents': len(self.doc_len),
+                'terms': len(self.postings),
+                'postings': sum(len(p) for p in self.postings.values()),
+                'last_seq': self.last_seq,
+            }
+
+
+def _database_file(conn):
+    return conn.execute("PRAGMA database_list").fetchone()[2]
+
+
+def data_version(conn):
+    """Counter that moves on every memory or memory_people write, in any process."""
+    row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'memory_changes'").fetchone()
+    return row[0] if row else 0
+
+
+def prune_changes(conn, keep_days=7):
+    """Drop change-log rows older than keep_days. Returns rows deleted.
+
+    Any index that has not synced within that window rebuilds itself.
+    """
+    cursor = conn.execute(
+        "DELETE FROM memory_changes WHERE changed_at < datetime('now', ?)",
+        (f'-{int(keep_days)} days',)
+    )
+    conn.commit()
+    return cursor.rowcount
+
+
+memory_index = MemoryIndex()
+
+
+def get_index(conn):
+    """The process-wide index, synced with the database."""
+    memory_index.sync(conn)
+    return memory_index
+
+
+def sync(conn):
+    """Sync right after a write. Searches sync again, so failures only log."""
+    try:
+        return memory_index.sync(conn)
+    except Exception as e:
+        print(f"Search index sync error: {e}")
+        return 0
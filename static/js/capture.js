@@ -70,6 +70,12 @@ async function saveMemory() {
         if (data.status === 'success') {
             alert(isEditing ? 'Memory updated!' : 'Memory saved!');
             
+            // The category shown is a keyword guess until the server refines it
+            const memory = isEditing ? data.memory : data;
+            if (memory.category_status === 'provisional') {
+                pollMemoryCategory(isEditing ? editingId : data.memory_id);
+            }
+            
             // Clear the form
             textArea.value = '';
             document.getElementById('memory-date').value = '';
@@ -101,3 +107,25 @@ async function saveMemory() {
         alert('Failed to save memory. Please try again.');
     }
 }
+
+// Poll until the background categorizer has refined a memory's category,
+// then update its timeline card
+async function pollMemoryCategory(memoryId, attempt = 0) {
+    if (attempt >= 15) return;
+    await new Promise(resolve => setTimeout(resolve, 2000));
+    try {
+        const response = await fetch(`/api/memories/${memoryId}/category`);
+        const data = await response.json();
+        if (data.status !== 'success') return;
+        if (data.pending) {
+            pollMemoryCategory(memoryId, attempt + 1);
+            return;
+        }
+        const label = document.querySelector(`.memory-card[data-id="${memoryId}"] .memory-category`);
+        if (label && data.category) {
+            label.textContent = data.category;
+        }
+    } catch (error) {
+        console.error('Error checking memory category:', error);
+    }
+}
@@ -189,4 +189,130 @@ function addComment(memoryId) {
         }
         alert(`Preparing to add a love note to memory ${memoryId}`);
     }, 100);
-}
\ No newline at end of file
+}
+
+// ============================================
+// TYPEAHEAD
+// ============================================
+
+const SUGGEST_DELAY_MS = 80;
+const SUGGESTION_ICONS = {
+    person: 'fa-user',
+    place: 'fa-map-marker-alt',
+    title: 'fa-image',
+    category: 'fa-tag'
+};
+
+const typeahead = {
+    timer: null,
+    controller: null,
+    replaceWords: 0,
+    suggestions: [],
+    active: -1
+};
+
+async function fetchSuggestions(query) {
+    // Only the latest keystroke's request matters
+    if (typeahead.controller) typeahead.controller.abort();
+    typeahead.controller = new AbortController();
+    
+    try {
+        const response = await fetch(`/api/search/suggest?q=${encodeURIComponent(query)}`, {
+            signal: typeahead.controller.signal
+        });
+        const data = await response.json();
+        if (data.status !== 'success') return;
+        typeahead.replaceWords = data.replace_words;
+        typeahead.suggestions = data.suggestions;
+        typeahead.active = -1;
+        renderSuggestions();
+    } catch (error) {
+        if (error.name !== 'AbortError') console.error('Suggest error:', error);
+    }
+}
+
+function renderSuggestions() {
+    const list = document.getElementById('search-suggestions');
+    if (!typeahead.suggestions.length) {
+        closeSuggestions();
+        return;
+    }
+    list.innerHTML = typeahead.suggestions.map((s, index) => `
+        <li role="option" class="${index === typeahead.active ? 'active' : ''}" data-index="${index}">
+            <i class="fas ${SUGGESTION_ICONS[s.kind] || 'fa-search'} suggestion-kind"></i>
+            <span>${escapeHtml(s.value)}</span>
+            <span class="suggestion-count">${s.count}</span>
+        </li>
+    `).join('');
+    list.classList.add('open');
+}
+
+function closeSuggestions() {
+    const list = document.getElementById('search-suggestions');
+    list.classList.remove('open');
+    list.innerHTML = '';
+    typeahead.suggestions = [];
+    typeahead.active = -1;
+}
+
+function applySuggestion(index) {
+    const input = document.getElementById('search-query');
+    const suggestion = typeahead.suggestions[index];
+    if (!suggestion) return;
+    
+    // The server completed the last `replace_words` words of the query
+    const words = input.value.trim().split(/\s+/);
+    words.splice(words.length - typeahead.replaceWords, typeahead.replaceWords, suggestion.value);
+    input.value = words.join(' ') + ' ';
+    closeSuggestions();
+    input.focus();
+}
+
+document.addEventListener('DOMContentLoaded', () => {
+    const input = document.getElementById('search-query');
+    const list = document.getElementById('search-suggestions');
+    if (!input || !list) return;
+    
+    input.addEventListener('input', () => {
+        clearTimeout(typeahead.timer);
+        const query = input.value;
+        if (!query.trim()) {
+            closeSuggestions();
+            return;
+        }
+        typeahead.timer = setTimeout(() => fetchSuggestions(query), SUGGEST_DELAY_MS);
+    });
+    
+    input.addEventListener('keydown', (e) => {
+        const count = typeahead.suggestions.length;
+        if (e.key === 'ArrowDown' && count) {
+            e.preventDefault();
+            typeahead.active = (typeahead.active + 1) % count;
+            renderSuggestions();
+        } else if (e.key === 'ArrowUp' && count) {
+            e.preventDefault();
+            typeahead.active = (typeahead.active - 1 + count) % count;
+            renderSuggestions();
+        } else if (e.key === 'Escape') {
+            closeSuggestions();
+        } else if (e.key === 'Enter') {
+            e.preventDefault();
+            if (typeahead.active >= 0) {
+                applySuggestion(typeahead.active);
+            } else {
+                closeSuggestions();
+                performSmartSearch();
+            }
+        }
+    });
+    
+    // mousedown fires before the input loses focus
+    list.addEventListener('mousedown', (e) => {
+        const item = e.target.closest('li');
+        if (!item) return;
+        e.preventDefault();
+        applySuggestion(Number(item.dataset.index));
+    });
+    
+    input.addEventListener('blur', () => setTimeout(closeSuggestions, 100));
+});
@@ -0,0 +1,261 @@
+# suggest_index.py - Prefix index for search-box completions
+"""
+People (memory_people tags and the media people field), places (the
+memories places field), media titles and categories are kept in a
+sorted array of the start of every word of every value, so "elg" finds
+"Peter Elger" through its second word. A keystroke is two bisects to
+the range of keys with that prefix, and the completions in it are
+ranked by how many memories and media they appear in, without a Python
+loop over the range, so even a one-letter prefix over a large archive
+takes a few milliseconds.
+
+Like name_index, the index lives in each process and is kept current
+from the memory_changes and media_changes logs: every lookup first
+re-reads only the memories and media logged since the last one.
+"""
+
+import heapq
+import os
+import threading
+from bisect import bisect_left, bisect_right
+
+from name_index import CHANGE_LOGS, log_version, read_changes, split_people
+from tokenizer import STOPWORDS, normalize
+
+KINDS = ('person', 'place', 'title', 'category')
+LIMIT = 8
+# Words at the end of the query tried as the text to complete
+MAX_WORDS = 4
+
+_RELOAD_CHUNK = 500
+_CACHE_SIZE = 1024
+
+_MEMORY_DOCS_SQL = '''
+    SELECT m.id, m.category, m.places, GROUP_CONCAT(mp.person_name, ',') AS tagged
+    FROM memories m
+    LEFT JOIN memory_people mp ON m.id = mp.memory_id
+    {where}
+    GROUP BY m.id
+'''
+_MEDIA_DOCS_SQL = "SELECT id, title, people FROM media {where}"
+
+
+def _word_starts(key):
+    """Every suffix of key that starts a word: "peter elger" -> "peter elger", "elger"."""
+    starts = [key]
+    for i, char in enumerate(key):
+        if char == ' ':
+            starts.append(key[i + 1:])
+    return starts
+
+
+class SuggestIndex:
+    """Completions with the memories and media they appear in. Thread-safe."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._reset()
+        self.pid = None
+        self.source = None
+
+    def _reset(self):
+        self.entries = {}      # (kind, key) -> {'value', 'docs': {(doc kind, id), ...}}
+        self.weight = {}       # (kind, key) -> memories and media it appears in
+        # Sorted prefix arrays, each a list of keys and a parallel list of
+        # the entries they belong to: every word start, and whole values only
+        self.starts = ([], [])
+        self.wholes = ([], [])
+        self.doc_entries = {}  # (doc kind, id) -> entries, for removal
+        self.last_seq = {kind: None for kind in CHANGE_LOGS}
+        self._cache = {}
+        self._bulk = False     # build() appends and sorts once at the end
+
+    def __len__(self):
+        return len(self.entries)
+
+    # ---------- maintenance ----------
+
+    def build(self, conn):
+        with self._lock:
+            self._reset()
+            self.pid = os.getpid()
+            self.source = conn.execute("PRAGMA database_list").fetchone()[2]
+            for kind in CHANGE_LOGS:
+                self.last_seq[kind] = log_version(conn, kind)
+            self._bulk = True
+            try:
+                self._load(conn, 'memory', None)
+                self._load(conn, 'media', None)
+            finally:
+                self._bulk = False
+                for keys, refs in (self.starts, self.wholes):
+                    pairs = sorted(zip(keys, refs))
+                    keys[:] = [key for key, _ in pairs]
+                    refs[:] = [ref for _, ref in pairs]
+
+    def sync(self, conn):
+        """Re-read the memories and media changed since the last sync."""
+        with self._lock:
+            if (self.last_seq['memory'] is None or self.pid != os.getpid()
+                    or self.source != conn.execute("PRAGMA database_list").fetchone()[2]):
+                self.build(conn)
+                return len(self)
+
+            changed = read_changes(conn, self.last_seq)
+            if changed is None:
+                self.build(conn)
+                return len(self)
+
+            if changed:
+                self._cache.clear()
+            for kind, ids in changed.items():
+                for doc_id in ids:
+                    self._remove((kind, doc_id))
+                for start in range(0, len(ids), _RELOAD_CHUNK):
+                    self._load(conn, kind, ids[start:start + _RELOAD_CHUNK])
+            return sum(len(ids) for ids in changed.values())
+
+    def _load(self, conn, kind, ids):
+        if kind == 'memory':
+            where = f"WHERE m.id IN ({','.join('?' * len(ids))})" if ids else ''
+            for memory_id, category, places, tagged in conn.execute(_MEMORY_DOCS_SQL.format(where=where), ids or ()):
+                values = [('person', name) for name in split_people(tagged)]
+                values += [('place', place) for place in split_people(places)]
+                if category:
+                    values.append(('category', category))
+                self._add(('memory', memory_id), values)
+        else:
+            where = f"WHERE id IN ({','.join('?' * len(ids))})" if ids else ''
+            for media_id, title, people in conn.execute(_MEDIA_DOCS_SQL.format(where=where), ids or ()):
+                values = [('person', name) for name in split_people(people)]
+                if title:
+                    values.append(('title', title))
+                self._add(('media', media_id), values)
+
+    def _add(self, doc, values):
+        entry_keys = set()
+        for kind, value in values:
+            key = normalize(value)
+            if not key:
+                continue
+            entry_key = (kind, key)
+            entry = self.entries.get(entry_key)
+            if entry is None:
+                entry = self.entries[entry_key] = {'value': value.strip(), 'docs': set()}
+                self._insert(self.wholes, key, entry_key)
+                for start in _word_starts(key):
+                    self._insert(self.starts, start, entry_key)
+            entry['docs'].add(doc)
+            self.weight[entry_key] = len(entry['docs'])
+            entry_keys.add(entry_key)
+        if entry_keys:
+            self.doc_entries[doc] = entry_keys
+
+    def _remove(self, doc):
+        for entry_key in self.doc_entries.pop(doc, ()):
+            entry = self.entries[entry_key]
+            entry['docs'].discard(doc)
+            if entry['docs']:
+                self.weight[entry_key] = len(entry['docs'])
+                continue
+            del self.entries[entry_key]
+            del self.weight[entry_key]
+            self._delete(self.wholes, entry_key[1], entry_key)
+            for start in _word_starts(entry_key[1]):
+                self._delete(self.starts, start, entry_key)
+
+    def _insert(self, array, key, entry_key):
+        keys, refs = array
+        if self._bulk:
+            keys.append(key)
+            refs.append(entry_key)
+            return
+        i = bisect_right(keys, key)
+        keys.insert(i, key)
+        refs.insert(i, entry_key)
+
+    @staticmethod
+    def _delete(array, key, entry_key):
+        keys, refs = array
+        i = bisect_left(keys, key)
+        while refs[i] != entry_key:
+            i += 1
+        del keys[i]
+        del refs[i]
+
+    # ---------- queries ----------
+
+    def complete(self, prefix, limit=LIMIT, kinds=KINDS):
+        """Entries with a word starting with `prefix`, best first.
+
+        Completions of the whole value ("pet" -> "Peter Elger") rank
+        above those of a later word ("elg"), then by how many memories
+        and media they appear in.
+        """
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        cache_key = (prefix, limit, tuple(kinds))
+        with self._lock:
+            cached = self._cache.get(cache_key)
+            if cached is not None:
+                return cached
+            best = []
+            for array in (self.wholes, self.starts):
+                # The slice, dedup and ranking below all run in C
+                keys, refs = array
+                lo = bisect_left(keys, prefix)
+                hi = bisect_left(keys, prefix + '\U0010ffff', lo)
+                found = dict.fromkeys(refs[lo:hi])
+                if kinds != KINDS:
+                    found = [ref for ref in found if ref[0] in kinds]
+                # Ties keep key order, so equal counts list alphabetically
+                found = [ref for ref in found if ref not in best] if best else found
+                best += heapq.nlargest(limit - len(best), found, key=self.weight.__getitem__)
+                if len(best) >= limit:
+                    break
+            entries = self.entries
+            results = [{
+                'value': entries[entry_key]['value'],
+                'kind': entry_key[0],
+                'count': self.weight[entry_key],
+            } for entry_key in best]
+            if len(self._cache) >= _CACHE_SIZE:
+                self._cache.clear()
+            self._cache[cache_key] = results
+            return results
+
+    def suggest(self, query, limit=LIMIT, kinds=KINDS):
+        """(words replaced, completions) for the end of a search-box query.
+
+        "Where was Peter El" is tried as "Where was Peter El", "was Peter
+        El", "Peter El" and "El", longest first; the first that completes
+        to anything wins, and the caller replaces that many trailing words.
+        """
+        words = query.split()
+        for count in range(min(len(words), MAX_WORDS), 0, -1):
+            if count == 1 and words[-1].lower() in STOPWORDS:
+                break
+            results = self.complete(' '.join(words[-count:]), limit, kinds)
+            if results:
+                return count, results
+        return 0, []
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self.entries),
+                'keys': len(self.starts[0]),
+                'documents': len(self.doc_entries),
+                'cached': len(self._cache),
+                'last_seq': dict(self.last_seq),
+            }
+
+
+suggest_index = SuggestIndex()
+
+
+def get_index(conn):
+    """The process-wide suggest index, synced with the database."""
+    suggest_index.sync(conn)
+    return suggest_index
@@ -0,0 +1,101 @@
+"""
+Tests for the memories DeepSeekSearch sends with a question.
+"""
+
+import json
+import os
+import sys
+import tempfile
+import unittest
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import ai_search
+import database
+import memory_tokens
+from ai_search import DeepSeekSearch
+
+
+class RecordingClient:
+    """Stands in for the OpenAI client and keeps every prompt it is sent."""
+
+    def __init__(self):
+        self.prompts = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, messages, **kwargs):
+        self.prompts.append(messages[-1]['content'])
+        content = json.dumps({'answer': 'Hastings', 'supporting_memory_ids': [2],
+                              'confidence': 0.9, 'direct_answer': True})
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+class AIContextTestCase(unittest.TestCase):
+    """Test suite for DeepSeekSearch context selection."""
+
+    def setUp(self):
+        self.db_fd, self.db_path = tempfile.mkstemp(suffix='.db')
+        self.original_path = database.DB_PATH
+        database.DB_PATH = self.db_path
+        database.init_db()
+        database.migrate_db()
+        self.conn = database.connect()
+        texts = {
+            1: 'Dad bought a new car in 1998.',
+            2: 'As a child Jon grew up by the sea in Hastings and went to school there.',
+            3: 'Mary started work at the bank.',
+        }
+        # Lots of recent memories that have nothing to do with childhood
+        texts.update({i: f'Sunday lunch number {i} with roast potatoes.' for i in range(4, 60)})
+        for memory_id, text in texts.items():
+            self.conn.execute("INSERT INTO memories (id, text, year) VALUES (?, ?, ?)",
+                              (memory_id, text, 1950 if memory_id == 2 else 2000 + memory_id))
+            memory_tokens.store(self.conn, memory_id, text)
+        self.conn.execute("INSERT INTO memory_people (memory_id, person_name) VALUES (2, 'Jon Clarke')")
+        self.conn.commit()
+        self.searcher = DeepSeekSearch(api_key='')
+        self.searcher.client = RecordingClient()
+
+    def tearDown(self):
+        self.conn.close()
+        database.get_pool().close_all()
+        database.DB_PATH = self.original_path
+        os.close(self.db_fd)
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(self.db_path + suffix):
+                os.unlink(self.db_path + suffix)
+
+    def test_relevant_memories_are_sent_first(self):
+        # Only the selected memories are read, not the whole archive
+        self.searcher._get_all_memories = None
+        result = self.searcher._answer('Where did Jon go to school as a child?')
+        prompt = self.searcher.client.prompts[0]
+        self.assertEqual(prompt.index('[Memory ID: '), prompt.index('[Memory ID: 2]'))
+        self.assertIn('[People: Jon Clarke]', prompt)
+        self.assertNotIn('roast potatoes', prompt)
+        self.assertEqual([m['id'] for m in result['memories']], [2])
+
+    def test_names_alone_select_memories(self):
+        selected = self.searcher._select_context(self.conn, 'Tell me about Jon')
+        self.assertEqual(selected[0]['id'], 2)
+
+    def test_unmatched_question_falls_back_to_newest(self):
+        memories = self.searcher._get_all_memories(self.conn)
+        selected = self.searcher._select_context(self.conn, 'Tell me a story', limit=5)
+        self.assertEqual([m['id'] for m in selected], [m['id'] for m in memories[:5]])
+
+    def test_context_fits_token_budget(self):
+        memories = self.searcher._get_all_memories(self.conn)
+        context = self.searcher._prepare_memory_context(memories, budget=50)
+        self.assertLessEqual(len(context), 50 * ai_search.CHARS_PER_TOKEN)
+        self.assertGreater(context.count('[Memory ID:'), 1)
+
+        long = [{'id': 9, 'text': 'word ' * 1000}]
+        context = self.searcher._prepare_memory_context(long, budget=20)
+        self.assertTrue(context.startswith('[Memory ID: 9]'))
+        self.assertLessEqual(len(context), 20 * ai_search.CHARS_PER_TOKEN + 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
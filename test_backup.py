@@ -0,0 +1,93 @@
+"""
+Tests for online backup, retention and restore.
+"""
+
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import unittest
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import backup
+import database
+
+
+class BackupTestCase(unittest.TestCase):
+    """Test suite for backup."""
+
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.workdir, 'circle_memories.db')
+        self.backup_dir = os.path.join(self.workdir, 'backups')
+        self.original_path = database.DB_PATH
+        database.DB_PATH = self.db_path
+        database.init_db()
+        database.migrate_db()
+        self.conn = database.connect()
+        self.conn.executemany("INSERT INTO memories (text) VALUES (?)", [('x' * 500,)] * 2000)
+        self.conn.commit()
+
+    def tearDown(self):
+        self.conn.close()
+        database.get_pool().close_all()
+        database.DB_PATH = self.original_path
+        shutil.rmtree(self.workdir)
+
+    def count(self, path):
+        conn = sqlite3.connect(path)
+        try:
+            return conn.execute("SELECT COUNT(*) FROM memories").fetchone()[0]
+        finally:
+            conn.close()
+
+    def test_backup_is_consistent_while_writes_continue(self):
+        stop = threading.Event()
+
+        def writer():
+            conn = database.connect()
+            while not stop.is_set():
+                conn.execute("INSERT INTO memories (text) VALUES ('during backup')")
+                conn.commit()
+            conn.close()
+
+        thread = threading.Thread(target=writer)
+        thread.start()
+        try:
+            report = backup.create_backup(pages=16, sleep_ms=1, backup_dir=self.backup_dir)
+        finally:
+            stop.set()
+            thread.join()
+
+        self.assertTrue(report['pinned_snapshot'])
+        self.assertGreater(report['steps'], 1)
+        self.assertEqual(backup.verify(report['path']), 'ok')
+        self.assertGreaterEqual(self.count(report['path']), 2000)
+        self.assertFalse(os.path.exists(report['path'] + '.partial'))
+
+    def test_restore_round_trip_saves_previous_database(self):
+        report = backup.create_backup(backup_dir=self.backup_dir)
+        self.conn.execute("DELETE FROM memories")
+        self.conn.commit()
+
+        result = backup.restore_backup(report['path'], backup_dir=self.backup_dir)
+        self.assertEqual(self.count(self.db_path), 2000)
+        self.assertEqual(self.count(result['previous_saved_to']), 0)
+        self.assertEqual(len(backup.list_backups(self.backup_dir)), 2)
+
+    def test_retention_keeps_last_daily_and_weekly(self):
+        now = datetime(2024, 6, 30, 2, 0, tzinfo=timezone.utc)
+        backups = [(now - timedelta(hours=6 * i), f'b{i}') for i in range(200)]
+        keep, delete = backup.plan_retention(backups, keep_last=3, keep_daily=5, keep_weekly=4)
+        self.assertEqual(keep[:3], ['b0', 'b1', 'b2'])
+        self.assertEqual(len({backups[int(p[1:])][0].date() for p in keep}), 8)
+        self.assertEqual(len(keep) + len(delete), 200)
+        self.assertIn('b199', delete)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+"""
+Tests for background categorization of memories.
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import categorizer
+import database
+from llm_clients import CircuitOpenError
+
+
+class CategorizerTestCase(unittest.TestCase):
+    """Test suite for categorizer."""
+
+    def setUp(self):
+        self.db_fd, self.db_path = tempfile.mkstemp(suffix='.db')
+        self.original_path = database.DB_PATH
+        database.DB_PATH = self.db_path
+        database.init_db()
+        database.migrate_db()
+        self.conn = database.connect()
+        env = mock.patch.dict(os.environ, {'DEEPSEEK_API_KEY': 'test-key'})
+        env.start()
+        self.addCleanup(env.stop)
+
+    def tearDown(self):
+        self.conn.close()
+        database.get_pool().close_all()
+        database.DB_PATH = self.original_path
+        os.close(self.db_fd)
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(self.db_path + suffix):
+                os.unlink(self.db_path + suffix)
+
+    def save(self, text, year=None):
+        """Insert a memory the way save_memory does."""
+        category, status = categorizer.provisional_category(text, year=year)
+        cursor = self.conn.execute(
+            "INSERT INTO memories (text, category, year, category_status, category_due_at) VALUES (?, ?, ?, ?, 0)",
+            (text, category, year, status)
+        )
+        self.conn.commit()
+        return cursor.lastrowid
+
+    def test_saved_provisional_then_refined(self):
+        memory_id = self.save('Played bass in a band at the church hall')
+        self.assertEqual(categorizer.status(self.conn, memory_id),
+                         {'category': 'music', 'category_status': 'provisional'})
+        with mock.patch.object(categorizer, 'ai_category', return_value='hobbies') as ai:
+            self.assertEqual(categorizer.run_once(self.conn), 1)
+            self.assertEqual(categorizer.run_once(self.conn), 0)
+        ai.assert_called_once_with('Played bass in a band at the church hall', year=None)
+        self.assertEqual(categorizer.status(self.conn, memory_id),
+                         {'category': 'hobbies', 'category_status': 'final'})
+
+        with mock.patch.dict(os.environ, {'DEEPSEEK_API_KEY': ''}):
+            self.assertEqual(categorizer.provisional_category('army days'), ('military', 'final'))
+
+    def test_failures_retry_with_backoff_then_give_up(self):
+        memory_id = self.save('Worked at the garage')
+        with mock.patch.object(categorizer, 'ai_category', side_effect=TimeoutError('slow')):
+            with mock.patch.object(categorizer.time, 'time', return_value=1000.0):
+                self.assertEqual(categorizer.run_once(self.conn), 1)
+                self.assertEqual(categorizer.run_once(self.conn), 0)  # not due yet
+            due = self.conn.execute("SELECT category_due_at FROM memories WHERE id = ?", (memory_id,)).fetchone()[0]
+            self.assertEqual(due, 1000.0 + categorizer.RETRY_SECONDS)
+
+            now = 1000.0
+            for _ in range(categorizer.MAX_ATTEMPTS - 1):
+                now += 10 ** 6
+                with mock.patch.object(categorizer.time, 'time', return_value=now):
+                    categorizer.run_once(self.conn)
+        self.assertEqual(categorizer.status(self.conn, memory_id),
+                         {'category': 'work', 'category_status': 'failed'})
+
+    def test_open_circuit_waits_without_using_attempts(self):
+        memory_id = self.save('Worked at the garage')
+        outage = CircuitOpenError('deepseek is unavailable', retry_after=25.0)
+        with mock.patch.object(categorizer, 'ai_category', side_effect=outage):
+            # Far longer than the whole backoff sequence
+            for now in range(1000, 1000 + 100 * 26, 26):
+                with mock.patch.object(categorizer.time, 'time', return_value=float(now)):
+                    categorizer.run_once(self.conn)
+        status, attempts, due = self.conn.execute(
+            "SELECT category_status, category_attempts, category_due_at FROM memories WHERE id = ?",
+            (memory_id,)).fetchone()
+        self.assertEqual((status, attempts), ('provisional', 0))
+        self.assertEqual(due, 1000 + 99 * 26 + 25.0)
+
+    def test_edit_during_refinement_is_not_overwritten(self):
+        memory_id = self.save('Worked at the garage')
+        claimed = categorizer.claim(self.conn)
+        self.assertEqual([row[0] for row in claimed], [memory_id])
+        self.assertEqual(categorizer.claim(self.conn), [])  # another worker finds nothing
+
+        # The user edits the memory while DeepSeek is answering
+        self.conn.execute(
+            "UPDATE memories SET text = 'Our wedding day', category = 'life-event', "
+            "category_status = 'provisional', category_due_at = 0 WHERE id = ?", (memory_id,))
+        self.conn.commit()
+        with mock.patch.object(categorizer, 'ai_category', return_value='work'):
+            categorizer.refine(self.conn, *claimed[0])
+        self.assertEqual(categorizer.status(self.conn, memory_id)['category'], 'life-event')
+
+        with mock.patch.object(categorizer, 'ai_category', return_value='family'):
+            categorizer.run_once(self.conn)
+        self.assertEqual(categorizer.status(self.conn, memory_id),
+                         {'category': 'family', 'category_status': 'final'})
+
+    def test_bookkeeping_does_not_touch_change_log(self):
+        self.save('Worked at the garage')
+        before = self.conn.execute("SELECT COUNT(*) FROM memory_changes").fetchone()[0]
+        categorizer.claim(self.conn)
+        self.assertEqual(self.conn.execute("SELECT COUNT(*) FROM memory_changes").fetchone()[0], before)
+
+
+if __name__ == '__main__':
+    unittest.main()
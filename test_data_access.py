@@ -0,0 +1,103 @@
+"""
+Tests for the streaming row layer used by the list endpoints.
+"""
+
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from flask import Flask
+
+import database
+from data_access import (RowQuery, json_list_response, MEMORY_TIMELINE,
+                         UNLINKED_PHOTOS)
+
+
+class DataAccessTestCase(unittest.TestCase):
+    """Test suite for data_access."""
+
+    def setUp(self):
+        self.db_fd, self.db_path = tempfile.mkstemp(suffix='.db')
+        self.original_path = database.DB_PATH
+        database.DB_PATH = self.db_path
+        database.init_db()
+        database.migrate_db()
+        self.conn = database.connect()
+
+    def tearDown(self):
+        self.conn.close()
+        database.get_pool().close_all()
+        database.DB_PATH = self.original_path
+        os.close(self.db_fd)
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(self.db_path + suffix):
+                os.unlink(self.db_path + suffix)
+
+    def add_memories(self, count):
+        self.conn.executemany(
+            "INSERT INTO memories (text, year, audio_filename) VALUES (?, ?, ?)",
+            [(f'memory {i}', 1950 + i, 'a.webm' if i % 2 else None) for i in range(count)])
+        self.conn.commit()
+
+    def make_app(self, view):
+        app = Flask(__name__)
+        database.init_app(app)
+        app.add_url_rule('/list', 'list', view)
+        return app.test_client()
+
+    def test_rows_are_namedtuples_with_column_names(self):
+        self.add_memories(3)
+        rows = list(MEMORY_TIMELINE.rows(self.conn))
+        self.assertEqual([r.year for r in rows], [1950, 1951, 1952])
+        self.assertEqual(MEMORY_TIMELINE.as_dict(rows[1])['has_audio'], True)
+
+    def test_iter_json_spans_several_batches(self):
+        self.add_memories(25)
+        counter = [0]
+        chunks = list(MEMORY_TIMELINE.iter_json(self.conn, counter=counter, arraysize=10))
+        self.assertEqual(len(chunks), 3)
+        self.assertEqual(counter[0], 25)
+        items = json.loads('[' + ','.join(chunks) + ']')
+        self.assertEqual([m['text'] for m in items], [f'memory {i}' for i in range(25)])
+
+    def test_sql_errors_raise_before_streaming(self):
+        broken = RowQuery('broken', 'SELECT nope FROM memories', ('nope',))
+        with self.assertRaises(Exception):
+            broken.iter_json(self.conn)
+
+    def test_enveloped_response_matches_old_shape(self):
+        self.add_memories(1200)
+        client = self.make_app(lambda: json_list_response(
+            MEMORY_TIMELINE, database.get_db(), key='memories',
+            envelope={'status': 'success'}))
+        data = json.loads(client.get('/list').data)
+        self.assertEqual(data['status'], 'success')
+        self.assertEqual(len(data['memories']), 1200)
+        self.assertEqual(set(data['memories'][0]),
+                         {'id', 'text', 'category', 'memory_date', 'year',
+                          'audio_filename', 'created_at', 'has_audio'})
+
+    def test_trailer_gets_row_count(self):
+        self.conn.executemany(
+            "INSERT INTO media (filename, file_type) VALUES (?, 'image')",
+            [(f'{i}.jpg',) for i in range(4)])
+        self.conn.commit()
+        client = self.make_app(lambda: json_list_response(
+            UNLINKED_PHOTOS, database.get_db(), (1,), key='photos',
+            envelope={'status': 'success', 'memory_id': 1},
+            trailer=lambda count: {'count': count}))
+        data = json.loads(client.get('/list').data)
+        self.assertEqual(data['count'], 4)
+        self.assertEqual(data['photos'][0]['year'], 'Unknown')
+
+    def test_bare_array_when_no_key(self):
+        client = self.make_app(lambda: json_list_response(MEMORY_TIMELINE, database.get_db()))
+        self.assertEqual(json.loads(client.get('/list').data), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
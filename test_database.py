@@ -0,0 +1,161 @@
+"""
+Tests for the pooled, request-scoped database connections.
+"""
+
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import unittest
+
+from flask import Flask
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import database
+
+
+class ConnectionPoolTestCase(unittest.TestCase):
+    """Test suite for database.get_db and the connection pool."""
+
+    def setUp(self):
+        self.db_fd, self.db_path = tempfile.mkstemp(suffix='.db')
+        self.original_path = database.DB_PATH
+        database.DB_PATH = self.db_path
+        database.init_db()
+
+        self.app = Flask(__name__)
+        database.init_app(self.app)
+
+    def tearDown(self):
+        database.get_pool().close_all()
+        database.DB_PATH = self.original_path
+        os.close(self.db_fd)
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(self.db_path + suffix):
+                os.unlink(self.db_path + suffix)
+
+    def test_same_connection_within_app_context(self):
+        """get_db returns one connection per app context."""
+        with self.app.app_context():
+            self.assertIs(database.get_db(), database.get_db())
+
+    def test_connection_returned_on_teardown(self):
+        """The request connection goes back to the pool and is reused."""
+        with self.app.app_context():
+            first = database.get_db()
+            self.assertEqual(database.pool_stats()['in_use'], 1)
+
+        stats = database.pool_stats()
+        self.assertEqual(stats['in_use'], 0)
+        self.assertEqual(stats['idle'], 1)
+
+        with self.app.app_context():
+            self.assertIs(database.get_db(), first)
+
+        self.assertEqual(database.pool_stats()['checkouts'], 2)
+        self.assertEqual(database.pool_stats()['open_connections'], 1)
+
+    def test_uncommitted_work_rolled_back_on_release(self):
+        """A request that forgets to commit does not leak its transaction."""
+        with self.app.app_context():
+            db = database.get_db()
+            db.execute("INSERT INTO memories (text) VALUES ('never committed')")
+
+        with self.app.app_context():
+            count = database.get_db().execute("SELECT COUNT(*) FROM memories").fetchone()[0]
+        self.assertEqual(count, 0)
+
+    def test_pool_is_bounded(self):
+        """Threads beyond max_size wait for a connection instead of opening one."""
+        pool = database.ConnectionPool(self.db_path, max_size=2, timeout=5)
+        held = [pool.acquire(), pool.acquire()]
+        acquired = []
+
+        def worker():
+            conn = pool.acquire()
+            acquired.append(conn)
+            pool.release(conn)
+
+        thread = threading.Thread(target=worker)
+        thread.start()
+        pool.release(held.pop())
+        thread.join(timeout=5)
+
+        self.assertEqual(len(acquired), 1)
+        self.assertEqual(pool.stats()['open_connections'], 2)
+        pool.release(held.pop())
+        pool.close_all()
+
+    def test_pool_timeout(self):
+        """Checkout fails with a clear error when the pool stays exhausted."""
+        pool = database.ConnectionPool(self.db_path, max_size=1, timeout=0.05)
+        conn = pool.acquire()
+        with self.assertRaises(RuntimeError):
+            pool.acquire()
+        pool.release(conn)
+        pool.close_all()
+
+    def test_standalone_connection_outside_app_context(self):
+        """Outside a request get_db returns a connection the caller owns."""
+        conn = database.get_db()
+        self.assertEqual(conn.execute("SELECT 1").fetchone()[0], 1)
+        conn.close()
+        self.assertEqual(database.pool_stats()['checkouts'], 0)
+
+    def test_profile_pragmas_applied(self):
+        """New connections use WAL and the profile's per-connection PRAGMAs."""
+        conn = database.connect()
+        self.assertEqual(conn.execute("PRAGMA journal_mode").fetchone()[0], 'wal')
+        self.assertEqual(conn.execute("PRAGMA synchronous").fetchone()[0], 1)  # NORMAL
+        self.assertEqual(conn.execute("PRAGMA busy_timeout").fetchone()[0], 5000)
+        conn.close()
+
+    def test_pragma_override_from_environment(self):
+        """DB_PRAGMA_* variables override single PRAGMAs of the profile."""
+        os.environ['DB_PRAGMA_BUSY_TIMEOUT'] = '1234'
+        try:
+            conn = database.connect()
+            self.assertEqual(conn.execute("PRAGMA busy_timeout").fetchone()[0], 1234)
+            conn.close()
+        finally:
+            del os.environ['DB_PRAGMA_BUSY_TIMEOUT']
+
+    def test_unknown_profile(self):
+        """An unknown profile name is rejected."""
+        with self.assertRaises(ValueError):
+            database.get_profile('turbo')
+
+    def test_snapshot_is_consistent_and_read_only(self):
+        """A WAL snapshot ignores later commits and rejects writes."""
+        writer = database.connect()
+        writer.execute("INSERT INTO memories (text) VALUES ('before')")
+        writer.commit()
+
+        with database.read_snapshot(mode='wal') as snap:
+            writer.execute("INSERT INTO memories (text) VALUES ('after')")
+            writer.commit()  # does not wait for the open snapshot
+            self.assertEqual(snap.execute("SELECT COUNT(*) FROM memories").fetchone()[0], 1)
+            with self.assertRaises(sqlite3.OperationalError):
+                snap.execute("INSERT INTO memories (text) VALUES ('nope')")
+
+        self.assertEqual(writer.execute("SELECT COUNT(*) FROM memories").fetchone()[0], 2)
+        writer.close()
+
+    def test_copy_snapshot(self):
+        """Copy mode reads from a scratch copy that is removed afterwards."""
+        writer = database.connect()
+        writer.execute("INSERT INTO memories (text) VALUES ('copied')")
+        writer.commit()
+        writer.close()
+
+        snapshot = database.read_snapshot(mode='copy')
+        with snapshot as snap:
+            self.assertEqual(snap.execute("SELECT text FROM memories").fetchone()[0], 'copied')
+            self.assertTrue(os.path.exists(snapshot.copy_path))
+        self.assertFalse(os.path.exists(snapshot.copy_path))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+"""
+Tests for facet counts and the pre-aggregated memory_facet_counts table.
+"""
+
+import os
+import random
+import sys
+import tempfile
+import unittest
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import database
+import facets
+
+
+class FacetsTestCase(unittest.TestCase):
+    """Test suite for facets."""
+
+    def setUp(self):
+        self.db_fd, self.db_path = tempfile.mkstemp(suffix='.db')
+        self.original_path = database.DB_PATH
+        database.DB_PATH = self.db_path
+        database.init_db()
+        database.migrate_db()
+        self.conn = database.connect()
+
+        rnd = random.Random(7)
+        self.conn.executemany(
+            "INSERT INTO memories (id, text, category, year) VALUES (?, ?, ?, ?)",
+            ((i, rnd.choice(['garden party', 'beach day', 'school trip']),
+              rnd.choice(['family', 'work', None]), rnd.choice([1955, 1961, 1968, 1972, None]))
+             for i in range(1, 201))
+        )
+        self.conn.executemany(
+            "INSERT INTO memory_people (memory_id, person_name) VALUES (?, ?)",
+            ((rnd.randint(1, 200), rnd.choice(['Jon', 'Mum', 'Dad', 'Peter Elger'])) for _ in range(300))
+        )
+        self.conn.commit()
+
+    def tearDown(self):
+        self.conn.close()
+        database.get_pool().close_all()
+        database.DB_PATH = self.original_path
+        os.close(self.db_fd)
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(self.db_path + suffix):
+                os.unlink(self.db_path + suffix)
+
+    def expected(self, category=None, decade=None, person=None, text=None):
+        """Facet counts computed the slow way, in Python."""
+        memories = {}
+        for memory_id, memory_text, memory_category, year in self.conn.execute(
+                "SELECT id, text, category, year FROM memories"):
+            if category is not None and memory_category != category:
+                continue
+            if decade is not None and (year is None or year // 10 * 10 != decade):
+                continue
+            if text is not None and text not in memory_text:
+                continue
+            memories[memory_id] = (memory_category, None if year is None else year // 10 * 10)
+        tags = [(memory_id, name) for memory_id, name in self.conn.execute(
+            "SELECT memory_id, person_name FROM memory_people") if memory_id in memories]
+        if person is not None:
+            tagged = {memory_id for memory_id, name in tags if name == person}
+            memories = {k: v for k, v in memories.items() if k in tagged}
+            tags = [(memory_id, name) for memory_id, name in tags if memory_id in tagged]
+        return len(memories), {
+            'category': Counter(c for c, _ in memories.values()),
+            'decade': Counter(d for _, d in memories.values()),
+            'person': Counter(name for _, name in tags),
+        }
+
+    def assertFacets(self, query=None, **filters):
+        total, counts = facets.facet_counts(self.conn, query=query, person_limit=50, **filters)
+        expected_total, expected = self.expected(text=query, **filters)
+        self.assertEqual(total, expected_total)
+        for facet in facets.FACETS:
+            self.assertEqual({item['value']: item['count'] for item in counts[facet]},
+                             dict(expected[facet]), facet)
+
+    def test_every_filter_combination(self):
+        for filters in ({}, {'category': 'work'}, {'decade': 1960}, {'category': 'family', 'decade': 1970},
+                        {'person': 'Jon'}, {'person': 'Mum', 'decade': 1950}, {'query': 'garden'},
+                        {'query': 'beach', 'category': 'work'}):
+            with self.subTest(**filters):
+                self.assertFacets(**filters)
+
+    def test_counts_follow_writes(self):
+        self.conn.execute("UPDATE memories SET category = 'war', year = 1941 WHERE id % 3 = 0")
+        self.conn.execute("UPDATE memory_people SET person_name = 'Aunt Sue' WHERE id % 5 = 0")
+        self.conn.execute("DELETE FROM memories WHERE id % 7 = 0")
+        self.conn.execute("DELETE FROM memory_people WHERE id % 11 = 0")
+        self.conn.commit()
+        for filters in ({}, {'category': 'war'}, {'decade': 1940}, {'category': 'work', 'decade': 1960}):
+            with self.subTest(**filters):
+                self.assertFacets(**filters)
+        orphans = self.conn.execute(
+            "SELECT COUNT(*) FROM memory_people WHERE memory_id NOT IN (SELECT id FROM memories)").fetchone()[0]
+        self.assertEqual(orphans, 0)
+
+    def test_person_facet_is_ranked_and_limited(self):
+        _, counts = facets.facet_counts(self.conn, person_limit=2)
+        people = counts['person']
+        self.assertEqual(len(people), 2)
+        self.assertGreaterEqual(people[0]['count'], people[1]['count'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+"""
+Tests for the FTS5 full-text indexes and the search paths built on them.
+"""
+
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import database
+import fts_index
+
+
+class FullTextIndexTestCase(unittest.TestCase):
+    """Test suite for fts_index."""
+
+    def setUp(self):
+        self.db_fd, self.db_path = tempfile.mkstemp(suffix='.db')
+        self.original_path = database.DB_PATH
+        database.DB_PATH = self.db_path
+        database.init_db()
+        database.migrate_db()
+        self.conn = database.connect()
+
+    def tearDown(self):
+        self.conn.close()
+        database.get_pool().close_all()
+        database.DB_PATH = self.original_path
+        os.close(self.db_fd)
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(self.db_path + suffix):
+                os.unlink(self.db_path + suffix)
+
+    def add_media(self, title, description='', people=''):
+        cursor = self.conn.execute(
+            "INSERT INTO media (filename, title, description, people) VALUES (?, ?, ?, ?)",
+            (f"{title}.jpg", title, description, people)
+        )
+        self.conn.commit()
+        return cursor.lastrowid
+
+    def media_ids(self, query):
+        return [row['id'] for row in fts_index.search_media(self.conn, query)]
+
+    def test_triggers_keep_index_in_sync(self):
+        """Inserts, updates and deletes on media reach the FTS table."""
+        media_id = self.add_media("Beach in Hastings")
+        self.assertEqual(self.media_ids('Hastings'), [media_id])
+
+        self.conn.execute("UPDATE media SET title = 'Pier at Brighton' WHERE id = ?", (media_id,))
+        self.conn.commit()
+        self.assertEqual(self.media_ids('Hastings'), [])
+        self.assertEqual(self.media_ids('Brighton'), [media_id])
+
+        self.conn.execute("DELETE FROM media WHERE id = ?", (media_id,))
+        self.conn.commit()
+        self.assertEqual(self.media_ids('Brighton'), [])
+
+    def test_ranking_prefers_more_terms(self):
+        """A media item matching more query terms ranks first."""
+        self.add_media("Seaside", "We went to the seaside")
+        both = self.add_media("Dad in London", "Dad by the seaside, near London")
+        self.assertEqual(self.media_ids('Where was Dad at the seaside?')[0], both)
+
+    def test_query_syntax_is_escaped(self):
+        """FTS operators and punctuation in user input are treated as text."""
+        self.add_media("The band played NEAR the pier")
+        for query in ['NEAR(', '"unbalanced', 'band AND OR', '*', 'col:band']:
+            with self.subTest(query=query):
+                fts_index.search_media(self.conn, query)
+        self.assertIsNone(fts_index.build_match_query('who was the?'))
+
+    def test_media_and_chat_indexes(self):
+        """Media metadata and chat messages are searchable."""
+        self.add_media('Wedding day', people='Yvonne Stiles')
+        self.conn.execute(
+            "INSERT INTO chat_messages (session_id, role, message) VALUES ('s1', 'user', 'Tell me about the wedding')"
+        )
+        self.conn.commit()
+        self.assertEqual(fts_index.search_media(self.conn, 'Yvonne')[0]['title'], 'Wedding day')
+        self.assertEqual(fts_index.search_chat(self.conn, 'wedding')[0]['session_id'], 's1')
+
+    def test_rebuild(self):
+        """rebuild() repopulates an index from its source table."""
+        self.add_media("Grandma's garden in Kent")
+        self.conn.execute("INSERT INTO media_fts(media_fts) VALUES ('delete-all')")
+        self.conn.commit()
+        self.assertEqual(self.media_ids('Kent'), [])
+        fts_index.rebuild(self.conn, 'media')
+        self.assertEqual(len(self.media_ids('Kent')), 1)
+
+    def test_memory_index_dropped(self):
+        """Memory writes no longer maintain an FTS table nothing reads."""
+        self.assertFalse(fts_index.fts_ready(self.conn, 'memories_fts'))
+        triggers = {row[0] for row in self.conn.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")}
+        self.assertFalse({t for t in triggers if t.startswith('memories_fts')})
+
+
+if __name__ == '__main__':
+    unittest.main()
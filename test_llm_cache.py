@@ -0,0 +1,95 @@
+"""
+Tests for the persistent LLM response cache.
+"""
+
+import os
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import database
+import llm_cache
+
+
+class LLMCacheTestCase(unittest.TestCase):
+    """Test suite for llm_cache."""
+
+    def setUp(self):
+        self.db_fd, self.db_path = tempfile.mkstemp(suffix='.db')
+        self.original_path = database.DB_PATH
+        database.DB_PATH = self.db_path
+        database.init_db()
+        database.migrate_db()
+        self.conn = database.connect()
+        self.calls = []
+
+    def tearDown(self):
+        self.conn.close()
+        database.get_pool().close_all()
+        database.DB_PATH = self.original_path
+        os.close(self.db_fd)
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(self.db_path + suffix):
+                os.unlink(self.db_path + suffix)
+
+    def ask(self, prompt, temperature=0.1, response=None, **kwargs):
+        messages = [{'role': 'user', 'content': prompt}]
+
+        def call():
+            self.calls.append(prompt)
+            return response if response is not None else {'answer': prompt.upper()}
+        return llm_cache.cached_call('deepseek', 'deepseek-chat', messages, call,
+                                     temperature=temperature, **kwargs)
+
+    def test_identical_prompts_call_once(self):
+        self.assertEqual(self.ask('where was jon born'), {'answer': 'WHERE WAS JON BORN'})
+        self.assertEqual(self.ask('where was jon born'), {'answer': 'WHERE WAS JON BORN'})
+        self.assertEqual(self.calls, ['where was jon born'])
+        # Any change to prompt or parameters is a different key
+        self.ask('where was jon born?')
+        self.ask('where was jon born', temperature=0.7)
+        self.assertEqual(len(self.calls), 3)
+
+    def test_hits_touch_used_at_at_most_hourly(self):
+        self.ask('where was jon born')
+        used_at = self.conn.execute("SELECT used_at FROM llm_cache").fetchone()[0]
+        self.ask('where was jon born')
+        # A fresh entry is read without a write
+        self.assertEqual(self.conn.execute("SELECT used_at FROM llm_cache").fetchone()[0], used_at)
+
+        stale = used_at - llm_cache.TOUCH_SECONDS
+        self.conn.execute("UPDATE llm_cache SET used_at = ?", (stale,))
+        self.conn.commit()
+        self.ask('where was jon born')
+        self.assertGreater(self.conn.execute("SELECT used_at FROM llm_cache").fetchone()[0], used_at)
+        self.assertEqual(self.calls, ['where was jon born'])
+
+    def test_failed_calls_are_not_cached(self):
+        def failing():
+            raise ValueError('not JSON')
+        messages = [{'role': 'user', 'content': 'x'}]
+        with self.assertRaises(ValueError):
+            llm_cache.cached_call('deepseek', 'deepseek-chat', messages, failing)
+        self.assertEqual(self.conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0], 0)
+
+    def test_expiry_and_size_eviction(self):
+        self.ask('old', ttl=-1)
+        self.assertIsNone(llm_cache.get(self.conn, llm_cache.cache_key(
+            'deepseek', 'deepseek-chat', [{'role': 'user', 'content': 'old'}], temperature=0.1)))
+        for prompt in ('a', 'b', 'c'):
+            self.ask(prompt)
+            time.sleep(0.01)
+        # Entries last used over an hour ago; reading 'a' again refreshes it
+        self.conn.execute("UPDATE llm_cache SET used_at = used_at - ?", (llm_cache.TOUCH_SECONDS,))
+        self.conn.commit()
+        self.ask('a')  # used last, so kept
+        self.assertEqual(llm_cache.prune(self.conn, max_entries=2), 2)
+        remaining = self.conn.execute("SELECT response FROM llm_cache ORDER BY used_at").fetchall()
+        self.assertEqual([row[0] for row in remaining], ['{"answer": "C"}', '{"answer": "A"}'])
+
+
+if __name__ == '__main__':
+    unittest.main()
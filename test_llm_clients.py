@@ -0,0 +1,108 @@
+"""
+Tests for the shared LLM client registry.
+"""
+
+import os
+import sys
+import unittest
+from unittest import mock
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import llm_clients
+from llm_clients import CircuitOpenError, ClientRegistry
+
+
+class StatusError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f'HTTP {status_code}')
+        self.status_code = status_code
+
+
+class LLMClientsTestCase(unittest.TestCase):
+    """Test suite for llm_clients."""
+
+    def setUp(self):
+        self.registry = ClientRegistry()
+        sleep = mock.patch.object(llm_clients.time, 'sleep')
+        self.sleep = sleep.start()
+        self.addCleanup(sleep.stop)
+
+    def flaky(self, *errors):
+        """A request failing with each error in turn, then answering 'ok'."""
+        errors = list(errors)
+        self.timeouts = []
+
+        def request(timeout):
+            self.timeouts.append(timeout.read)
+            if errors:
+                raise errors.pop(0)
+            return 'ok'
+        return request
+
+    def test_retries_transient_errors_within_budget(self):
+        request = self.flaky(httpx.ConnectError('reset'), StatusError(503))
+        self.assertEqual(self.registry.call('deepseek', 'chat', request), 'ok')
+        self.assertEqual(len(self.timeouts), 3)
+        self.assertLessEqual(self.timeouts[0], llm_clients.TIMEOUTS['chat'])
+        self.assertEqual(self.sleep.call_count, 2)
+        self.assertEqual(self.registry.stats()['deepseek']['retries'], 2)
+
+        # A bad request is the caller's fault: no retry, no breaker
+        with self.assertRaises(StatusError):
+            self.registry.call('deepseek', 'chat', self.flaky(StatusError(400)))
+        self.assertEqual(len(self.timeouts), 1)
+        self.assertEqual(self.registry.breakers['deepseek'].failures, 0)
+
+        with self.assertRaises(StatusError):
+            self.registry.call('deepseek', 'chat', self.flaky(*[StatusError(429)] * 5))
+        self.assertEqual(len(self.timeouts), llm_clients.MAX_RETRIES + 1)
+
+    def test_breaker_opens_then_recovers(self):
+        breaker = self.registry.breakers['anthropic']
+        down = self.flaky(*[httpx.ConnectTimeout('down')] * 100)
+        while breaker.state == 'closed':
+            with self.assertRaises(httpx.ConnectTimeout):
+                self.registry.call('anthropic', 'biography', down)
+        calls = len(self.timeouts)
+        self.assertEqual(calls, llm_clients.BREAKER_THRESHOLD * (llm_clients.MAX_RETRIES + 1))
+
+        # Open: rejected at once without touching the provider
+        with self.assertRaises(CircuitOpenError) as raised:
+            self.registry.call('anthropic', 'biography', down)
+        self.assertAlmostEqual(raised.exception.retry_after, breaker.reset_seconds, delta=1)
+        self.assertEqual(len(self.timeouts), calls)
+        self.assertEqual(self.registry.stats()['anthropic']['rejected'], 1)
+
+        # After the reset period one trial goes through and closes it
+        breaker.opened_at -= breaker.reset_seconds
+        self.assertEqual(self.registry.call('anthropic', 'biography', self.flaky()), 'ok')
+        self.assertEqual(breaker.stats(), {'state': 'closed', 'consecutive_failures': 0})
+        # The other provider was never affected
+        self.assertEqual(self.registry.breakers['deepseek'].state, 'closed')
+
+    def test_half_open_failure_reopens(self):
+        breaker = llm_clients.CircuitBreaker(threshold=1, reset_seconds=0)
+        breaker.failure()
+        self.assertTrue(breaker.allow())   # the trial call
+        self.assertFalse(breaker.allow())  # nobody else while it runs
+        breaker.failure()
+        self.assertEqual(breaker.state, 'open')
+
+    def test_one_client_per_process(self):
+        with mock.patch.dict(os.environ, {'DEEPSEEK_API_KEY': 'test-key'}):
+            client = self.registry.get_client('deepseek')
+            self.assertIs(self.registry.get_client('deepseek'), client)
+            self.assertEqual(client.max_retries, 0)
+            with mock.patch.object(llm_clients.os, 'getpid', return_value=-1):
+                self.assertIsNot(self.registry.get_client('deepseek'), client)
+        with mock.patch.dict(os.environ, {'DEEPSEEK_API_KEY': ''}):
+            self.assertIsNone(self.registry.get_client('deepseek'))
+            with self.assertRaises(ValueError):
+                self.registry.create('deepseek', 'chat', model='deepseek-chat', messages=[])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+"""
+Tests for the database maintenance tasks and their schedule.
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import database
+import maintenance
+
+
+class MaintenanceTestCase(unittest.TestCase):
+    """Test suite for maintenance."""
+
+    def setUp(self):
+        self.db_fd, self.db_path = tempfile.mkstemp(suffix='.db')
+        os.close(self.db_fd)
+        os.unlink(self.db_path)  # init_db must create the file to set auto_vacuum
+        self.original_path = database.DB_PATH
+        database.DB_PATH = self.db_path
+        database.init_db()
+        database.migrate_db()
+        self.conn = database.connect()
+
+    def tearDown(self):
+        self.conn.close()
+        database.get_pool().close_all()
+        database.DB_PATH = self.original_path
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(self.db_path + suffix):
+                os.unlink(self.db_path + suffix)
+
+    def fill_and_delete(self, rows=400):
+        self.conn.executemany("INSERT INTO chat_messages (session_id, role, message) VALUES ('s', 'user', ?)",
+                              [('x' * 3000,)] * rows)
+        self.conn.commit()
+        self.conn.execute("DELETE FROM chat_messages")
+        self.conn.commit()
+
+    def test_new_databases_use_incremental_vacuum(self):
+        self.assertEqual(maintenance.status(self.conn)['auto_vacuum'], 'INCREMENTAL')
+
+    def test_incremental_vacuum_and_checkpoint_reclaim_space(self):
+        self.fill_and_delete()
+        self.assertGreater(maintenance.pragma(self.conn, 'freelist_count'), 100)
+        results = maintenance.run_maintenance(['incremental_vacuum', 'checkpoint'], force=True)
+        self.assertEqual([r['status'] for r in results], ['ok', 'ok'])
+        self.assertEqual(maintenance.pragma(self.conn, 'freelist_count'), 0)
+        self.assertGreater(sum(r['bytes_reclaimed'] for r in results), 1024 * 1024)
+
+    def test_schedule_skips_tasks_that_ran_recently(self):
+        first = maintenance.run_maintenance()
+        self.assertEqual([r['task'] for r in first], list(maintenance.SCHEDULE))
+        self.assertEqual(maintenance.run_maintenance(), [])
+        self.assertEqual(len(maintenance.run_maintenance(['analyze'], force=True)), 1)
+
+    def test_runs_are_logged(self):
+        maintenance.run_maintenance(['analyze', 'optimize'], force=True)
+        runs = maintenance.recent_runs(self.conn)
+        self.assertEqual([r['task'] for r in runs], ['optimize', 'analyze'])
+        self.assertTrue(all(r['status'] == 'ok' and r['duration_ms'] is not None for r in runs))
+
+    def test_enable_incremental_converts_old_database(self):
+        self.conn.execute("PRAGMA auto_vacuum = NONE")
+        self.conn.execute("VACUUM")
+        self.assertEqual(maintenance.status(self.conn)['auto_vacuum'], 'NONE')
+        result, = maintenance.run_maintenance(['vacuum'], force=True)
+        self.assertEqual(result['status'], 'ok')
+        self.assertEqual(maintenance.status(self.conn)['auto_vacuum'], 'INCREMENTAL')
+
+    def test_unknown_task(self):
+        with self.assertRaises(ValueError):
+            maintenance.run_maintenance(['defrag'], force=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+"""
+Tests for the transactional bulk memory/media link writes.
+"""
+
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import database
+from media_links import bulk_link, normalize_links
+
+
+class BulkLinkTestCase(unittest.TestCase):
+    """Test suite for media_links."""
+
+    def setUp(self):
+        self.db_fd, self.db_path = tempfile.mkstemp(suffix='.db')
+        self.original_path = database.DB_PATH
+        database.DB_PATH = self.db_path
+        database.init_db()
+        database.migrate_db()
+        self.conn = database.connect()
+
+    def tearDown(self):
+        self.conn.close()
+        database.get_pool().close_all()
+        database.DB_PATH = self.original_path
+        os.close(self.db_fd)
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(self.db_path + suffix):
+                os.unlink(self.db_path + suffix)
+
+    def links(self, memory_id):
+        return [row[0] for row in self.conn.execute(
+            'SELECT media_id FROM memory_media WHERE memory_id = ? ORDER BY display_order',
+            (memory_id,))]
+
+    def test_normalize_accepts_api_shapes(self):
+        expected = [(1, [3, 5]), (2, [4])]
+        self.assertEqual(normalize_links({'1': [3, 5, 3], '2': ['4']}), expected)
+        self.assertEqual(normalize_links([{'memory_id': 1, 'media_ids': [3]},
+                                          {'memory_id': 2, 'media_ids': [4]},
+                                          {'memory_id': 1, 'media_ids': [5]}]), expected)
+        with self.assertRaises(ValueError):
+            normalize_links([{'memory_id': 'x', 'media_ids': [1]}])
+
+    def test_replace_sets_exact_order(self):
+        bulk_link(self.conn, {1: [9, 8], 2: [7]})
+        result = bulk_link(self.conn, {1: [3, 2, 1]})
+        self.assertEqual(result, {'memories': 1, 'links': 3})
+        self.assertEqual(self.links(1), [3, 2, 1])
+        self.assertEqual(self.links(2), [7])
+
+    def test_append_keeps_existing_links(self):
+        bulk_link(self.conn, {1: [1, 2]})
+        result = bulk_link(self.conn, {1: [2, 3], 2: [4]}, replace=False)
+        self.assertEqual(result['links'], 2)
+        self.assertEqual(self.links(1), [1, 2, 3])
+        self.assertEqual(self.links(2), [4])
+
+    def test_failure_rolls_back_every_memory(self):
+        bulk_link(self.conn, {1: [1], 2: [2]})
+        self.conn.execute('''CREATE TRIGGER reject_media AFTER INSERT ON memory_media
+                             WHEN new.media_id = 99 BEGIN SELECT RAISE(ABORT, 'bad media'); END''')
+        with self.assertRaises(sqlite3.IntegrityError):
+            bulk_link(self.conn, {1: [5], 2: [99]})
+        self.assertFalse(self.conn.in_transaction)
+        self.assertEqual(self.links(1), [1])
+        self.assertEqual(self.links(2), [2])
+
+    def test_caller_transaction_is_left_to_the_caller(self):
+        self.conn.execute('BEGIN')
+        self.conn.execute("INSERT INTO memory_media (memory_id, media_id) VALUES (3, 30)")
+        bulk_link(self.conn, {1: [1]})
+        self.assertTrue(self.conn.in_transaction)
+        self.conn.rollback()
+        self.assertEqual(self.links(1), [])
+        self.assertEqual(self.links(3), [])
+
+        self.conn.execute('''CREATE TRIGGER reject_media AFTER INSERT ON memory_media
+                             WHEN new.media_id = 99 BEGIN SELECT RAISE(ABORT, 'bad media'); END''')
+        self.conn.execute('BEGIN')
+        self.conn.execute("INSERT INTO memory_media (memory_id, media_id) VALUES (3, 30)")
+        with self.assertRaises(sqlite3.IntegrityError):
+            bulk_link(self.conn, {1: [5], 2: [99]})
+        # Only bulk_link's own writes are undone
+        self.assertTrue(self.conn.in_transaction)
+        self.assertEqual(self.links(1), [])
+        self.conn.commit()
+        self.assertEqual(self.links(3), [30])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+"""
+Tests for people and tags extracted into memory_people and memory_tags.
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import database
+import memory_entities
+import memory_tokens
+
+
+class MemoryEntitiesTestCase(unittest.TestCase):
+    """Test suite for memory_entities."""
+
+    def setUp(self):
+        self.db_fd, self.db_path = tempfile.mkstemp(suffix='.db')
+        self.original_path = database.DB_PATH
+        database.DB_PATH = self.db_path
+        database.init_db()
+        database.migrate_db()
+        self.conn = database.connect()
+
+    def tearDown(self):
+        self.conn.close()
+        database.get_pool().close_all()
+        database.DB_PATH = self.original_path
+        os.close(self.db_fd)
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(self.db_path + suffix):
+                os.unlink(self.db_path + suffix)
+
+    def save(self, memory_id, text, **fields):
+        """Insert or edit a memory the way the routes do."""
+        columns = dict(fields, id=memory_id, text=text)
+        self.conn.execute(
+            f"INSERT OR REPLACE INTO memories ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+            list(columns.values())
+        )
+        tokens = memory_tokens.store(self.conn, memory_id, text)
+        memory_entities.store(self.conn, memory_id, tokens)
+        self.conn.commit()
+
+    def people(self, memory_id):
+        return sorted(row[0] for row in self.conn.execute(
+            "SELECT person_name FROM memory_people WHERE memory_id = ?", (memory_id,)))
+
+    def tags(self, memory_id):
+        return sorted(row[0] for row in self.conn.execute(
+            "SELECT tag FROM memory_tags WHERE memory_id = ?", (memory_id,)))
+
+    def test_extracts_people_and_tags_on_save(self):
+        self.save(1, 'Christmas dinner with Grandma Rose. Peter Elger carved the turkey.',
+                  people='Jon, peter elger', places='Hastings')
+        self.assertEqual(self.people(1), ['Grandma Rose', 'Jon', 'Peter Elger'])
+        tags = self.tags(1)
+        self.assertIn('turkey', tags)
+        self.assertIn('hastings', tags)
+        self.assertNotIn('peter', tags)
+        self.assertNotIn('Christmas', self.people(1))
+
+    def test_dates_do_not_become_people(self):
+        self.save(1, 'On Boxing Day Peter came. In March Mary came. We went on Bank Holiday Monday.')
+        self.assertEqual(self.people(1), ['Mary', 'Peter'])
+
+    def test_edit_replaces_only_extracted_rows(self):
+        self.save(1, 'Fishing with Uncle Albert')
+        self.conn.execute("INSERT INTO memory_people (memory_id, person_name) VALUES (1, 'Dad')")
+        self.conn.commit()
+
+        self.save(1, 'Fishing with Aunt Vera and Dad')
+        self.assertEqual(self.people(1), ['Aunt Vera', 'Dad'])  # hand-tagged Dad is not doubled
+        self.save(1, 'Fishing alone')
+        self.assertEqual(self.people(1), ['Dad'])
+
+        self.conn.execute("DELETE FROM memories WHERE id = 1")
+        self.conn.commit()
+        self.assertEqual((self.people(1), self.tags(1)), ([], []))
+
+    def test_backfill_resumes_after_interruption(self):
+        self.conn.executemany("INSERT INTO memories (id, text) VALUES (?, ?)",
+                              [(i, f'Wedding of Mary Clarke number {i}') for i in range(1, 8)])
+        self.conn.commit()
+
+        store = memory_entities.store
+        calls = []
+
+        def failing_store(conn, memory_id, tokens):
+            calls.append(memory_id)
+            if len(calls) == 6:
+                raise RuntimeError('killed')
+            return store(conn, memory_id, tokens)
+
+        with mock.patch.object(memory_entities, 'store', failing_store):
+            with self.assertRaises(RuntimeError):
+                memory_entities.backfill(self.conn, batch=2)
+        self.conn.rollback()
+        self.assertEqual(memory_entities.progress(self.conn), 4)
+        self.assertEqual(self.people(4), ['Mary Clarke'])
+        self.assertEqual(self.people(5), [])
+
+        self.assertEqual(memory_entities.backfill(self.conn, batch=2), 3)
+        self.assertEqual(memory_entities.progress(self.conn), 7)
+        self.assertEqual(self.people(7), ['Mary Clarke'])
+        self.assertEqual(memory_entities.backfill(self.conn, batch=2), 0)
+        self.assertEqual(memory_entities.backfill(self.conn, batch=2, restart=True), 7)
+        count = self.conn.execute("SELECT COUNT(*) FROM memory_people").fetchone()[0]
+        self.assertEqual(count, 7)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+"""
+Tests for the shared tokenizer and the tokens stored per memory.
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import database
+import memory_tokens
+import tokenizer
+from search_index import MemoryIndex
+
+
+class TokenizerTestCase(unittest.TestCase):
+    """Test suite for tokenizer."""
+
+    def test_normalize_and_terms(self):
+        self.assertEqual(tokenizer.normalize("  Where was Dad BORN?"), 'where was dad born')
+        self.assertEqual(tokenizer.terms("Where was Dad born, Dad?"), ['dad', 'born', 'dad'])
+
+    def test_keywords_by_frequency(self):
+        text = "The garden party. Garden games, then cake in the garden with cake."
+        self.assertEqual(tokenizer.keywords(text)[:2], ['garden', 'cake'])
+
+    def test_names(self):
+        self.assertEqual(tokenizer.names("We met Peter Elger in Hastings. Then the Smiths came. Peter Elger left."),
+                         ['Peter Elger', 'Smiths'])
+
+    def test_calendar_words_are_stripped_from_names(self):
+        self.assertEqual(tokenizer.names("On Boxing Day Peter came."), ['Peter'])
+        self.assertEqual(tokenizer.names("In March Mary came. We went on Bank Holiday Monday."), ['Mary'])
+        self.assertEqual(tokenizer.names("On Christmas Eve Uncle Bob sang."), ['Uncle Bob'])
+        self.assertEqual(tokenizer.names("It was New Year's Eve."), [])
+
+    def test_may_is_a_month_only_in_context(self):
+        self.assertEqual(tokenizer.names("We married on 5 May. Aunt May came in May."), ['Aunt May'])
+        self.assertEqual(tokenizer.names("In May Peter left. Then we met May."), ['Peter', 'May'])
+        self.assertEqual(tokenizer.names("We saw Peter and May in May 1965."), ['Peter', 'May'])
+
+
+class MemoryTokensTestCase(unittest.TestCase):
+    """Test suite for memory_tokens."""
+
+    def setUp(self):
+        self.db_fd, self.db_path = tempfile.mkstemp(suffix='.db')
+        self.original_path = database.DB_PATH
+        database.DB_PATH = self.db_path
+        database.init_db()
+        self.conn = database.connect()
+        self.conn.execute("INSERT INTO memories (id, text) VALUES (1, 'Christmas with Aunt Mary')")
+        self.conn.commit()
+        database.migrate_db()
+
+    def tearDown(self):
+        self.conn.close()
+        database.get_pool().close_all()
+        database.DB_PATH = self.original_path
+        os.close(self.db_fd)
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(self.db_path + suffix):
+                os.unlink(self.db_path + suffix)
+
+    def stored(self):
+        return [row[0] for row in self.conn.execute("SELECT memory_id FROM memory_tokens ORDER BY memory_id")]
+
+    def test_migration_backfills_existing_memories(self):
+        self.assertEqual(self.stored(), [1])
+        self.assertEqual(memory_tokens.load(self.conn, [1])[1].names, ['Aunt Mary'])
+
+    def test_text_change_drops_stored_row_until_refresh(self):
+        memory_tokens.store(self.conn, 2, 'placeholder')
+        self.conn.execute("INSERT INTO memories (id, text) VALUES (2, 'Fishing at Rye')")
+        self.conn.execute("UPDATE memories SET text = 'Sailing at Rye' WHERE id = 1")
+        self.conn.commit()
+        self.assertEqual(self.stored(), [2])
+        self.assertEqual(memory_tokens.load(self.conn)[1].terms, ['sailing', 'rye'])
+
+        self.assertEqual(memory_tokens.refresh(self.conn), 1)
+        self.assertEqual(self.stored(), [1, 2])
+        self.conn.execute("DELETE FROM memories WHERE id = 2")
+        self.conn.commit()
+        self.assertEqual(self.stored(), [1])
+
+    def test_search_index_reads_stored_terms(self):
+        # Stored terms win over the text, so the index never re-tokenizes it
+        memory_tokens.store(self.conn, 1, 'Boxing Day walk')
+        self.conn.commit()
+        index = MemoryIndex()
+        index.build(self.conn)
+        self.assertEqual(index.search('boxing'), index.search('walk'))
+        self.assertEqual(index.search('christmas'), [])
+
+        self.conn.execute("UPDATE memory_tokens SET version = version - 1")
+        self.conn.commit()
+        index.build(self.conn)
+        self.assertEqual([memory_id for memory_id, _ in index.search('christmas')], [1])
+
+
+if __name__ == '__main__':
+    unittest.main()
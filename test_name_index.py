@@ -0,0 +1,123 @@
+"""
+Tests for the trigram name index.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import backup
+import database
+import name_index
+from name_index import NameIndex, split_people
+
+
+class NameIndexTestCase(unittest.TestCase):
+    """Test suite for name_index."""
+
+    def setUp(self):
+        self.db_fd, self.db_path = tempfile.mkstemp(suffix='.db')
+        self.original_path = database.DB_PATH
+        database.DB_PATH = self.db_path
+        database.init_db()
+        database.migrate_db()
+        self.conn = database.connect()
+        self.index = NameIndex()
+
+    def tearDown(self):
+        self.conn.close()
+        database.get_pool().close_all()
+        database.DB_PATH = self.original_path
+        os.close(self.db_fd)
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(self.db_path + suffix):
+                os.unlink(self.db_path + suffix)
+
+    def add_memory(self, text, people=()):
+        cursor = self.conn.execute("INSERT INTO memories (text) VALUES (?)", (text,))
+        for name in people:
+            self.conn.execute("INSERT INTO memory_people (memory_id, person_name) VALUES (?, ?)",
+                              (cursor.lastrowid, name))
+        self.conn.commit()
+        return cursor.lastrowid
+
+    def names(self, query):
+        return [match['name'] for match in self.index.lookup(query)]
+
+    def test_split_people(self):
+        self.assertEqual(split_people("Jon, Mum and Dad"), ['Jon', 'Mum', 'Dad'])
+
+    def test_misspelled_name_finds_memory(self):
+        memory_id = self.add_memory("Dinner with Peter Elger at the pub")
+        self.add_memory("Aunt Mary came to stay")
+        self.index.build(self.conn)
+        match = self.index.lookup("peter elgar")[0]
+        self.assertEqual(match['name'], 'Peter Elger')
+        self.assertEqual(match['memory_ids'], [memory_id])
+        self.assertGreater(match['similarity'], 0.5)
+        self.assertEqual(self.index.lookup("Zebedee"), [])
+
+    def test_sync_follows_memories_tags_and_media(self):
+        self.index.build(self.conn)
+        memory_id = self.add_memory("Christmas dinner", people=["Grandpa Joe"])
+        media_id = self.conn.execute(
+            "INSERT INTO media (filename, people) VALUES ('a.jpg', 'Jon, Auntie Sue')").lastrowid
+        self.conn.commit()
+        self.index.sync(self.conn)
+        self.assertEqual(self.index.lookup("Grandpa Joe")[0]['memory_ids'], [memory_id])
+        self.assertEqual(self.index.lookup("Auntie Sue")[0]['media_ids'], [media_id])
+
+        self.conn.execute("UPDATE media SET people = 'Jon' WHERE id = ?", (media_id,))
+        self.conn.execute("DELETE FROM memory_people WHERE memory_id = ?", (memory_id,))
+        self.conn.commit()
+        self.index.sync(self.conn)
+        self.assertNotIn('Auntie Sue', self.names("Auntie Sue"))
+        self.assertNotIn('Grandpa Joe', self.names("Grandpa Joe"))
+        self.assertIn('Jon', self.names("Jon"))
+
+        rebuilt = NameIndex()
+        rebuilt.build(self.conn)
+        self.assertEqual(self.index.grams, rebuilt.grams)
+
+    def test_restore_from_older_backup_forces_rebuild(self):
+        backup_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, backup_dir)
+        self.add_memory("Tea", people=["Aunt Mary"])
+        report = backup.create_backup(backup_dir=backup_dir)
+        for _ in range(3):
+            self.add_memory("Fishing", people=["Grandpa Joe"])
+        self.index.build(self.conn)
+
+        backup.restore_backup(report['path'], backup_dir=backup_dir)
+        memory_id = self.add_memory("Dancing", people=["Cousin Lil"])  # reuses a restored-away id
+        self.index.sync(self.conn)
+        self.assertNotIn('Grandpa Joe', self.names("Grandpa Joe"))
+        self.assertEqual(self.index.lookup("Cousin Lil")[0]['memory_ids'], [memory_id])
+        self.assertIn('Aunt Mary', self.names("Aunt Mary"))
+
+    def test_lookup_is_sub_millisecond(self):
+        first = ['Peter', 'Mary', 'John', 'Susan', 'David', 'Ann', 'George', 'Ruth']
+        last = ['Elger', 'Smith', 'Clarke', 'Jones', 'Brown', 'Taylor', 'Wilson', 'Evans']
+        self.conn.executemany("INSERT INTO memories (id, text) VALUES (?, 'a memory')",
+                              ((i,) for i in range(1, 2001)))
+        self.conn.executemany(
+            "INSERT INTO memory_people (memory_id, person_name) VALUES (?, ?)",
+            ((i, f"{first[i % 8]} {last[i // 8 % 8]}{i // 64}") for i in range(1, 2001))
+        )
+        self.conn.commit()
+        index = name_index.get_index(self.conn)
+        self.assertEqual(len(index), 2000)
+        index.lookup("Peter Elgar")
+        start = time.perf_counter()
+        for _ in range(100):
+            index.lookup("Peter Elgar")
+        self.assertLess((time.perf_counter() - start) / 100, 0.001)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+"""
+Tests for the versioned search result cache.
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import database
+import search_index
+from query_cache import MISSING, QueryCache
+
+
+class QueryCacheTestCase(unittest.TestCase):
+    """Test suite for query_cache."""
+
+    def test_lru_eviction_and_stats(self):
+        cache = QueryCache(maxsize=2)
+        cache.put('a', 1, 'A')
+        cache.put('b', 1, 'B')
+        self.assertEqual(cache.get('a', 1), 'A')  # b is now least recent
+        cache.put('c', 1, 'C')
+        self.assertIs(cache.get('b', 1), MISSING)
+        self.assertEqual(cache.get('c', 1), 'C')
+
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['evictions']), (2, 1, 1))
+        self.assertEqual(stats['size'], 2)
+        self.assertEqual(stats['hit_rate'], 0.667)
+
+    def test_version_change_empties_cache(self):
+        cache = QueryCache()
+        cache.put('a', 1, 'A')
+        self.assertIs(cache.get('a', 2), MISSING)
+        cache.put('a', 2, 'A2')
+        self.assertIs(cache.get('a', 1), MISSING)  # restored from an older backup
+        self.assertEqual(cache.stats()['invalidations'], 2)
+
+
+class DataVersionTestCase(unittest.TestCase):
+    """The cache version moves with every memory write."""
+
+    def setUp(self):
+        self.db_fd, self.db_path = tempfile.mkstemp(suffix='.db')
+        self.original_path = database.DB_PATH
+        database.DB_PATH = self.db_path
+        database.init_db()
+        database.migrate_db()
+        self.conn = database.connect()
+
+    def tearDown(self):
+        self.conn.close()
+        database.get_pool().close_all()
+        database.DB_PATH = self.original_path
+        os.close(self.db_fd)
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(self.db_path + suffix):
+                os.unlink(self.db_path + suffix)
+
+    def test_every_memory_write_moves_version(self):
+        versions = [search_index.data_version(self.conn)]
+        for sql in ("INSERT INTO memories (id, text) VALUES (1, 'Born in Hastings')",
+                    "UPDATE memories SET category = 'Childhood' WHERE id = 1",
+                    "UPDATE memories SET year = 1950 WHERE id = 1",
+                    "INSERT INTO memory_people (memory_id, person_name) VALUES (1, 'Jon')",
+                    "DELETE FROM memories WHERE id = 1"):
+            self.conn.execute(sql)
+            self.conn.commit()
+            versions.append(search_index.data_version(self.conn))
+        self.assertEqual(versions, sorted(set(versions)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,265 @@
+"""
+EXPLAIN QUERY PLAN regression suite for the hot production queries.
+
+Every query is imported from the module that runs it, so the suite
+checks the SQL that actually ships. It fails if any of them scans a
+whole table, directly or through an index with no constraint, or if a
+query whose ORDER BY is meant to be served by an index starts sorting
+in a temporary B-tree.
+"""
+
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import ai_photo_matcher
+import ai_search
+import auth
+import categorizer
+import data_access
+import database
+import facets
+import fts_index
+import llm_cache
+import memory_entities
+import memory_tokens
+import name_index
+import pdf_generator
+import search_engine
+import search_index
+from media_links import MAX_ORDER_SQL
+
+try:
+    import biography_pdf_generator
+except (ImportError, OSError):  # WeasyPrint or its system libraries missing
+    biography_pdf_generator = None
+
+
+def _ids(n):
+    return ','.join('?' * n)
+
+
+def _memory_where(n):
+    return f"WHERE m.id IN ({_ids(n)})"
+
+
+_PEOPLE = memory_entities._TABLES['people']
+_MEDIA_LOG = name_index.CHANGE_LOGS['media']
+
+# name -> (sql, params, order_by_from_index)
+PRODUCTION_QUERIES = {
+    'get_memory': (data_access.MEMORY_SQL, (1,), False),
+    'get_memory_media': (data_access.MEMORY_MEDIA.sql, (1,), True),
+    'linked_media': (pdf_generator._LINKED_MEDIA_SQL, (1,), True),
+    'max_display_order': (MAX_ORDER_SQL, (1,), False),
+    'unlinked_photos': (data_access.UNLINKED_PHOTOS.sql, (1,), True),
+    'suggest_photos_candidates': (ai_photo_matcher._CANDIDATES_SQL, (1,), False),
+    'ai_context_memories': (
+        ai_search._CONTEXT_SQL.format(where=_memory_where(2)), (1, 2), False),
+    'ai_context_people': (
+        ai_search._CONTEXT_PEOPLE_SQL.format(placeholders=_ids(2)), (1, 2), False),
+    'llm_cache_get': (llm_cache._GET_SQL, ('k', 0), False),
+    'llm_cache_prune_expired': (llm_cache._PRUNE_EXPIRED_SQL, (0,), False),
+    'categorizer_claim': (
+        categorizer._CLAIM_SQL, ('refining', 1.0, 'provisional', 'refining', 0.0, 10), False),
+    'categorizer_status': (categorizer._STATUS_SQL, (1,), False),
+    'delete_memory_comments': (data_access.DELETE_MEMORY_COMMENTS_SQL, (1,), False),
+    'delete_memory_links': (data_access.DELETE_MEMORY_LINKS_SQL, (1,), False),
+    'delete_audio_transcription': (data_access.DELETE_TRANSCRIPTION_SQL, ('a.webm',), False),
+    'update_transcription': (data_access.UPDATE_TRANSCRIPTION_SQL, ('text', 'a.webm'), False),
+    'delete_media_links': (data_access.DELETE_MEDIA_LINKS_SQL, (1,), False),
+    'memory_entities_extracted': (
+        memory_entities._EXTRACTED_SQL.format(table=_PEOPLE[0], column=_PEOPLE[1]), (1, 'text'), False),
+    'memory_entities_insert': (
+        memory_entities._INSERT_SQL.format(table=_PEOPLE[0], column=_PEOPLE[1]), (1, 'Peter', 'text'), False),
+    'memory_entities_backfill_batch': (memory_entities._BATCH_SQL, (0, 500), True),
+    'chat_history': (data_access.CHAT_HISTORY_SQL, ('abc', 20), True),
+    'search_page': (
+        search_engine._PAGE_SQL.format(placeholders=_ids(3)), (1, 2, 3), False),
+    'search_index_changes': (search_index._CHANGES_SQL, (10,), True),
+    'search_index_reload': (
+        search_index._DOCS_SQL.format(where=_memory_where(3)), (1, 2, 3), False),
+    'name_index_media_changes': (
+        name_index._CHANGES_SQL.format(table=_MEDIA_LOG[0], column=_MEDIA_LOG[1]), (10,), True),
+    'name_index_memory_reload': (
+        name_index._MEMORY_DOCS_SQL.format(where=_memory_where(3)), (1, 2, 3), False),
+    'name_index_media_reload': (
+        name_index._MEDIA_DOCS_SQL.format(where=f"AND id IN ({_ids(3)})"), (1, 2, 3), False),
+    'memory_tokens_load': (
+        memory_tokens._LOAD_SQL.format(where=_memory_where(3)), (1, 2, 3), False),
+    # facets.facet_counts, category and decade filters
+    'facets_cells': (
+        facets._CELL_SQL.format(where=" AND category = ? AND decade = ?"),
+        ('family', '1960') * 3 + (20, 'family', '1960'), False),
+    # facets.facet_counts, category and person filters
+    'facets_hits': (
+        facets._HITS_SQL.format(where="m.category = ? AND m.id IN "
+                                      "(SELECT memory_id FROM memory_people WHERE person_name = ? COLLATE NOCASE)"),
+        ('family', 'Person 1', 20), False),
+    'search_media_fts': (fts_index._MEDIA_SEARCH_SQL, ('"t1"', 50), False),
+    'search_chat_fts': (fts_index._CHAT_SEARCH_SQL, ('"message"', 10), False),
+    'user_by_username': (auth._LOGIN_SQL, ('jon',), False),
+}
+
+# Queries that read every row of a table by contract: list endpoints,
+# exports and once-per-process index builds. Ordered ones must still
+# read in index order.
+FULL_SCAN_ALLOWED = {
+    'scan_existing_uploads': (data_access.MEDIA_FILENAMES_SQL, (), False),
+    'get_memories': (data_access.MEMORY_TIMELINE.sql, (), True),
+    'biography_draft_memories': (data_access.BIOGRAPHY_MEMORIES_SQL, (), True),
+    'get_available_media': (data_access.AVAILABLE_MEDIA.sql, (), True),
+    'get_all_media': (data_access.MEDIA_LIBRARY.sql, (), True),
+    'ai_search_memories': (data_access.SEARCH_MEMORIES.sql, (), True),
+    'suggest_all_memory_ids': (ai_photo_matcher._MEMORY_IDS_SQL, (), False),
+    'album_memories': (pdf_generator._ALBUM_MEMORIES_SQL, (), True),
+    'album_linked_media': (pdf_generator._ALL_LINKED_MEDIA_SQL, (), True),
+    'album_photos': (pdf_generator._ALBUM_PHOTOS_SQL, (), True),
+    'categorizer_counts': (categorizer._COUNTS_SQL, (), False),
+    'user_count': (auth._USER_COUNT_SQL, (), False),
+    'search_index_build': (search_index._DOCS_SQL.format(where=''), (), False),
+    'name_index_memory_build': (name_index._MEMORY_DOCS_SQL.format(where=''), (), False),
+    'name_index_media_build': (name_index._MEDIA_DOCS_SQL.format(where=''), (), False),
+    'memory_tokens_refresh': (memory_tokens._STALE_SQL, (1, 500), False),
+    # facets.facet_counts with no filter: a few hundred pre-aggregated cells
+    'facets_all_cells': (facets._CELL_SQL.format(where=''), (20,), False),
+    # ai_search fallback with no scored memories: walks the year index, stops at LIMIT
+    'ai_context_newest': (
+        ai_search._CONTEXT_SQL.format(where="ORDER BY m.year DESC LIMIT ?"), (30,), True),
+}
+if biography_pdf_generator is not None:
+    FULL_SCAN_ALLOWED['biography_pdf_photos'] = (biography_pdf_generator._PHOTOS_SQL, (), True)
+
+# Lookups on the join tables no single query covers: checks that their
+# indexes exist, not a copy of any production statement
+INDEX_LOOKUPS = {
+    'memories_for_person': (
+        '''SELECT m.id, m.text FROM memory_people mp
+           JOIN memories m ON m.id = mp.memory_id
+           WHERE mp.person_name = ? COLLATE NOCASE''', ('Peter',), False),
+    'memory_tags_for_memory': (
+        'SELECT tag FROM memory_tags WHERE memory_id = ?', (1,), False),
+    'memories_for_tag': (
+        '''SELECT m.id, m.text FROM memory_tags mt
+           JOIN memories m ON m.id = mt.memory_id
+           WHERE mt.tag = ? COLLATE NOCASE''', ('wedding',), False),
+    'comments_for_memory': (
+        'SELECT author_name, comment_text FROM comments WHERE memory_id = ? ORDER BY created_at', (1,), True),
+}
+
+# A SCAN step without a constraint reads the whole table, whether from
+# the table itself or through an (even covering) index
+FULL_SCAN = re.compile(r'^SCAN (\w+)(?: AS \w+)?(?: USING (?:COVERING )?INDEX \w+)?$')
+
+
+def explain(conn, sql, params):
+    """Return the detail column of each EXPLAIN QUERY PLAN row."""
+    return [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+
+
+class QueryPlanTestCase(unittest.TestCase):
+    """Every production query must be answered through an index."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.db_fd, cls.db_path = tempfile.mkstemp(suffix='.db')
+        cls.original_path = database.DB_PATH
+        database.DB_PATH = cls.db_path
+        database.init_db()
+        database.migrate_db()
+
+        conn = sqlite3.connect(cls.db_path)
+        conn.executemany(
+            "INSERT INTO memories (text, category, year, created_at) VALUES (?, 'family', ?, ?)",
+            ((f"memory {i}", 1950 + i % 70, f"2024-01-{i % 28 + 1:02d}") for i in range(2000))
+        )
+        conn.executemany(
+            "INSERT INTO media (filename, file_type, title, year, created_at) VALUES (?, ?, ?, ?, ?)",
+            ((f"f{i}.jpg", 'image' if i % 4 else 'video', f"t{i}", 1950 + i % 70, f"2024-02-{i % 28 + 1:02d}")
+             for i in range(2000))
+        )
+        conn.executemany(
+            "INSERT INTO memory_media (memory_id, media_id, display_order) VALUES (?, ?, ?)",
+            ((i % 2000 + 1, i + 1, i % 5) for i in range(1500))
+        )
+        conn.executemany(
+            "INSERT INTO memory_people (memory_id, person_name) VALUES (?, ?)",
+            ((i % 2000 + 1, f"Person {i % 300}") for i in range(3000))
+        )
+        conn.executemany(
+            "INSERT INTO memory_tags (memory_id, tag) VALUES (?, ?)",
+            ((i % 2000 + 1, f"tag{i % 50}") for i in range(3000))
+        )
+        conn.executemany(
+            "INSERT INTO comments (memory_id, author_name, comment_text, created_at) VALUES (?, 'a', 'b', ?)",
+            ((i % 2000 + 1, f"2024-03-{i % 28 + 1:02d}") for i in range(1000))
+        )
+        conn.executemany(
+            "INSERT INTO chat_messages (session_id, role, message) VALUES (?, 'user', ?)",
+            ((f"s{i % 40}", f"message {i}") for i in range(2000))
+        )
+        conn.executemany(
+            "INSERT INTO audio_transcriptions (audio_filename, transcription_text) VALUES (?, '')",
+            ((f"voice_{i}.webm",) for i in range(500))
+        )
+        conn.commit()
+        conn.execute("ANALYZE")
+        conn.commit()
+        cls.conn = conn
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.conn.close()
+        database.get_pool().close_all()
+        database.DB_PATH = cls.original_path
+        os.close(cls.db_fd)
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(cls.db_path + suffix):
+                os.unlink(cls.db_path + suffix)
+
+    def test_migrations_recorded(self):
+        """The schema version matches the last migration."""
+        self.assertEqual(database.schema_version(self.conn), database.MIGRATIONS[-1][0])
+
+    def test_migrations_idempotent(self):
+        """Running migrations again applies nothing."""
+        conn = sqlite3.connect(self.db_path)
+        self.assertEqual(database.run_migrations(conn), [])
+        conn.close()
+
+    def test_no_full_table_scans(self):
+        """No production query falls back to a full table scan."""
+        for name, (sql, params, _) in {**PRODUCTION_QUERIES, **INDEX_LOOKUPS}.items():
+            with self.subTest(query=name):
+                plan = explain(self.conn, sql, params)
+                # Re-reading a CTE that was already materialized through an index is fine
+                materialized = {step.split()[1] for step in plan if step.startswith('MATERIALIZE ')}
+                scans = [step for step in plan
+                         if FULL_SCAN.match(step) and FULL_SCAN.match(step).group(1) not in materialized]
+                self.assertEqual(scans, [], f"{name} plan: {plan}")
+
+    def test_order_by_served_by_index(self):
+        """Sorted queries read rows in index order instead of sorting them."""
+        queries = {**PRODUCTION_QUERIES, **FULL_SCAN_ALLOWED, **INDEX_LOOKUPS}
+        for name, (sql, params, ordered) in queries.items():
+            if not ordered:
+                continue
+            with self.subTest(query=name):
+                plan = explain(self.conn, sql, params)
+                sorts = [step for step in plan if 'TEMP B-TREE' in step]
+                self.assertEqual(sorts, [], f"{name} plan: {plan}")
+
+    def test_allowed_full_scans_still_run(self):
+        """Queries allowed to scan still compile against the schema."""
+        for name, (sql, params, _) in FULL_SCAN_ALLOWED.items():
+            with self.subTest(query=name):
+                self.assertTrue(explain(self.conn, sql, params))
+
+
+if __name__ == '__main__':
+    unittest.main()
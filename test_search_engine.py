@@ -0,0 +1,87 @@
+"""
+Tests for ranked, paged smart search.
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+
+from flask import Flask
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import database
+from search_engine import EnhancedSearch, decode_cursor
+
+
+class EnhancedSearchTestCase(unittest.TestCase):
+    """Test suite for search_engine.EnhancedSearch."""
+
+    def setUp(self):
+        self.db_fd, self.db_path = tempfile.mkstemp(suffix='.db')
+        self.original_path = database.DB_PATH
+        database.DB_PATH = self.db_path
+        database.init_db()
+        database.migrate_db()
+
+        conn = database.connect()
+        # Relevance falls with the number of filler words; memories come
+        # in tied pairs to exercise the id tie-break
+        conn.executemany(
+            "INSERT INTO memories (id, text) VALUES (?, ?)",
+            ((i, 'garden ' + 'filler ' * (i // 2)) for i in range(1, 61))
+        )
+        conn.execute("INSERT INTO memories (id, text) VALUES (100, 'Dinner with Peter Elger')")
+        conn.commit()
+        conn.close()
+
+        self.app = Flask(__name__)
+        database.init_app(self.app)
+        EnhancedSearch.cache.clear()
+        self.search = EnhancedSearch()
+
+    def tearDown(self):
+        database.get_pool().close_all()
+        database.DB_PATH = self.original_path
+        os.close(self.db_fd)
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(self.db_path + suffix):
+                os.unlink(self.db_path + suffix)
+
+    def test_pages_walk_full_ranking_in_order(self):
+        with self.app.app_context():
+            everything = self.search.search_memories('garden', threshold=0, limit=100)
+            pages, cursor = [], None
+            while True:
+                results, cursor = self.search.search_page('garden', threshold=0, limit=7, cursor=cursor)
+                pages.append(results)
+                if cursor is None:
+                    break
+
+        self.assertEqual(len(everything), 60)
+        self.assertEqual([len(page) for page in pages], [7] * 8 + [4])
+        self.assertEqual([r['id'] for page in pages for r in page], [r['id'] for r in everything])
+        order = [(-r['relevance_score'], r['id']) for r in everything]
+        self.assertEqual(order, sorted(order))
+
+    def test_default_is_top_ten_above_threshold(self):
+        with self.app.app_context():
+            results = self.search.search_memories('garden')
+        self.assertEqual(len(results), 10)
+        self.assertEqual(results[0]['relevance_score'], 100.0)
+
+    def test_name_query_tolerates_misspelling(self):
+        with self.app.app_context():
+            results = self.search.search_memories('Who was Peter Elgar?')
+        self.assertEqual(results[0]['id'], 100)
+
+    def test_bad_cursor(self):
+        with self.assertRaises(ValueError):
+            decode_cursor('not-a-cursor')
+        with self.app.app_context(), self.assertRaises(ValueError):
+            self.search.search_page('garden', cursor='bm90IGpzb24')
+
+
+if __name__ == '__main__':
+    unittest.main()
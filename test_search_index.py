@@ -0,0 +1,126 @@
+"""
+Tests for the incrementally maintained BM25 memory index.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import backup
+import database
+import search_index
+from search_index import MemoryIndex
+
+
+class MemoryIndexTestCase(unittest.TestCase):
+    """Test suite for search_index."""
+
+    def setUp(self):
+        self.db_fd, self.db_path = tempfile.mkstemp(suffix='.db')
+        self.original_path = database.DB_PATH
+        database.DB_PATH = self.db_path
+        database.init_db()
+        database.migrate_db()
+        self.conn = database.connect()
+        self.index = MemoryIndex()
+
+    def tearDown(self):
+        self.conn.close()
+        database.get_pool().close_all()
+        database.DB_PATH = self.original_path
+        os.close(self.db_fd)
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(self.db_path + suffix):
+                os.unlink(self.db_path + suffix)
+
+    def add_memory(self, text, people=()):
+        cursor = self.conn.execute("INSERT INTO memories (text) VALUES (?)", (text,))
+        for name in people:
+            self.conn.execute("INSERT INTO memory_people (memory_id, person_name) VALUES (?, ?)",
+                              (cursor.lastrowid, name))
+        self.conn.commit()
+        return cursor.lastrowid
+
+    def ids(self, query):
+        return [memory_id for memory_id, _ in self.index.search(query)]
+
+    def test_bm25_prefers_rarer_and_more_frequent_terms(self):
+        rye = self.add_memory("We went fishing at Rye, fishing all day")
+        self.add_memory("We went to the beach")
+        self.add_memory("We went to school")
+        self.index.build(self.conn)
+        self.assertEqual(self.ids("fishing trip we went on")[0], rye)
+        self.assertEqual(self.ids("Rye"), [rye])
+        self.assertEqual(self.ids("Where was it?"), [])
+
+    def test_people_tags_are_searchable(self):
+        memory_id = self.add_memory("Christmas dinner", people=["Peter Elger"])
+        self.index.build(self.conn)
+        self.assertEqual(self.ids("Who was Peter Elger?"), [memory_id])
+
+    def test_sync_applies_inserts_updates_and_deletes(self):
+        self.index.build(self.conn)
+        first = self.add_memory("Born in Hastings")
+        second = self.add_memory("Moved to Brighton")
+        self.assertEqual(self.index.sync(self.conn), 2)
+        self.assertEqual(self.ids("Hastings"), [first])
+
+        self.conn.execute("UPDATE memories SET text = 'Born in Canterbury' WHERE id = ?", (first,))
+        self.conn.execute("DELETE FROM memories WHERE id = ?", (second,))
+        self.conn.execute("INSERT INTO memory_people (memory_id, person_name) VALUES (?, 'Jon')", (first,))
+        self.conn.commit()
+        self.index.sync(self.conn)
+
+        self.assertEqual(self.ids("Hastings"), [])
+        self.assertEqual(self.ids("Canterbury Jon"), [first])
+        self.assertEqual(self.ids("Brighton"), [])
+        self.assertEqual(len(self.index), 1)
+        self.assertEqual(self.index.sync(self.conn), 0)
+
+    def test_incremental_matches_full_rebuild(self):
+        self.index.build(self.conn)
+        for i in range(30):
+            self.add_memory(f"memory {i} about the garden and {'dogs' if i % 3 else 'cats'}")
+        self.conn.execute("DELETE FROM memories WHERE id % 4 = 0")
+        self.conn.commit()
+        self.index.sync(self.conn)
+
+        rebuilt = MemoryIndex()
+        rebuilt.build(self.conn)
+        self.assertEqual(self.index.postings, rebuilt.postings)
+        self.assertEqual(self.index.total_len, rebuilt.total_len)
+        self.assertEqual(self.index.search("garden cats"), rebuilt.search("garden cats"))
+
+    def test_pruned_log_forces_rebuild(self):
+        self.index.build(self.conn)
+        memory_id = self.add_memory("Lived in Kent")
+        self.conn.execute("UPDATE memory_changes SET changed_at = '2000-01-01'")
+        self.conn.commit()
+        self.assertEqual(search_index.prune_changes(self.conn), 1)
+        self.index.sync(self.conn)
+        self.assertEqual(self.ids("Kent"), [memory_id])
+
+    def test_restore_from_older_backup_forces_rebuild(self):
+        backup_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, backup_dir)
+        apple = self.add_memory("An apple tree")
+        report = backup.create_backup(backup_dir=backup_dir)
+        for _ in range(5):
+            self.add_memory("A banana boat")
+        self.index.build(self.conn)
+        self.assertEqual(len(self.ids("banana")), 5)
+
+        backup.restore_backup(report['path'], backup_dir=backup_dir)
+        cherry = self.add_memory("A cherry pie")  # reuses a restored-away id
+        self.index.sync(self.conn)
+        self.assertEqual(self.ids("banana"), [])
+        self.assertEqual(self.ids("cherry"), [cherry])
+        self.assertEqual(self.ids("apple"), [apple])
+
+
+if __name__ == '__main__':
+    unittest.main()
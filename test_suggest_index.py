@@ -0,0 +1,122 @@
+"""
+Tests for the search-box prefix index.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import backup
+import database
+from suggest_index import SuggestIndex
+
+
+class SuggestIndexTestCase(unittest.TestCase):
+    """Test suite for suggest_index."""
+
+    def setUp(self):
+        self.db_fd, self.db_path = tempfile.mkstemp(suffix='.db')
+        self.original_path = database.DB_PATH
+        database.DB_PATH = self.db_path
+        database.init_db()
+        database.migrate_db()
+        self.conn = database.connect()
+        self.conn.executemany("INSERT INTO memories (id, text, category, places) VALUES (?, ?, ?, ?)", [
+            (1, 'Wedding', 'family', 'Hastings, Rye'),
+            (2, 'Fishing', 'holidays', 'Hastings'),
+            (3, 'Work', 'work', None),
+        ])
+        self.conn.executemany("INSERT INTO memory_people (memory_id, person_name) VALUES (?, ?)", [
+            (1, 'Peter Elger'), (2, 'Peter Elger'), (3, 'Peter Pan'), (1, 'Mary'),
+        ])
+        self.conn.execute(
+            "INSERT INTO media (id, filename, title, people) VALUES (1, 'a.jpg', 'Pier at Hastings', 'Mary, Jon')")
+        self.conn.commit()
+        self.index = SuggestIndex()
+        self.index.sync(self.conn)
+
+    def tearDown(self):
+        self.conn.close()
+        database.get_pool().close_all()
+        database.DB_PATH = self.original_path
+        os.close(self.db_fd)
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(self.db_path + suffix):
+                os.unlink(self.db_path + suffix)
+
+    def values(self, prefix, **kwargs):
+        return [(s['kind'], s['value'], s['count']) for s in self.index.complete(prefix, **kwargs)]
+
+    def test_prefix_of_any_word_ranked_by_count(self):
+        self.assertEqual(self.values('pe'), [('person', 'Peter Elger', 2), ('person', 'Peter Pan', 1)])
+        self.assertEqual(self.values('elg'), [('person', 'Peter Elger', 2)])
+        self.assertEqual(self.values('peter e'), [('person', 'Peter Elger', 2)])
+        # Whole-value completions come before later-word ones
+        self.assertEqual(self.values('h'), [('place', 'Hastings', 2), ('category', 'holidays', 1),
+                                            ('title', 'Pier at Hastings', 1)])
+        self.assertEqual(self.values('h', kinds=('title',)), [('title', 'Pier at Hastings', 1)])
+        self.assertEqual(self.values('mary'), [('person', 'Mary', 2)])  # tag and media people
+        self.assertEqual(self.values('zz'), [])
+
+    def test_completes_end_of_a_question(self):
+        replace, suggestions = self.index.suggest('Where was Peter El')
+        self.assertEqual(replace, 2)
+        self.assertEqual(suggestions[0]['value'], 'Peter Elger')
+        self.assertEqual(self.index.suggest('Where was'), (0, []))
+
+    def test_writes_are_picked_up_incrementally(self):
+        self.conn.execute("INSERT INTO memories (id, text, places) VALUES (4, 'Trip', 'Peterborough')")
+        self.conn.execute("DELETE FROM memory_people WHERE person_name = 'Peter Pan'")
+        self.conn.execute("UPDATE media SET title = 'Pebbles on the beach' WHERE id = 1")
+        self.conn.commit()
+        self.assertEqual(self.index.sync(self.conn), 3)
+        self.assertEqual(self.values('pe'), [('person', 'Peter Elger', 2), ('title', 'Pebbles on the beach', 1),
+                                             ('place', 'Peterborough', 1)])
+        self.assertEqual(self.values('pier'), [])
+
+        self.conn.execute("DELETE FROM memories WHERE id IN (1, 2)")
+        self.conn.commit()
+        self.index.sync(self.conn)
+        self.assertEqual(self.values('hast'), [])
+        self.assertEqual(self.values('mary'), [('person', 'Mary', 1)])
+
+    def test_restore_from_older_backup_forces_rebuild(self):
+        backup_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, backup_dir)
+        report = backup.create_backup(backup_dir=backup_dir)
+        self.conn.execute("INSERT INTO memories (id, text, places) VALUES (4, 'Trip', 'Peterborough')")
+        self.conn.execute("INSERT INTO memories (id, text, places) VALUES (5, 'Walk', 'Pevensey')")
+        self.conn.commit()
+        self.index.sync(self.conn)
+        self.assertEqual(len(self.values('pe', kinds=('place',))), 2)
+
+        backup.restore_backup(report['path'], backup_dir=backup_dir)
+        # Reuses a restored-away id
+        self.conn.execute("INSERT INTO memories (id, text, places) VALUES (4, 'Trip', 'Canterbury')")
+        self.conn.commit()
+        self.index.sync(self.conn)
+        self.assertEqual(self.values('pe', kinds=('place',)), [])
+        self.assertEqual(self.values('cant'), [('place', 'Canterbury', 1)])
+
+    def test_keystroke_lookup_is_fast(self):
+        self.conn.executemany(
+            "INSERT INTO media (filename, title, people) VALUES (?, ?, ?)",
+            ((f'{i}.jpg', f'Photo {i} of the garden', f'Person {i % 5000}') for i in range(20000))
+        )
+        self.conn.commit()
+        self.index.sync(self.conn)
+        self.index._cache.clear()
+        start = time.perf_counter()
+        for prefix in ('p', 'ph', 'pho', 'per', 'person 12', 'gar'):
+            self.index.complete(prefix)
+        elapsed = (time.perf_counter() - start) / 6
+        self.assertLess(elapsed, 0.02)
+
+
+if __name__ == '__main__':
+    unittest.main()
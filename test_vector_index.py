@@ -0,0 +1,136 @@
+"""
+Tests for the memmap-backed TF-IDF vector index.
+"""
+
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import database
+import search_index
+import vector_index
+from vector_index import VectorIndex
+
+
+class VectorIndexTestCase(unittest.TestCase):
+    """Test suite for vector_index."""
+
+    def setUp(self):
+        self.db_fd, self.db_path = tempfile.mkstemp(suffix='.db')
+        self.original_path = database.DB_PATH
+        database.DB_PATH = self.db_path
+        database.init_db()
+        database.migrate_db()
+        self.conn = database.connect()
+        self.conn.executemany("INSERT INTO memories (id, text) VALUES (?, ?)", [
+            (1, 'Dad was born in London in 1920'),
+            (2, 'Summer holidays at the beach in Hastings with the dog'),
+            (3, 'Grandma baked bread every Sunday morning'),
+        ])
+        self.conn.commit()
+        self.index = VectorIndex(dim=256)
+
+    def tearDown(self):
+        self.conn.close()
+        database.get_pool().close_all()
+        database.DB_PATH = self.original_path
+        os.close(self.db_fd)
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(self.db_path + suffix):
+                os.unlink(self.db_path + suffix)
+        shutil.rmtree(self.db_path + '.vectors', ignore_errors=True)
+
+    def ids(self, query, index=None):
+        return [memory_id for memory_id, _ in (index or self.index).search(query)]
+
+    def test_ranks_by_similarity(self):
+        self.index.sync(self.conn)
+        self.assertEqual(self.ids('where was dad born'), [1])
+        self.assertEqual(self.ids('beach dog')[0], 2)
+        self.assertEqual(self.ids('quantum physics'), [])
+        similarity = self.index.search('grandma baked bread every sunday morning')[0][1]
+        self.assertAlmostEqual(similarity, 1.0, places=3)
+
+    def test_writes_are_applied_incrementally(self):
+        self.index.sync(self.conn)
+        self.conn.execute("UPDATE memories SET text = 'Dad served in the navy' WHERE id = 1")
+        self.conn.execute("INSERT INTO memories (id, text) VALUES (4, 'Born in Hastings')")
+        self.conn.execute("INSERT INTO memory_people (memory_id, person_name) VALUES (3, 'Aunt Mary')")
+        self.conn.execute("DELETE FROM memories WHERE id = 2")
+        self.conn.commit()
+
+        self.assertEqual(self.index.sync(self.conn), 4)
+        self.assertEqual(self.ids('born'), [4])
+        self.assertEqual(self.ids('navy'), [1])
+        self.assertEqual(self.ids('aunt mary'), [3])
+        self.assertEqual(self.ids('beach'), [])
+        self.assertEqual(len(self.index), 3)
+        self.assertEqual(self.index.stats()['free_rows'], 0)  # the deleted row was reused
+
+    def test_files_are_shared_between_processes(self):
+        self.index.sync(self.conn)
+        other = VectorIndex(dim=256)
+        self.assertEqual(other.sync(self.conn), 0)  # opened, not rebuilt
+        self.assertEqual(other.generation, self.index.generation)
+
+        self.conn.execute("INSERT INTO memories (id, text) VALUES (4, 'Wedding in Rye')")
+        self.conn.commit()
+        self.assertEqual(other.sync(self.conn), 1)
+        self.assertEqual(self.index.sync(self.conn), 0)  # already written by the other
+        self.assertEqual(self.ids('wedding'), [4])
+
+    def test_pruned_log_or_restore_rebuilds(self):
+        self.index.sync(self.conn)
+        generation = self.index.generation
+        self.conn.execute("INSERT INTO memories (id, text) VALUES (4, 'Wedding in Rye')")
+        self.conn.execute("DELETE FROM memory_changes")
+        self.conn.commit()
+        self.index.sync(self.conn)
+        self.assertNotEqual(self.index.generation, generation)
+        self.assertEqual(self.ids('wedding'), [4])
+
+        # Files ahead of the database, as after restoring an older backup
+        meta = vector_index._read_meta(self.index.path)
+        meta['last_seq'] += 100
+        vector_index._write_meta(self.index.path, meta)
+        restored = VectorIndex(dim=256)
+        restored.sync(self.conn)
+        self.assertEqual(restored.last_seq, search_index.data_version(self.conn))
+        self.assertEqual(self.ids('wedding', restored), [4])
+
+    def test_grows_past_capacity_and_batches_queries(self):
+        rnd = random.Random(3)
+        words = [f'word{i}' for i in range(400)]
+        self.conn.executemany(
+            "INSERT INTO memories (text) VALUES (?)",
+            ((' '.join(rnd.choices(words, k=8)),) for _ in range(3000))
+        )
+        self.conn.commit()
+        self.index.sync(self.conn)
+        self.conn.executemany(
+            "INSERT INTO memories (text) VALUES (?)",
+            ((' '.join(rnd.choices(words, k=8)),) for _ in range(3000))
+        )
+        self.conn.commit()
+        self.index.sync(self.conn)
+        self.assertEqual(len(self.index), 6003)
+        self.assertGreaterEqual(self.index.stats()['capacity'], 6003)
+
+        queries = ['word7 word8', 'dad born', 'word399']
+        self.assertEqual(self.index.search_many(queries), [self.index.search(q) for q in queries])
+
+        start = time.perf_counter()
+        for _ in range(20):
+            self.index.search('word7 word8 word9')
+        elapsed = (time.perf_counter() - start) / 20
+        self.assertLess(elapsed, 0.05)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+"""
+Tests for the write-behind buffer.
+"""
+
+import os
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import database
+from write_behind import WriteBehindQueue
+
+INSERT_CHAT = "INSERT INTO chat_messages (session_id, role, message) VALUES (?, ?, ?)"
+UPDATE_LOGIN = "UPDATE users SET last_login = ? WHERE id = ?"
+
+
+class WriteBehindTestCase(unittest.TestCase):
+    """Test suite for write_behind."""
+
+    def setUp(self):
+        self.db_fd, self.db_path = tempfile.mkstemp(suffix='.db')
+        self.original_path = database.DB_PATH
+        database.DB_PATH = self.db_path
+        database.init_db()
+        database.migrate_db()
+        self.conn = database.connect()
+        self.queues = []
+
+    def tearDown(self):
+        for queue in self.queues:
+            queue.stop()
+        self.conn.close()
+        database.get_pool().close_all()
+        database.DB_PATH = self.original_path
+        os.close(self.db_fd)
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(self.db_path + suffix):
+                os.unlink(self.db_path + suffix)
+
+    def make_queue(self, **kwargs):
+        queue = WriteBehindQueue(db_path=self.db_path, **kwargs)
+        self.queues.append(queue)
+        return queue
+
+    def chat_count(self):
+        return self.conn.execute("SELECT COUNT(*) FROM chat_messages").fetchone()[0]
+
+    def test_writes_wait_for_interval_then_land_in_one_batch(self):
+        queue = self.make_queue(flush_interval_ms=10000, max_batch=1000)
+        for i in range(5):
+            queue.submit(INSERT_CHAT, ('s', 'user', f'message {i}'))
+        self.assertEqual(self.chat_count(), 0)
+        self.assertEqual(queue.flush(), 5)
+        self.assertEqual(self.chat_count(), 5)
+        self.assertEqual(queue.stats()['batches'], 1)
+
+    def test_background_thread_flushes_after_interval(self):
+        queue = self.make_queue(flush_interval_ms=20, max_batch=1000)
+        queue.submit(INSERT_CHAT, ('s', 'user', 'hello'))
+        deadline = time.time() + 2
+        while self.chat_count() == 0 and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(self.chat_count(), 1)
+
+    def test_max_batch_triggers_early_flush(self):
+        queue = self.make_queue(flush_interval_ms=10000, max_batch=3)
+        for i in range(3):
+            queue.submit(INSERT_CHAT, ('s', 'user', f'message {i}'))
+        deadline = time.time() + 2
+        while self.chat_count() < 3 and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(self.chat_count(), 3)
+
+    def test_keyed_writes_coalesce(self):
+        self.conn.execute("INSERT INTO users (username, password_hash, created_at) VALUES ('u', 'x', '2024')")
+        self.conn.commit()
+        queue = self.make_queue(flush_interval_ms=10000)
+        for stamp in ('2024-01-01', '2024-01-02', '2024-01-03'):
+            queue.submit(UPDATE_LOGIN, (stamp, 1), key=('last_login', 1))
+        self.assertEqual(queue.stats()['coalesced'], 2)
+        self.assertEqual(queue.flush(), 1)
+        self.assertEqual(self.conn.execute("SELECT last_login FROM users").fetchone()[0],
+                         '2024-01-03')
+
+    def test_pending_rows_can_be_read_without_flushing(self):
+        queue = self.make_queue(flush_interval_ms=10000)
+        queue.submit(INSERT_CHAT, ('s', 'user', 'hello'))
+        queue.submit(UPDATE_LOGIN, ('2024-01-01', 1), key=('last_login', 1))
+        queue.submit(INSERT_CHAT, ('s', 'assistant', 'hi'))
+        with queue.holding():
+            self.assertEqual(self.chat_count(), 0)
+            self.assertEqual(queue.pending(INSERT_CHAT), [('s', 'user', 'hello'), ('s', 'assistant', 'hi')])
+        queue.flush()
+        self.assertEqual(queue.pending(INSERT_CHAT), [])
+
+    def test_stop_flushes_pending(self):
+        queue = self.make_queue(flush_interval_ms=10000)
+        queue.submit(INSERT_CHAT, ('s', 'user', 'bye'))
+        queue.stop()
+        self.assertEqual(self.chat_count(), 1)
+
+    def test_failed_batch_is_dropped_and_counted(self):
+        queue = self.make_queue(flush_interval_ms=10000)
+        queue.submit("INSERT INTO no_such_table VALUES (?)", (1,))
+        queue.flush()
+        self.assertEqual(queue.stats()['errors'], 1)
+        queue.submit(INSERT_CHAT, ('s', 'user', 'still works'))
+        queue.flush()
+        self.assertEqual(self.chat_count(), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,154 @@
+# tokenizer.py - The one tokenizer for memory text and search queries
+"""
+Search, the BM25 and name indexes and photo matching all split text
+the same way, so the rules live here once, with precompiled patterns.
+
+analyze() gives everything stored per memory in memory_tokens: search
+terms, photo-matching keywords and likely person names. Bump
+TOKENIZER_VERSION whenever any rule below changes, so stored rows are
+recomputed.
+"""
+
+import re
+from collections import Counter, namedtuple
+
+TOKENIZER_VERSION = 3
+
+# Words that carry no meaning in a family-history question
+STOPWORDS = frozenset({
+    'who', 'what', 'when', 'where', 'why', 'how',
+    'was', 'is', 'are', 'were', 'did', 'do', 'does',
+    'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on',
+    'at', 'to', 'for', 'of', 'with', 'by', 'about',
+    'i', 'my', 'me', 'we', 'our', 'he', 'she', 'his', 'her', 'it', 'tell',
+})
+
+# Common words that say nothing about what a photo shows
+KEYWORD_STOPWORDS = frozenset({
+    'the', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with',
+    'a', 'an', 'is', 'was', 'were', 'are', 'been', 'be', 'have', 'has', 'had',
+    'do', 'does', 'did', 'will', 'would', 'could', 'should', 'may', 'might',
+    'i', 'you', 'he', 'she', 'it', 'we', 'they', 'my', 'your', 'his', 'her',
+    'its', 'our', 'their', 'this', 'that', 'these', 'those', 'me', 'him',
+    'them', 'what', 'which', 'who', 'when', 'where', 'why', 'how',
+})
+MAX_KEYWORDS = 30
+
+# Capitalized words that are not people: titles and places
+NOT_NAMES = frozenset({
+    'the', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'from',
+    'with', 'this', 'that', 'these', 'those', 'it', 'he', 'she', 'they',
+    'mr', 'mrs', 'miss', 'ms', 'dr', 'battle', 'hastings', 'london',
+    'england', 'uk', 'usa', 'world', 'war', 'year', 'day', 'month',
+    'one', 'another', 'behind', 'given', 'fast',
+})
+
+# Calendar words and phrases, stripped from either end of a name run so
+# "On Boxing Day Peter came" gives Peter. Names go to memory_people, so
+# this keeps dates out of the person facet. "May" is also a name and is
+# only stripped where it reads as the month (see _is_month).
+CALENDAR = frozenset({
+    'january', 'february', 'march', 'april', 'june', 'july',
+    'august', 'september', 'october', 'november', 'december',
+    'monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday',
+    'christmas', 'easter', 'whitsun', 'new year', 'boxing day', 'bank holiday', 'may day',
+    'day', 'eve', 'holiday', 'holidays',
+})
+# Words before "May" that make it the month: "in May", "early May".
+# None of them is a name, so they are also dropped from the start of a run.
+MONTH_CONTEXT = frozenset({
+    'in', 'on', 'of', 'by', 'from', 'since', 'until', 'till', 'during', 'through',
+    'early', 'late', 'mid', 'last', 'next', 'this', 'that', 'every',
+})
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+# Capitalized word runs, e.g. "Peter Elger", "Aunt Mary"
+_NAME_RUN_RE = re.compile(r"\b[A-Z][\w'-]*(?:[ \t]+[A-Z][\w'-]*){0,5}")
+_SENTENCE_END_RE = re.compile(r"[.!?]\s*$")
+_WORD_BEFORE_RE = re.compile(r"(\w+)\W*$")
+_NUMBER_AFTER_RE = re.compile(r"[ \t]*\d")
+
+Tokens = namedtuple('Tokens', 'terms keywords names')
+
+
+def words(text):
+    """Every lower-cased word, in order."""
+    return _WORD_RE.findall(text.lower()) if text else []
+
+
+def normalize(text):
+    """Case, punctuation and spacing removed: "Where was Dad born?" -> "where was dad born"."""
+    return ' '.join(words(text))
+
+
+def terms(text):
+    """Search terms: words without stopwords, in order, repeats kept."""
+    return [word for word in words(text) if word not in STOPWORDS]
+
+
+def keywords(text, limit=MAX_KEYWORDS):
+    """The most frequent meaningful words longer than three letters."""
+    counts = Counter(word for word in words(text) if len(word) > 3 and word not in KEYWORD_STOPWORDS)
+    return [word for word, _ in counts.most_common(limit)]
+
+
+def _calendar(run):
+    return ' '.join(word.lower().removesuffix("'s") for word in run) in CALENDAR
+
+
+def _is_month(word, before, after):
+    """Whether `word` is "May" the month, given the word before it and the text after."""
+    return word == 'May' and (
+        (before or '').lower() in MONTH_CONTEXT or (before or '').isdigit()
+        or _NUMBER_AFTER_RE.match(after) is not None
+    )
+
+
+def names(text):
+    """Likely person names, in order of first mention.
+
+    Capitalized runs with leading stopwords and calendar words at either
+    end dropped. A lone capital at the start of a sentence is skipped,
+    as are titles and place names.
+    """
+    text = text or ''
+    found = {}
+    for match in _NAME_RUN_RE.finditer(text):
+        run = match.group().split()
+        previous = _WORD_BEFORE_RE.search(text[:match.start()])
+        before = previous.group(1) if previous else None
+        after = text[match.end():]
+        name = list(run)
+        # Only a number straight after the run can follow a leading "May"
+        while name:
+            word = name[0].lower()
+            if word in STOPWORDS or word in MONTH_CONTEXT or _is_month(name[0], before, after if len(name) == 1 else ''):
+                before = name.pop(0)
+            elif len(name) > 1 and _calendar(name[:2]):
+                before = name[1]
+                del name[:2]
+            elif _calendar(name[:1]):
+                before = name.pop(0)
+            else:
+                break
+        while name:
+            if len(name) > 1 and _calendar(name[-2:]):
+                del name[-2:]
+            elif _calendar(name[-1:]) or _is_month(name[-1], None, after):
+                name.pop()
+            else:
+                break
+        if not name:
+            continue
+        sentence_start = match.start() == 0 or _SENTENCE_END_RE.search(text[:match.start()])
+        if len(name) == 1 and sentence_start and name == run:
+            continue
+        name = ' '.join(name)
+        if len(name) > 2 and name.lower() not in NOT_NAMES:
+            found.setdefault(name, None)
+    return list(found)
+
+
+def analyze(text):
+    """All stored token views of one memory's text."""
+    return Tokens(terms(text), keywords(text), names(text))
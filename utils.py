@@ -3,6 +3,9 @@ import re
 from datetime import datetime
 import os
 
+import llm_cache
+import llm_clients
+
 def parse_date_input(date_input):
     """Parse various date formats."""
     date_input = date_input.strip()
@@ -26,24 +29,30 @@ def categorize_memory(text, year=None, birth_year=1955):
     Categorize memory using DeepSeek AI with age context.
     Falls back to keyword matching if AI unavailable.
     """
-    # Try AI categorization first
     try:
-        from openai import OpenAI
-        
-        api_key = os.getenv('DEEPSEEK_API_KEY')
-        if api_key:
-            client = OpenAI(
-                api_key=api_key,
-                base_url="https://api.deepseek.com"
-            )
-            
-            # Calculate age if year provided
-            age_context = ""
-            if year and birth_year:
-                age = year - birth_year
-                age_context = f"The person was {age} years old in {year}. "
-            
-            prompt = f"""{age_context}Categorize this memory into ONE category. Choose the MOST appropriate:
+        category = ai_category(text, year=year, birth_year=birth_year)
+        if category:
+            return category
+    except Exception as e:
+        print(f"AI categorization failed: {e}")
+    
+    return keyword_category(text, year=year, birth_year=birth_year)
+
+def ai_category(text, year=None, birth_year=1955):
+    """
+    DeepSeek's category for a memory, or None without an API key or when
+    the answer is not a known category. API errors are raised.
+    """
+    if not llm_clients.available('deepseek'):
+        return None
+    
+    # Calculate age if year provided
+    age_context = ""
+    if year and birth_year:
+        age = year - birth_year
+        age_context = f"The person was {age} years old in {year}. "
+    
+    prompt = f"""{age_context}Categorize this memory into ONE category. Choose the MOST appropriate:
 
 Categories:
 - childhood (ages 0-12)
@@ -62,29 +71,30 @@ Memory: "{text[:500]}"
 
 Respond with ONLY the category name, nothing else."""
 
-            response = client.chat.completions.create(
-                model="deepseek-chat",
-                messages=[{"role": "user", "content": prompt}],
-                max_tokens=20,
-                temperature=0.3
-            )
-            
-            category = response.choices[0].message.content.strip().lower()
-            
-            # Validate it's a real category
-            valid_categories = [
-                'childhood', 'teenage', 'education', 'work', 'music', 
-                'family', 'travel', 'military', 'hobbies', 'life-event', 'other'
-            ]
-            
-            if category in valid_categories:
-                return category
+    messages = [{"role": "user", "content": prompt}]
+    # Re-categorizing the same text is answered from the shared cache
+    category = llm_cache.cached_call(
+        "deepseek", "deepseek-chat", messages,
+        lambda: llm_clients.create(
+            "deepseek", "categorize",
+            model="deepseek-chat",
+            messages=messages,
+            max_tokens=20,
+            temperature=0.3
+        ).choices[0].message.content.strip().lower(),
+        max_tokens=20, temperature=0.3
+    )
     
-    except Exception as e:
-        print(f"AI categorization failed: {e}")
-        pass
+    # Validate it's a real category
+    valid_categories = [
+        'childhood', 'teenage', 'education', 'work', 'music', 
+        'family', 'travel', 'military', 'hobbies', 'life-event', 'other'
+    ]
     
-    # Fallback: Improved keyword matching with age context
+    return category if category in valid_categories else None
+
+def keyword_category(text, year=None, birth_year=1955):
+    """Categorize memory by keyword matching with age context, without a network call."""
     text_lower = text.lower()
     
     # Calculate age for context if year provided
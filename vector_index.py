@@ -0,0 +1,382 @@
+# vector_index.py - Offline TF-IDF vector search over memories, stored in a NumPy memmap
+"""
+Every memory becomes a fixed-width float32 vector: its search terms and
+tagged people are hashed into DIM buckets (signed, so collisions tend
+to cancel out), weighted 1 + log(tf) and scaled to unit length. The
+vectors live in a memmap next to the database file, so a restart opens
+them instead of re-reading every memory, and a query is a batched
+matrix product over the buckets of its terms, with no network call.
+
+IDF weights go on the query side only (SMART lnc.ltc), so adding or
+removing a memory rewrites just its own row; the document frequency of
+each bucket is a count kept alongside the vectors.
+
+Like search_index, the index follows the memory_changes log. The files
+are shared by every process using the database: sync() takes a file
+lock, picks up rows another process has already written and applies
+the rest of the log. A gap in the log, a database restored from an
+older backup or a change of DIM or TOKENIZER_VERSION rebuilds them.
+"""
+
+import json
+import math
+import os
+import threading
+import uuid
+import zlib
+from collections import Counter
+from contextlib import contextmanager
+from functools import lru_cache
+
+try:
+    import fcntl
+except ImportError:  # Windows: the single-process development server
+    fcntl = None
+
+import numpy as np
+
+from search_index import data_version
+from tokenizer import TOKENIZER_VERSION, terms as tokenize
+
+DIM = int(os.getenv('VECTOR_DIM', 2048))
+MIN_SIMILARITY = 0.05
+
+# Rows multiplied per batch, so a query never pages in the whole file at once
+_BATCH_ROWS = 16384
+_MIN_CAPACITY = 1024
+_RELOAD_CHUNK = 500
+
+_VECTORS = 'vectors.f32'
+_IDS = 'ids.i64'
+_DF = 'df.i64'
+_META = 'meta.json'
+
+# Terms stored in memory_tokens, or the text when they are missing or stale
+_DOCS_SQL = f'''
+    SELECT m.id,
+           CASE WHEN t.version = {TOKENIZER_VERSION} THEN NULL ELSE m.text END AS text,
+           t.terms, GROUP_CONCAT(mp.person_name, ' ') AS people
+    FROM memories m
+    LEFT JOIN memory_tokens t ON t.memory_id = m.id
+    LEFT JOIN memory_people mp ON m.id = mp.memory_id
+    {{where}}
+    GROUP BY m.id
+'''
+
+
+@lru_cache(maxsize=65536)
+def _bucket(term, dim):
+    """Bucket and sign of a term. crc32, not hash(), so every process agrees."""
+    h = zlib.crc32(term.encode('utf-8'))
+    return h % dim, (1.0 if h & 0x80000000 else -1.0)
+
+
+def embed(tokens, dim=DIM):
+    """Unit-length vector of 1 + log(tf) per hashed term."""
+    vector = np.zeros(dim, dtype=np.float32)
+    for term, tf in Counter(tokens).items():
+        bucket, sign = _bucket(term, dim)
+        vector[bucket] += sign * (1.0 + math.log(tf))
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def _capacity(rows):
+    capacity = _MIN_CAPACITY
+    while capacity < rows:
+        capacity *= 2
+    return capacity
+
+
+def _read_meta(path):
+    try:
+        with open(os.path.join(path, _META)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_meta(path, meta):
+    tmp = os.path.join(path, _META + '.tmp')
+    with open(tmp, 'w') as f:
+        json.dump(meta, f)
+    os.replace(tmp, os.path.join(path, _META))
+
+
+@contextmanager
+def _file_lock(path):
+    """Exclusive across processes; closing the file releases it."""
+    os.makedirs(path, exist_ok=True)
+    with open(os.path.join(path, 'lock'), 'a') as handle:
+        if fcntl:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+        yield
+
+
+class VectorIndex:
+    """Hashed TF-IDF vectors of every memory. Safe to share between threads."""
+
+    def __init__(self, dim=None, directory=None):
+        self.dim = dim or DIM
+        self.directory = directory
+        self._lock = threading.RLock()
+        self._close()
+
+    def _close(self):
+        self.vectors = None   # memmap (capacity, dim) float32
+        self.ids = None       # memmap (capacity,) memory ids, 0 marks a free row
+        self.df = None        # memmap (dim,) documents with a nonzero weight per bucket
+        self.rows = {}        # memory_id -> row
+        self.free = []        # rows freed by deletes, reused first
+        self.count = 0        # rows handed out; the rest is spare capacity
+        self.last_seq = None
+        self.generation = None
+        self.path = None
+        self.pid = None
+
+    def __len__(self):
+        return len(self.rows)
+
+    def _path(self, conn):
+        if self.directory:
+            return self.directory
+        source = conn.execute("PRAGMA database_list").fetchone()[2]
+        if not source:
+            raise ValueError("the vector index needs an on-disk database")
+        return source + '.vectors'
+
+    def _map(self, path, capacity, mode='r+', suffix=''):
+        self.vectors = np.memmap(os.path.join(path, _VECTORS + suffix), dtype=np.float32,
+                                 mode=mode, shape=(capacity, self.dim))
+        self.ids = np.memmap(os.path.join(path, _IDS + suffix), dtype=np.int64, mode=mode, shape=(capacity,))
+        self.df = np.memmap(os.path.join(path, _DF + suffix), dtype=np.int64, mode=mode, shape=(self.dim,))
+
+    def _meta(self):
+        return {
+            'dim': self.dim,
+            'tokenizer_version': TOKENIZER_VERSION,
+            'generation': self.generation,
+            'capacity': len(self.ids),
+            'count': self.count,
+            'last_seq': self.last_seq,
+        }
+
+    def _usable(self, meta):
+        return bool(meta) and meta.get('dim') == self.dim and meta.get('tokenizer_version') == TOKENIZER_VERSION
+
+    # ---------- maintenance ----------
+
+    def build(self, conn):
+        """Embed every memory into fresh files. Changes logged meanwhile are replayed by sync()."""
+        with self._lock:
+            path = self._path(conn)
+            with _file_lock(path):
+                self._build(conn, path)
+            return len(self)
+
+    def _build(self, conn, path):
+        last_seq = data_version(conn)
+        docs = conn.execute(_DOCS_SQL.format(where='')).fetchall()
+
+        # Written under temporary names and swapped in, so other processes
+        # keep reading the old files until they see the new generation
+        self._close()
+        self._map(path, _capacity(len(docs)), mode='w+', suffix='.tmp')
+        for memory_id, text, terms, people in docs:
+            self._add(memory_id, text, terms, people)
+        self.last_seq = last_seq
+        self.generation = uuid.uuid4().hex
+        meta = self._meta()
+        self._flush_arrays()
+        self._close()
+
+        if os.path.exists(os.path.join(path, _META)):
+            os.unlink(os.path.join(path, _META))
+        for name in (_VECTORS, _IDS, _DF):
+            os.replace(os.path.join(path, name + '.tmp'), os.path.join(path, name))
+        _write_meta(path, meta)
+        self._open(path, meta)
+        print(f"✓ Vector index built: {len(self):,} memories, {self.dim} dimensions")
+
+    def _open(self, path, meta):
+        self._close()
+        self._map(path, meta['capacity'])
+        self.path = path
+        self.pid = os.getpid()
+        self.count = meta['count']
+        self.last_seq = meta['last_seq']
+        self.generation = meta['generation']
+        ids = np.asarray(self.ids[:self.count])
+        used = np.flatnonzero(ids)
+        self.rows = dict(zip(ids[used].tolist(), used.tolist()))
+        self.free = np.flatnonzero(ids == 0).tolist()
+
+    def sync(self, conn):
+        """Apply logged changes since the last sync. Returns memories re-embedded."""
+        with self._lock:
+            version = data_version(conn)
+            path = self._path(conn)
+            if self.pid == os.getpid() and self.path == path and self.last_seq == version:
+                return 0
+
+            with _file_lock(path):
+                meta = _read_meta(path)
+                if not self._usable(meta):
+                    self._build(conn, path)
+                    return len(self)
+                if (self.pid != os.getpid() or self.path != path or self._meta() != meta):
+                    self._open(path, meta)  # written by another process since
+                if self.last_seq > version:  # restored from an older backup
+                    self._build(conn, path)
+                    return len(self)
+
+                rows = conn.execute(
+                    "SELECT seq, memory_id FROM memory_changes WHERE seq > ? ORDER BY seq",
+                    (self.last_seq,)
+                ).fetchall()
+                if not rows:
+                    if version > self.last_seq:  # log pruned beyond us
+                        self._build(conn, path)
+                        return len(self)
+                    return 0
+                if rows[0][0] != self.last_seq + 1:
+                    self._build(conn, path)
+                    return len(self)
+
+                changed = list(dict.fromkeys(memory_id for _, memory_id in rows))
+                for memory_id in changed:
+                    self._remove(memory_id)
+                for start in range(0, len(changed), _RELOAD_CHUNK):
+                    chunk = changed[start:start + _RELOAD_CHUNK]
+                    placeholders = ','.join('?' * len(chunk))
+                    where = f'WHERE m.id IN ({placeholders})'
+                    for memory_id, text, terms, people in conn.execute(_DOCS_SQL.format(where=where), chunk):
+                        self._add(memory_id, text, terms, people)
+                self.last_seq = rows[-1][0]
+                self._flush_arrays()
+                _write_meta(path, self._meta())
+                return len(changed)
+
+    def _flush_arrays(self):
+        for array in (self.vectors, self.ids, self.df):
+            array.flush()
+
+    def _grow(self):
+        """Double the capacity in place; mappings in other processes stay valid."""
+        capacity = len(self.ids) * 2
+        self._flush_arrays()
+        os.truncate(os.path.join(self.path, _VECTORS), capacity * self.dim * 4)
+        os.truncate(os.path.join(self.path, _IDS), capacity * 8)
+        self.vectors = self.ids = None
+        self.vectors = np.memmap(os.path.join(self.path, _VECTORS), dtype=np.float32,
+                                 mode='r+', shape=(capacity, self.dim))
+        self.ids = np.memmap(os.path.join(self.path, _IDS), dtype=np.int64, mode='r+', shape=(capacity,))
+
+    def _add(self, memory_id, text, terms, people):
+        # text is only read back when the stored terms are missing or stale
+        tokens = (terms.split() if text is None else tokenize(text)) + tokenize(people)
+        vector = embed(tokens, self.dim)
+        if self.free:
+            row = self.free.pop()
+        else:
+            if self.count == len(self.ids):
+                self._grow()
+            row = self.count
+            self.count += 1
+        self.vectors[row] = vector
+        self.ids[row] = memory_id
+        self.df += vector != 0
+        self.rows[memory_id] = row
+
+    def _remove(self, memory_id):
+        row = self.rows.pop(memory_id, None)
+        if row is None:
+            return
+        self.df -= self.vectors[row] != 0
+        self.vectors[row] = 0
+        self.ids[row] = 0
+        self.free.append(row)
+
+    # ---------- queries ----------
+
+    def _query_vector(self, query):
+        vector = np.zeros(self.dim, dtype=np.float32)
+        n = len(self.rows)
+        for term, tf in Counter(tokenize(query)).items():
+            bucket, sign = _bucket(term, self.dim)
+            idf = math.log((n + 1) / (self.df[bucket] + 1)) + 1
+            vector[bucket] += sign * (1.0 + math.log(tf)) * idf
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def search_many(self, queries, limit=10, min_similarity=MIN_SIMILARITY):
+        """One [(memory_id, cosine similarity), ...] list per query, best first.
+
+        Every query is scored in the same pass over the vectors.
+        """
+        with self._lock:
+            if not queries or not self.rows:
+                return [[] for _ in queries]
+            matrix = np.stack([self._query_vector(query) for query in queries], axis=1)
+            # Queries are a few terms, so only their buckets are read
+            buckets = np.flatnonzero(matrix.any(axis=1))
+            if not len(buckets):
+                return [[] for _ in queries]
+            matrix = matrix[buckets]
+            scores = np.empty((self.count, len(queries)), dtype=np.float32)
+            for start in range(0, self.count, _BATCH_ROWS):
+                stop = min(start + _BATCH_ROWS, self.count)
+                np.matmul(self.vectors[start:stop, buckets], matrix, out=scores[start:stop])
+
+            k = min(limit, self.count)
+            results = []
+            for column in scores.T:
+                top = np.argpartition(-column, k - 1)[:k]
+                top = top[np.argsort(-column[top], kind='stable')]
+                results.append([
+                    (int(self.ids[row]), round(float(column[row]), 4))
+                    for row in top if column[row] >= min_similarity
+                ])
+            return results
+
+    def search(self, query, limit=10, min_similarity=MIN_SIMILARITY):
+        """[(memory_id, cosine similarity), ...] best first."""
+        return self.search_many([query], limit, min_similarity)[0]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'documents': len(self.rows),
+                'free_rows': len(self.free),
+                'capacity': 0 if self.ids is None else len(self.ids),
+                'dimensions': self.dim,
+                'bytes': 0 if self.vectors is None else self.vectors.nbytes,
+                'last_seq': self.last_seq,
+            }
+
+
+vector_index = VectorIndex()
+
+
+def get_index(conn):
+    """The process-wide index, synced with the database."""
+    vector_index.sync(conn)
+    return vector_index
+
+
+def sync(conn):
+    """Sync right after a write. Searches sync again, so failures only log."""
+    try:
+        return vector_index.sync(conn)
+    except Exception as e:
+        print(f"Vector index sync error: {e}")
+        return 0
+
+
+def similar(conn, query, limit=10):
+    """Memories most similar to a query, or [] when the index is unavailable."""
+    try:
+        return get_index(conn).search(query, limit)
+    except Exception as e:
+        print(f"Vector search error: {e}")
+        return []
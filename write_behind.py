@@ -0,0 +1,189 @@
+# write_behind.py - Buffered background writes for low-value rows
+"""
+Some writes don't need to be durable before the response goes out:
+users.last_login, chat transcripts and similar bookkeeping. submit()
+queues them, and a background thread writes them in one transaction every
+WRITE_BEHIND_INTERVAL_MS, or sooner once WRITE_BEHIND_MAX_BATCH rows are
+waiting. That takes one commit (and fsync) per write off the request path.
+
+Writes submitted with a `key` coalesce: a later write with the same key
+replaces the pending one, so ten logins in one interval become a single
+UPDATE. A reader that must see recent writes (chat history) merges
+pending() into its query under holding() instead of flushing, so it
+never commits on the request path. Pending rows are flushed at
+interpreter exit. A batch that fails is logged and dropped, so never
+route anything through here that must not be lost. Set WRITE_BEHIND=0
+to write synchronously instead.
+"""
+
+import atexit
+import itertools
+import os
+import threading
+from contextlib import contextmanager
+
+import database
+
+ENABLED = os.environ.get('WRITE_BEHIND', '1') != '0'
+FLUSH_INTERVAL_MS = int(os.environ.get('WRITE_BEHIND_INTERVAL_MS', '200'))
+MAX_BATCH = int(os.environ.get('WRITE_BEHIND_MAX_BATCH', '100'))
+
+
+class WriteBehindQueue:
+    """Coalescing write buffer drained by one background thread per process."""
+
+    def __init__(self, flush_interval_ms=None, max_batch=None, db_path=None):
+        self.flush_interval = (flush_interval_ms or FLUSH_INTERVAL_MS) / 1000.0
+        self.max_batch = max_batch or MAX_BATCH
+        self.db_path = db_path
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._pending = {}  # key -> (sql, params), in submit order
+        self._seq = itertools.count()
+        self._thread = None
+        self._pid = None
+        self._stopping = False
+        self._conn = None
+        self._conn_key = None
+        self._stats = {'submitted': 0, 'coalesced': 0, 'flushed': 0, 'batches': 0, 'errors': 0}
+
+    def submit(self, sql, params=(), key=None):
+        """Queue one write. Writes sharing a key keep only the latest."""
+        if not ENABLED:
+            with self._flush_lock:
+                self._write([(sql, params)])
+            return
+        with self._cond:
+            self._ensure_thread()
+            self._stats['submitted'] += 1
+            if key is None:
+                key = next(self._seq)
+            elif self._pending.pop(key, None) is not None:
+                self._stats['coalesced'] += 1
+            self._pending[key] = (sql, params)
+            if len(self._pending) >= self.max_batch:
+                self._cond.notify()
+
+    def flush(self):
+        """Write everything pending now. Returns the number of rows written."""
+        with self._flush_lock:
+            with self._cond:
+                if not self._pending:
+                    return 0
+                batch = list(self._pending.values())
+                self._pending = {}
+            self._write(batch)
+            return len(batch)
+
+    @contextmanager
+    def holding(self):
+        """Hold off flushes, so a database read and pending() see each row exactly once.
+
+        A batch being written when this is entered is committed first.
+        """
+        with self._flush_lock:
+            yield
+
+    def pending(self, sql):
+        """Params of the queued writes of one statement, in submit order."""
+        with self._cond:
+            return [params for queued, params in self._pending.values() if queued == sql]
+
+    def stop(self, timeout=5):
+        """Stop the flusher thread after writing whatever is pending."""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+            thread = self._thread
+        if thread is not None and thread.is_alive() and self._pid == os.getpid():
+            thread.join(timeout)
+        self.flush()
+        with self._flush_lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self._stats)
+            stats['pending'] = len(self._pending)
+        stats['enabled'] = ENABLED
+        stats['interval_ms'] = int(self.flush_interval * 1000)
+        stats['max_batch'] = self.max_batch
+        return stats
+
+    def _ensure_thread(self):
+        # Called with _cond held. A forked worker inherits neither the
+        # thread nor the right to write its parent's pending rows.
+        pid = os.getpid()
+        if self._pid != pid:
+            self._pid = pid
+            self._pending = {}
+            self._thread = None
+            self._conn = None
+            self._stopping = False
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._stopping and len(self._pending) < self.max_batch:
+                    self._cond.wait(self.flush_interval)
+                stopping = self._stopping
+            self.flush()
+            if stopping:
+                return
+
+    def _connection(self):
+        db_path = self.db_path or database.DB_PATH
+        key = (os.getpid(), db_path)
+        if self._conn is None or self._conn_key != key:
+            self._conn = database.connect(db_path)
+            self._conn_key = key
+        return self._conn
+
+    def _write(self, batch):
+        """Write one batch in a single transaction, grouping runs of the same SQL."""
+        try:
+            conn = self._connection()
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                for sql, group in itertools.groupby(batch, key=lambda item: item[0]):
+                    conn.executemany(sql, [params for _, params in group])
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            self._stats['flushed'] += len(batch)
+            self._stats['batches'] += 1
+        except Exception as e:
+            self._stats['errors'] += len(batch)
+            print(f"✗ Write-behind flush failed, dropped {len(batch)} rows: {e}")
+
+
+_queue = WriteBehindQueue()
+
+
+def submit(sql, params=(), key=None):
+    _queue.submit(sql, params, key)
+
+
+def flush():
+    return _queue.flush()
+
+
+def holding():
+    return _queue.holding()
+
+
+def pending(sql):
+    return _queue.pending(sql)
+
+
+def stats():
+    return _queue.stats()
+
+
+atexit.register(_queue.stop)